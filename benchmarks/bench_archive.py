@@ -0,0 +1,57 @@
+"""
+LRCA archive size and cold read throughput against TRK, gzip TRK and LRPK.
+
+    python -m benchmarks.bench_archive --lines 200000 --precision 0.01
+"""
+import argparse
+import io
+
+from open_lr_formats.trk.track import TRK_Reader, TRK_Writer
+from open_lr_formats.lrpk.track import LRPK_Reader, LRPK_Writer
+from open_lr_formats.lrca.track import LRCA_Reader, LRCA_Writer
+
+from .bench_compression import best_of
+from .synthetic import FULL_MIX, trk_track, lrpk_track
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precision", type=float, default=None, help="also archive with this coordinate precision")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tracks = [
+        ("trk", trk_track(args.lines, args.seed, FULL_MIX), TRK_Writer, TRK_Reader),
+        ("lrpk", lrpk_track(args.lines, args.seed), LRPK_Writer, LRPK_Reader),
+    ]
+    print(f"{'format':<6} {'stored as':<16} {'size MB':>9} {'ratio':>7} {'write lines/s':>15} {'read lines/s':>15}")
+    for name, track, writer, reader in tracks:
+        variants = [(name, lambda output: writer(output, track).write(), reader)]
+        if name == "trk":
+            variants.append(("trk gzip", lambda output: writer(output, track, compression="gzip").write(), reader))
+        variants.append(("lrca", lambda output: LRCA_Writer(output, track).write(), LRCA_Reader))
+        if args.precision is not None:
+            variants.append((f"lrca {args.precision:g}", lambda output: LRCA_Writer(output, track, args.precision).write(), LRCA_Reader))
+
+        raw_size = None
+        for stored_as, write, read in variants:
+            output = io.BytesIO()
+            def rewrite():
+                output.seek(0)
+                output.truncate()
+                write(output)
+            write_seconds = best_of(args.repeat, rewrite)
+            data = output.getvalue()
+            raw_size = raw_size or len(data)
+
+            read_seconds = best_of(args.repeat, lambda: read(io.BytesIO(data), columnar=True).read())
+            print(
+                f"{name:<6} {stored_as:<16} {len(data) / 1e6:>9.2f} {raw_size / len(data):>7.2f}"
+                f" {args.lines / write_seconds:>15,.0f} {args.lines / read_seconds:>15,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compressed size vs. read and write throughput for each codec, TRK and LRPK.
+
+    python -m benchmarks.bench_compression --lines 200000 --codecs none,gzip,bz2,lzma
+"""
+import argparse
+import io
+import time
+
+from open_lr_formats.trk.track import TRK_Reader, TRK_Writer
+from open_lr_formats.lrpk.track import LRPK_Reader, LRPK_Writer
+
+from .synthetic import FULL_MIX, trk_track, lrpk_track
+
+
+def best_of(repeat: int, function) -> float:
+    times = []
+    for i in range(repeat):
+        begin = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - begin)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--codecs", default="none,gzip,bz2,lzma", help="comma separated, none for uncompressed")
+    parser.add_argument("--level", type=int, default=None, help="compression level, default is each codec's own")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    formats = [
+        ("trk", trk_track(args.lines, args.seed, FULL_MIX), TRK_Writer, TRK_Reader),
+        ("lrpk", lrpk_track(args.lines, args.seed), LRPK_Writer, LRPK_Reader),
+    ]
+    print(f"{'format':<6} {'codec':<6} {'size MB':>9} {'ratio':>7} {'write lines/s':>15} {'read lines/s':>15}")
+    for name, track, writer, reader in formats:
+        raw_size = None
+        for codec in args.codecs.split(","):
+            compression = None if codec == "none" else codec
+            output = io.BytesIO()
+            def write():
+                output.seek(0)
+                output.truncate()
+                writer(output, track, compression=compression, compression_level=args.level).write()
+            write_seconds = best_of(args.repeat, write)
+            data = output.getvalue()
+            raw_size = raw_size or len(data)
+
+            read_seconds = best_of(args.repeat, lambda: reader(io.BytesIO(data), columnar=True).read())
+            print(
+                f"{name:<6} {codec:<6} {len(data) / 1e6:>9.2f} {raw_size / len(data):>7.2f}"
+                f" {args.lines / write_seconds:>15,.0f} {args.lines / read_seconds:>15,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Lines per second of the streaming TRK <-> LRPK converters.
+
+    python -m benchmarks.bench_convert --lines 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from open_lr_formats.convert import trk_to_lrpk, lrpk_to_trk
+from open_lr_formats.files import mapped
+from open_lr_formats.trk.track import TRK_Writer
+
+from .synthetic import trk_track
+
+
+def timed(convert, source: str, destination: str) -> float:
+    begin = time.perf_counter()
+    with mapped(source) as data, open(destination, "wb") as f:
+        convert(data, f)
+    return time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        trk_path = os.path.join(directory, "track.trk")
+        lrpk_path = os.path.join(directory, "track.lrpk")
+        back_path = os.path.join(directory, "back.trk")
+
+        with open(trk_path, "wb") as f:
+            TRK_Writer(f, trk_track(args.lines, args.seed)).write()
+
+        for name, convert, source, destination in (
+            ("trk -> lrpk", trk_to_lrpk, trk_path, lrpk_path),
+            ("lrpk -> trk", lrpk_to_trk, lrpk_path, back_path),
+        ):
+            seconds = timed(convert, source, destination)
+            print(f"{name}: {args.lines / seconds:,.0f} lines/s ({seconds:.2f}s, {os.path.getsize(source) / seconds / 1e6:.1f} MB/s in)")
+
+
+if __name__ == "__main__":
+    main()
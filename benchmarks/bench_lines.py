@@ -0,0 +1,154 @@
+"""
+Memory and throughput of the TRK and LRPK line models, compared against the previous
+plain (`__dict__` based) dataclass definitions, and of the LRPK line tables.
+
+    python -m benchmarks.bench_lines --lines 1000000
+"""
+import argparse
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import *
+
+from open_lr_formats.trk import line as slotted
+from open_lr_formats.lrpk import track as lrpk
+
+from .synthetic import lrpk_track, trk_lines
+
+
+# The line models as they were before they were slotted.
+class legacy:
+    @dataclass
+    class Vector2d:
+        x: float
+        y: float
+
+    @dataclass
+    class BaseLine:
+        start: "legacy.Vector2d"
+        end: "legacy.Vector2d"
+
+        type: ClassVar[slotted.LineType]
+
+    @dataclass
+    class StandardLine(BaseLine):
+        id: int
+        extension: slotted.LineExtension = slotted.LineExtension.Nothing
+        inverted: bool = False
+        zoom_trigger: Optional[slotted.LineZoomTrigger] = None
+
+        type = slotted.LineType.Standard
+
+    @dataclass
+    class AccelerationLine(StandardLine):
+        multiplier: int = 1
+
+        type = slotted.LineType.Acceleration
+
+    @dataclass
+    class SceneryLine(BaseLine):
+        width: float = 1
+
+        type = slotted.LineType.Scenery
+
+
+class legacy_lrpk:
+    @dataclass
+    class Vector2d:
+        x: float
+        y: float
+
+    @dataclass
+    class PhysicsLine:
+        id: int
+        start: "legacy_lrpk.Vector2d"
+        end: "legacy_lrpk.Vector2d"
+        type: int
+        flipped: bool = False
+        extension: lrpk.LineExtension = lrpk.LineExtension.Nothing
+
+    @dataclass
+    class SceneryLine:
+        id: int
+        start: "legacy_lrpk.Vector2d"
+        end: "legacy_lrpk.Vector2d"
+
+
+def build(models, source) -> list:
+    lines = []
+    for line in source:
+        start = models.Vector2d(line.start.x, line.start.y)
+        end = models.Vector2d(line.end.x, line.end.y)
+        if isinstance(line, slotted.AccelerationLine):
+            lines.append(models.AccelerationLine(start, end, line.id))
+        elif isinstance(line, slotted.StandardLine):
+            lines.append(models.StandardLine(start, end, line.id))
+        else:
+            lines.append(models.SceneryLine(start, end))
+    return lines
+
+def build_lrpk(models, source) -> list:
+    lines = []
+    for line in source:
+        start = models.Vector2d(line.start.x, line.start.y)
+        end = models.Vector2d(line.end.x, line.end.y)
+        if isinstance(line, lrpk.PhysicsLine):
+            lines.append(models.PhysicsLine(line.id, start, end, line.type, line.flipped, line.extension))
+        else:
+            lines.append(models.SceneryLine(line.id, start, end))
+    return lines
+
+def build_tables(source) -> list:
+    physics_lines = lrpk.LineTable.from_lines(line for line in source if isinstance(line, lrpk.PhysicsLine))
+    scenery_lines = lrpk.SceneryLineTable.from_lines(line for line in source if isinstance(line, lrpk.SceneryLine))
+    return [physics_lines, scenery_lines]
+
+
+def measure(name: str, build: Callable[[], list], count: int) -> Dict[str, float]:
+    tracemalloc.start()
+    lines = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del lines
+
+    begin = time.perf_counter()
+    lines = build()
+    build_time = time.perf_counter() - begin
+
+    copy = build()
+    begin = time.perf_counter()
+    assert lines == copy
+    compare_time = time.perf_counter() - begin
+
+    return {
+        "models": name,
+        "bytes/line": size / count,
+        "build lines/s": count / build_time,
+        "compare lines/s": count / compare_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    source = list(trk_lines(args.lines, args.seed))
+    track = lrpk_track(args.lines, args.seed)
+    lrpk_source = [*track.physics_lines, *track.scenery_lines]
+    results = [
+        measure("TRK dataclass", lambda: build(legacy, source), args.lines),
+        measure("TRK slotted", lambda: build(slotted, source), args.lines),
+        measure("LRPK dataclass", lambda: build_lrpk(legacy_lrpk, lrpk_source), args.lines),
+        measure("LRPK slotted", lambda: build_lrpk(lrpk, lrpk_source), args.lines),
+        measure("LRPK tables", lambda: build_tables(lrpk_source), args.lines),
+    ]
+
+    print(f"{args.lines} lines")
+    for result in results:
+        print("  ".join(f"{key}: {value:,.0f}" if isinstance(value, float) else f"{key}: {value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Sequential vs two-pass parallel TRK reading, by number of worker processes.
+
+    python -m benchmarks.bench_parallel --lines 1000000 --workers 1,2,4,8
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from open_lr_formats.files import open_trk
+from open_lr_formats.trk.parallel import TRKIndex, read_parallel
+from open_lr_formats.trk.track import TRK_Writer
+
+from .synthetic import FULL_MIX, trk_track
+
+
+def timed(function) -> float:
+    begin = time.perf_counter()
+    function()
+    return time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--chunk-lines", type=int, default=1 << 16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "track.trk")
+        with open(path, "wb") as f:
+            TRK_Writer(f, trk_track(args.lines, args.seed, FULL_MIX)).write()
+
+        seconds = timed(lambda: open_trk(path, columnar=True))
+        print(f"sequential: {args.lines / seconds:,.0f} lines/s ({seconds:.2f}s)")
+
+        with open(path, "rb") as f:
+            data = f.read()
+        index = None
+        def build():
+            nonlocal index
+            index = TRKIndex.build(data)
+        seconds = timed(build)
+        saved = io.BytesIO()
+        index.dump(saved)
+        print(f"index scan: {args.lines / seconds:,.0f} lines/s ({seconds:.2f}s, {len(saved.getvalue()) / 1e6:.1f} MB saved)")
+
+        for workers in map(int, args.workers.split(",")):
+            for cached in (False, True):
+                seconds = timed(lambda: read_parallel(path, workers, args.chunk_lines, columnar=True, index=index if cached else None))
+                label = f"{workers} workers" + (", cached index" if cached else "")
+                print(f"{label}: {args.lines / seconds:,.0f} lines/s ({seconds:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Build time and query latency of the grid spatial index.
+
+    python -m benchmarks.bench_spatial --sizes 100000,1000000,10000000
+"""
+import argparse
+import random
+import time
+
+from open_lr_formats.spatial import GridIndex
+from open_lr_formats.trk.table import LineTable
+
+from .synthetic import trk_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="100000,1000000", help="comma separated line counts")
+    parser.add_argument("--cell-size", type=float, default=64.0)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--viewport", type=float, default=800.0, help="width and height of the bbox queries")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size in map(int, args.sizes.split(",")):
+        lines = LineTable.from_lines(trk_lines(size, args.seed))
+
+        begin = time.perf_counter()
+        index = GridIndex.from_lines(lines, args.cell_size)
+        build = time.perf_counter() - begin
+
+        rng = random.Random(args.seed)
+        min_x, max_x = min(lines.x1), max(lines.x1)
+        min_y, max_y = min(lines.y1), max(lines.y1)
+        points = [(rng.uniform(min_x, max_x), rng.uniform(min_y, max_y)) for i in range(args.queries)]
+
+        begin = time.perf_counter()
+        found = 0
+        for x, y in points:
+            found += len(index.query_bbox(x, y, x + args.viewport, y + args.viewport))
+        bbox = (time.perf_counter() - begin) / args.queries
+
+        begin = time.perf_counter()
+        for x, y in points:
+            index.nearest(x, y)
+        nearest = (time.perf_counter() - begin) / args.queries
+
+        print(
+            f"{size:>10,} lines  build {build:.2f}s ({size / build:,.0f} lines/s)  "
+            f"bbox {bbox * 1e6:,.0f}us ({found / args.queries:,.0f} lines/query)  nearest {nearest * 1e6:,.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
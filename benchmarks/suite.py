@@ -0,0 +1,170 @@
+"""
+Reader and writer throughput benchmarks, saved as JSON so runs can be compared across commits.
+
+    python -m benchmarks.suite --lines 200000 --output results.json
+    python -m benchmarks.suite --lines 200000 --compare results.json
+
+Every case runs in a fresh process so that peak RSS is its own.
+`allocated_blocks` is the growth in live interpreter allocations over the operation and
+`gc_collections` the generation 0 collections it triggered, a proxy for object allocations.
+"""
+import argparse
+import gc
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import *
+
+from open_lr_formats.trk.track import TRK_Reader, TRK_Writer
+from open_lr_formats.lrpk.track import LRPK_Reader, LRPK_Writer
+from open_lr_formats.lrpk import records
+
+from .synthetic import Mix, FULL_MIX, trk_track, lrpk_track
+
+
+def encode_trk(track) -> bytes:
+    f = io.BytesIO()
+    TRK_Writer(f, track).write()
+    return f.getvalue()
+
+def encode_lrpk(track) -> bytes:
+    f = io.BytesIO()
+    LRPK_Writer(f, track).write()
+    return f.getvalue()
+
+
+# name -> (format, operation, reader/writer options)
+CASES = {
+    "trk_read": ("trk", "read", {}),
+    "trk_read_columnar": ("trk", "read", {"columnar": True}),
+    "trk_write": ("trk", "write", {}),
+    "trk_write_columnar": ("trk", "write", {"columnar": True}),
+    "lrpk_read": ("lrpk", "read", {}),
+    "lrpk_read_columnar": ("lrpk", "read", {"columnar": True}),
+    "lrpk_write": ("lrpk", "write", {}),
+    "lrpk_write_columnar": ("lrpk", "write", {"columnar": True}),
+}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(name: str, lines: int, seed: int, mix: Dict[str, Any], repeat: int) -> Dict[str, float]:
+    kind, operation, options = CASES[name]
+    mix = Mix(**mix)
+    if kind == "trk":
+        data = encode_trk(trk_track(lines, seed, mix))
+        read = lambda: TRK_Reader(data, **options).read()
+        write = lambda track: TRK_Writer(io.BytesIO(), track).write()
+    else:
+        data = encode_lrpk(lrpk_track(lines, seed, mix))
+        read = lambda: LRPK_Reader(data, **options).read()
+        write = lambda track: LRPK_Writer(io.BytesIO(), track).write()
+    
+    track = read() if operation == "write" else None
+    operation_function = read if operation == "read" else lambda: write(track)
+
+    times = []
+    gc.collect()
+    rss_before = peak_rss_mb()
+    blocks_before = sys.getallocatedblocks()
+    collections_before = gc.get_stats()[0]["collections"]
+    result = None
+    for i in range(repeat):
+        del result
+        begin = time.perf_counter()
+        result = operation_function()
+        times.append(time.perf_counter() - begin)
+        if i == 0:
+            blocks = sys.getallocatedblocks() - blocks_before
+            collections = gc.get_stats()[0]["collections"] - collections_before
+    
+    best = min(times)
+    return {
+        "seconds": best,
+        "mb_per_s": len(data) / best / 1e6,
+        "lines_per_s": lines / best,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_growth_mb": peak_rss_mb() - rss_before,
+        "allocated_blocks": blocks,
+        "gc_collections": collections,
+        "file_bytes": len(data),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """Prints the change of each case against a baseline, returning how many regressed."""
+    regressions = 0
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        speed = result["lines_per_s"] / old["lines_per_s"]
+        memory = result["peak_rss_growth_mb"] - old["peak_rss_growth_mb"]
+        regressed = speed < 1 - threshold
+        regressions += regressed
+        print(f"{name:<22} speed x{speed:.2f}  peak rss {memory:+.1f}MB{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--plain", action="store_true", help="don't use any optional line features")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma separated case names")
+    parser.add_argument("--output", help="file to save the JSON results to")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown counted as a regression")
+    args = parser.parse_args()
+
+    mix = Mix() if args.plain else FULL_MIX
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": records.HAS_NUMPY,
+        "lines": args.lines,
+        "seed": args.seed,
+        "mix": mix.to_dict(),
+        "results": {},
+    }
+
+    context = multiprocessing.get_context("spawn")
+    for name in args.cases.split(","):
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, (name, args.lines, args.seed, mix.to_dict(), args.repeat))
+        results["results"][name] = result
+        print(
+            f"{name:<22} {result['mb_per_s']:8.1f} MB/s {result['lines_per_s']:12,.0f} lines/s  "
+            f"peak rss {result['peak_rss_mb']:7.1f}MB (+{result['peak_rss_growth_mb']:.1f})  "
+            f"blocks {result['allocated_blocks']:+,}  gc {result['gc_collections']}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
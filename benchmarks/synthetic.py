@@ -0,0 +1,94 @@
+"""
+Deterministic synthetic tracks for the benchmarks.
+The same count, seed and `Mix` always produce the same track.
+"""
+from dataclasses import dataclass, asdict
+import random
+from typing import *
+
+from open_lr_formats.trk import track as trk
+from open_lr_formats.lrpk import track as lrpk
+
+
+@dataclass
+class Mix:
+    """Which optional line fields a synthetic track uses, as fractions of lines."""
+    scenery: float = 0.2
+    acceleration: float = 0.1
+    red_multipliers: float = 0.0
+    scenery_widths: float = 0.0
+    zoom_triggers: float = 0.0
+    extensions: float = 0.0
+    metadata_entries: int = 0
+    songinfo: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+# Every optional feature, for exercising all of the code paths.
+FULL_MIX = Mix(
+    red_multipliers=0.5, scenery_widths=0.5, zoom_triggers=0.05, extensions=0.3,
+    metadata_entries=4, songinfo=True
+)
+
+
+def trk_lines(count: int, seed: int = 0, mix: Mix = Mix()) -> Iterator[trk.BaseLine]:
+    rng = random.Random(seed)
+    x, y = 0.0, 0.0
+    for i in range(count):
+        nx = x + rng.uniform(-50, 50)
+        ny = y + rng.uniform(-50, 50)
+        start, end = trk.Vector2d(x, y), trk.Vector2d(nx, ny)
+        kind = rng.random()
+        if kind < mix.scenery:
+            width = rng.randrange(1, 100) / 10 if rng.random() < mix.scenery_widths else 1
+            yield trk.SceneryLine(start, end, width=width)
+        else:
+            extension = trk.LineExtension(rng.randrange(1, 4)) if rng.random() < mix.extensions else trk.LineExtension.Nothing
+            zoom_trigger = None
+            if rng.random() < mix.zoom_triggers:
+                zoom_trigger = trk.LineZoomTrigger(rng.randrange(1, 24) / 2, rng.randrange(1, 120))
+            
+            if kind < mix.scenery + mix.acceleration:
+                multiplier = rng.randrange(2, 10) if rng.random() < mix.red_multipliers else 1
+                yield trk.AccelerationLine(start, end, i, extension=extension, zoom_trigger=zoom_trigger, multiplier=multiplier)
+            else:
+                yield trk.StandardLine(start, end, i, extension=extension, inverted=rng.random() < 0.5, zoom_trigger=zoom_trigger)
+        x, y = nx, ny
+
+
+def trk_track(count: int, seed: int = 0, mix: Mix = Mix()) -> trk.Track:
+    features = set()
+    if mix.zoom_triggers:
+        features.add(trk.Features.ignorable_trigger)
+    
+    return trk.Track(
+        list(trk_lines(count, seed, mix)),
+        features,
+        trk.SongInfo("synthetic", 1.5) if mix.songinfo else None,
+        {f"KEY{i}": str(i) for i in range(mix.metadata_entries)},
+        trk.Vector2d(0, 0),
+    )
+
+
+def lrpk_track(count: int, seed: int = 0, mix: Mix = Mix()) -> lrpk.Track:
+    rng = random.Random(seed)
+    physics_lines = []
+    scenery_lines = []
+    x, y = 0.0, 0.0
+    for i in range(count):
+        nx = x + rng.uniform(-50, 50)
+        ny = y + rng.uniform(-50, 50)
+        kind = rng.random()
+        if kind < mix.scenery:
+            scenery_lines.append(lrpk.SceneryLine(i, lrpk.Vector2d(x, y), lrpk.Vector2d(nx, ny)))
+        else:
+            extension = lrpk.LineExtension(rng.randrange(1, 4)) if rng.random() < mix.extensions else lrpk.LineExtension.Nothing
+            line_type = 1 if kind < mix.scenery + mix.acceleration else 0
+            physics_lines.append(lrpk.PhysicsLine(i, lrpk.Vector2d(x, y), lrpk.Vector2d(nx, ny), line_type, rng.random() < 0.5, extension))
+        x, y = nx, ny
+    
+    return lrpk.Track(
+        "synthetic", "benchmarks", 0, lrpk.VersionInfo(),
+        physics_lines, scenery_lines, [lrpk.Rider(lrpk.Vector2d(0, 0))]
+    )
@@ -0,0 +1,38 @@
+import argparse
+import sys
+
+from . import batch
+
+
+def batch_command(args) -> int:
+    paths = batch.expand_inputs(args.inputs)
+    jobs = batch.plan_jobs(paths, args.output, args.transform)
+    failed = 0
+    for result in batch.run_batch(jobs, args.jobs):
+        if result.ok:
+            print(f"ok    {result.job.source} -> {result.job.destination} ({result.seconds:.2f}s)")
+        else:
+            failed += 1
+            print(f"error {result.job.source}\n{result.error}", file=sys.stderr)
+    
+    print(f"{len(jobs) - failed}/{len(jobs)} files converted")
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m open_lr_formats")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = commands.add_parser("batch", help="read, transform and re-write many tracks in parallel")
+    batch_parser.add_argument("inputs", nargs="+", help="input files or glob patterns (** is recursive)")
+    batch_parser.add_argument("-o", "--output", required=True, help="directory to write the results to")
+    batch_parser.add_argument("-t", "--transform", default="roundtrip", choices=sorted(batch.TRANSFORMS))
+    batch_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: one per core)")
+    batch_parser.set_defaults(func=batch_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+asyncio entry points for reading and writing tracks without blocking the event loop.
+
+Readers take an `asyncio.StreamReader` or any async iterable of bytes. TRK files are parsed
+as data arrives: whenever about `chunk_size` bytes of complete line records are buffered
+they are decoded in an executor while the next ones are received.
+LRPK files keep their directory table at the end, so they are received in full first,
+then their line lumps are decoded in the executor `chunk_lines` records at a time.
+
+Writers are async generators of encoded chunks, for streaming responses.
+
+`executor` is passed to `loop.run_in_executor`, None uses the loop's default thread pool.
+A `ProcessPoolExecutor` works too, and decodes without holding this process' GIL.
+"""
+import asyncio
+from concurrent.futures import Executor
+import io
+import itertools
+import struct
+from typing import *
+
+from .binary import BufferStream, get_struct
+from .table import BaseLineTable
+from .trk import track as trk
+from .trk.parallel import decode_chunk
+from .trk.table import LineTable as TRK_LineTable
+from .lrpk import records
+from .lrpk import track as lrpk
+
+AsyncSource = Union[asyncio.StreamReader, AsyncIterable[bytes]]
+
+
+class AsyncBuffer:
+    """Bytes received from an `AsyncSource` that haven't been consumed yet."""
+
+    def __init__(self, source: AsyncSource, read_size: int = 1 << 16) -> None:
+        if hasattr(source, "read"):
+            self.receive = lambda: source.read(read_size)
+        else:
+            iterator = source.__aiter__()
+            async def receive() -> bytes:
+                try:
+                    return await iterator.__anext__()
+                except StopAsyncIteration:
+                    return b""
+            self.receive = receive
+        self.data = bytearray()
+        self.eof = False
+
+    async def fill(self, size: int) -> bool:
+        """Receives data until at least `size` bytes are buffered, returns False if the source ends first."""
+        while len(self.data) < size and not self.eof:
+            chunk = await self.receive()
+            if chunk:
+                self.data += chunk
+            else:
+                self.eof = True
+        return len(self.data) >= size
+
+    async def read_all(self) -> bytes:
+        while not self.eof:
+            await self.fill(len(self.data) + 1)
+        return bytes(self.data)
+
+    def consume(self, size: int):
+        del self.data[:size]
+
+
+def complete_records(data, start: int, count: int, layouts: List[trk.LineLayout]) -> Tuple[int, int]:
+    """Counts how many of `count` line records starting at `start` are wholly in `data`, and where they end."""
+    end = len(data)
+    offset = start
+    for i in range(count):
+        if offset >= end:
+            return i, offset
+        layout = layouts[data[offset]]
+        if layout is None:
+            trk.LineType(data[offset] & 0x1f) # raises
+
+        size, trigger = layout
+        if trigger:
+            if offset + trigger >= end:
+                return i, offset
+            if data[offset + trigger]:
+                size += 6
+        if offset + size > end:
+            return i, offset
+        offset += size
+
+    return count, offset
+
+
+async def read_trk(source: AsyncSource, columnar: bool = False, chunk_size: int = 1 << 20, executor: Optional[Executor] = None) -> trk.Track:
+    loop = asyncio.get_running_loop()
+    buffer = AsyncBuffer(source)
+
+    # Header, retried as more data arrives until it parses
+    await buffer.fill(5) # magic number and version
+    while True:
+        stream = BufferStream(buffer.data)
+        try:
+            reader = trk.TRK_Reader(stream, columnar=True)
+            reader.read_header()
+            break
+        except struct.error:
+            if buffer.eof:
+                raise Exception("File ends in the middle of the header") from None
+        finally:
+            stream.release()
+        await buffer.fill(len(buffer.data) + 1)
+    buffer.consume(stream.tell())
+
+    # Lines, decoding each chunk while the next one is received
+    features = reader.track.features
+    layouts = trk.line_layouts(features)
+    table = reader.track.lines
+    remaining = reader.line_count
+    pending = None
+    while remaining or pending is not None:
+        decoding = None
+        if remaining:
+            await buffer.fill(chunk_size)
+            count, end = complete_records(buffer.data, 0, remaining, layouts)
+            if count == 0:
+                if buffer.eof:
+                    raise Exception(f"Line data runs past the end of the file ({reader.line_count} lines declared)")
+                await buffer.fill(len(buffer.data) + 1) # a single record larger than chunk_size
+                continue
+
+            decoding = loop.run_in_executor(executor, decode_chunk, bytes(buffer.data[:end]), 0, count, features)
+            buffer.consume(end)
+            remaining -= count
+
+        if pending is not None:
+            table.extend(await pending)
+        pending = decoding
+
+    # Metadata
+    data = await buffer.read_all()
+    reader.stream = BufferStream(data)
+    reader.get_metadata()
+
+    if not columnar:
+        reader.track.lines = list(table)
+    return reader.track
+
+
+def _decode_lump_records(data: bytes, count: int, fmt: str, use_numpy: Optional[bool]) -> BaseLineTable:
+    table = lrpk.LineTable() if fmt == lrpk.LINEDEF_FORMAT else lrpk.SceneryLineTable()
+    lrpk.LRPK_Reader(data, use_numpy=use_numpy).read_lump_table(table, count, fmt)
+    return table
+
+
+async def read_lrpk(
+    source: AsyncSource,
+    columnar: bool = False,
+    use_numpy: Optional[bool] = None,
+    chunk_lines: int = 65536,
+    executor: Optional[Executor] = None,
+) -> lrpk.Track:
+    loop = asyncio.get_running_loop()
+    data = await AsyncBuffer(source).read_all()
+
+    reader = lrpk.LRPK_Reader(data, use_numpy=use_numpy, columnar=True)
+    reader.read_header()
+    line_lumps = {
+        "LINEDEF": (reader.track.physics_lines, lrpk.LINEDEF_FORMAT),
+        "LINEDECO": (reader.track.scenery_lines, lrpk.LINEDECO_FORMAT),
+    }
+    for lump in reader.read_directory_table():
+        if lump.type in line_lumps:
+            table, fmt = line_lumps[lump.type]
+            size = get_struct(fmt).size
+            reader.stream.seek(lump.position)
+            count = reader.stream.ReadUInt32()
+            start = reader.stream.tell()
+            for i in range(0, count, chunk_lines):
+                n = min(chunk_lines, count - i)
+                chunk = data[start + i * size:start + (i + n) * size]
+                table.extend(await loop.run_in_executor(executor, _decode_lump_records, chunk, n, fmt, use_numpy))
+        elif lump.type in reader.lump_lookup:
+            reader.read_lump(lump)
+
+    if not columnar:
+        reader.track.physics_lines = list(reader.track.physics_lines)
+        reader.track.scenery_lines = list(reader.track.scenery_lines)
+    return reader.track
+
+
+async def read_track(source: AsyncSource, columnar: bool = False, executor: Optional[Executor] = None) -> Union[trk.Track, lrpk.Track]:
+    """Reads a TRK or LRPK file, depending on its magic number."""
+    buffer = AsyncBuffer(source)
+    await buffer.fill(4)
+
+    async def replay() -> AsyncIterator[bytes]:
+        yield bytes(buffer.data)
+        while not buffer.eof:
+            chunk = await buffer.receive()
+            if not chunk:
+                break
+            yield chunk
+
+    if buffer.data.startswith(b"LRPK"):
+        return await read_lrpk(replay(), columnar=columnar, executor=executor)
+    return await read_trk(replay(), columnar=columnar, executor=executor)
+
+
+def _chunks(records: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _encode_trk_records(features: Set[str], chunk: List[tuple]) -> bytes:
+    output = io.BytesIO()
+    writer = trk.TRK_Writer(output, trk.Track([], features, None, None, trk.Vector2d(0, 0)))
+    for record in chunk:
+        writer.write_line_record(*record)
+    writer.stream.flush()
+    return output.getvalue()
+
+def _encode_lrpk_records(chunk: List[tuple], fmt: str, use_numpy: bool) -> bytes:
+    if use_numpy:
+        dtype = records.LINEDEF_DTYPE if fmt == lrpk.LINEDEF_FORMAT else records.LINEDECO_DTYPE
+        return bytes(records.encode_records(dtype, chunk))
+    record = get_struct(fmt)
+    return b"".join(itertools.starmap(record.pack, chunk))
+
+def _encode(track: lrpk.Track, write: Callable[[lrpk.LRPK_Writer], None]) -> bytes:
+    output = io.BytesIO()
+    writer = lrpk.LRPK_Writer(output, track)
+    write(writer)
+    writer.stream.flush()
+    return output.getvalue()
+
+
+async def iter_trk(track: trk.Track, chunk_lines: int = 65536, executor: Optional[Executor] = None) -> AsyncIterator[bytes]:
+    """Encodes a track like `TRK_Writer.write`, yielding the file in chunks of `chunk_lines` lines."""
+    loop = asyncio.get_running_loop()
+    track.update_features()
+
+    output = io.BytesIO()
+    writer = trk.TRK_Writer(output, track)
+    writer.write_header()
+    writer.stream.WriteInt32(len(track.lines))
+    writer.stream.flush()
+    yield output.getvalue()
+
+    lines = track.lines
+    rows = lines.rows() if isinstance(lines, TRK_LineTable) else map(TRK_LineTable.record_of, lines)
+    for chunk in _chunks(rows, chunk_lines):
+        yield await loop.run_in_executor(executor, _encode_trk_records, track.features, chunk)
+
+    output = io.BytesIO()
+    writer = trk.TRK_Writer(output, track)
+    writer.write_metadata()
+    writer.stream.flush()
+    yield output.getvalue()
+
+
+async def iter_lrpk(track: lrpk.Track, chunk_lines: int = 65536, use_numpy: Optional[bool] = None, executor: Optional[Executor] = None) -> AsyncIterator[bytes]:
+    """
+    Encodes a track like `LRPK_Writer.write`, yielding the file in chunks of `chunk_lines` lines.
+    Line records have a fixed size, so the directory table is known before any lines are encoded.
+    """
+    loop = asyncio.get_running_loop()
+    use_numpy = records.HAS_NUMPY if use_numpy is None else use_numpy
+
+    line_lumps = [("LINEDEF", track.physics_lines, lrpk.LineTable, lrpk.LINEDEF_FORMAT)]
+    if len(track.scenery_lines):
+        line_lumps.append(("LINEDECO", track.scenery_lines, lrpk.SceneryLineTable, lrpk.LINEDECO_FORMAT))
+
+    versinfo = _encode(track, lrpk.LRPK_Writer.write_versinfo)
+    riders = _encode(track, lrpk.LRPK_Writer.write_riderdefs)
+    trackdef = _encode(track, lrpk.LRPK_Writer.write_trackdef)
+    rider_size = len(riders) // len(track.riders) if track.riders else 0
+
+    # Same lump order as LRPK_Writer.write
+    position = 12
+    directories = [("VERSINFO", position)]
+    position += len(versinfo)
+    for name, lines, table_type, fmt in line_lumps:
+        directories.append((name, position))
+        position += 4 + len(lines) * get_struct(fmt).size
+    for rider in track.riders:
+        directories.append(("RIDERDEF", position))
+        position += rider_size
+    directories.append(("TRACKDEF", position))
+    position += len(trackdef)
+
+    def write_directories(writer: lrpk.LRPK_Writer):
+        writer.directories = directories
+        writer.write_directories()
+
+    yield b"LRPK" + get_struct("<2I").pack(len(directories), position)
+    yield versinfo
+    for name, lines, table_type, fmt in line_lumps:
+        yield get_struct("<I").pack(len(lines))
+        rows = lines.rows() if isinstance(lines, table_type) else map(table_type.record_of, lines)
+        for chunk in _chunks(rows, chunk_lines):
+            yield await loop.run_in_executor(executor, _encode_lrpk_records, chunk, fmt, use_numpy)
+    yield riders
+    yield trackdef
+    yield _encode(track, write_directories)
@@ -0,0 +1,138 @@
+"""Reading, transforming and re-writing many tracks at once over a process pool."""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import glob
+import os
+import time
+import traceback
+from typing import *
+
+from .compression import codec_for_path, decompressing
+from .files import open_trk, open_lrpk
+from .trk.table import LineTable as TRK_LineTable
+from .trk.track import Features, Track as TRK_Track, TRK_Writer
+from .lrpk.track import Track as LRPK_Track, LRPK_Writer
+
+AnyTrack = Union[TRK_Track, LRPK_Track]
+
+
+def detect_format(path: str) -> str:
+    """Returns "trk" or "lrpk" based on the file's magic number, looking through compression."""
+    with open(path, "rb") as f:
+        magic = decompressing(f).read(4)
+    if magic == b"TRK\xf2":
+        return "trk"
+    if magic == b"LRPK":
+        return "lrpk"
+    raise Exception(f"Unrecognised track file {path!r} (magic number {magic!r})")
+
+
+def read_track(path: str) -> AnyTrack:
+    if detect_format(path) == "trk":
+        return open_trk(path, columnar=True)
+    
+    with open_lrpk(path, columnar=True) as archive:
+        return archive.read()
+
+
+def write_track(path: str, track: AnyTrack):
+    """Writes a track, compressed if the path ends in ".gz", ".bz2" or ".xz"."""
+    compression = codec_for_path(path)
+    with open(path, "wb") as f:
+        if isinstance(track, TRK_Track):
+            TRK_Writer(f, track, compression=compression).write()
+        else:
+            LRPK_Writer(f, track, compression=compression).write()
+
+
+def roundtrip(track: AnyTrack) -> AnyTrack:
+    return track
+
+def normalize(track: AnyTrack) -> AnyTrack:
+    """
+    Drops the TRK line features (and song info feature) that no line needs, so records
+    take no more space than they have to; `TRK_Writer` enables the ones that are used again.
+    LRPK tracks are only re-saved, which leaves one lump of each kind.
+    """
+    if isinstance(track, TRK_Track):
+        track.features -= {Features.red_multiplier, Features.scenery_width, Features.ignorable_trigger, Features.song_info}
+        if isinstance(track.lines, TRK_LineTable):
+            triggers = any(track.lines.trigger)
+        else:
+            triggers = any(getattr(line, "zoom_trigger", None) is not None for line in track.lines)
+        if triggers:
+            track.features.add(Features.ignorable_trigger)
+    return track
+
+# Transforms are looked up by name so that jobs stay picklable.
+TRANSFORMS: Dict[str, Callable[[AnyTrack], AnyTrack]] = {
+    "roundtrip": roundtrip,
+    "normalize": normalize,
+}
+
+
+@dataclass
+class BatchJob:
+    source: str
+    destination: str
+    transform: str = "roundtrip"
+
+
+@dataclass
+class BatchResult:
+    job: BatchJob
+    seconds: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def run_job(job: BatchJob) -> BatchResult:
+    """Read -> transform -> write a single file, capturing any error instead of raising it."""
+    start = time.perf_counter()
+    try:
+        track = TRANSFORMS[job.transform](read_track(job.source))
+        directory = os.path.dirname(job.destination)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        write_track(job.destination, track)
+    except Exception:
+        return BatchResult(job, time.perf_counter() - start, traceback.format_exc())
+    
+    return BatchResult(job, time.perf_counter() - start)
+
+
+def expand_inputs(patterns: Iterable[str]) -> List[str]:
+    """Expands (recursive) glob patterns into a sorted list of unique files."""
+    paths = set()
+    for pattern in patterns:
+        paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def plan_jobs(paths: List[str], output_dir: str, transform: str = "roundtrip") -> List[BatchJob]:
+    """Mirrors the input files into `output_dir`, relative to their common directory."""
+    if transform not in TRANSFORMS:
+        raise Exception(f"Unknown transform {transform!r}")
+    if not paths:
+        return []
+    
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return [
+        BatchJob(path, os.path.join(output_dir, os.path.relpath(os.path.abspath(path), root)), transform)
+        for path in paths
+    ]
+
+
+def run_batch(jobs: Iterable[BatchJob], workers: Optional[int] = None) -> Iterator[BatchResult]:
+    """
+    Runs `jobs` over a process pool of `workers` processes (default: one per core),
+    yielding results as soon as each file is done. Failed files don't stop the batch,
+    their result carries the error instead.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
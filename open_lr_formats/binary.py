@@ -1,5 +1,34 @@
-from struct import *
+from struct import Struct
 import io
+import mmap
+from typing import *
+
+# All of the formats handled here are little-endian. Multi-field formats
+# should start with "<" so that no alignment padding is inserted.
+_structs: Dict[str, Struct] = {}
+
+def get_struct(fmt: str) -> Struct:
+    """Returns a cached, precompiled `Struct` for `fmt`."""
+    compiled = _structs.get(fmt)
+    if compiled is None:
+        compiled = _structs[fmt] = Struct(fmt)
+    return compiled
+
+# Anything a reader can be constructed from, see `as_stream`.
+ReadableBuffer = Union[io.BufferedReader, bytes, bytearray, memoryview, mmap.mmap]
+
+CHAR = get_struct("<c")
+BOOL = get_struct("<?")
+INT8 = get_struct("<b")
+UINT8 = get_struct("<B")
+INT16 = get_struct("<h")
+UINT16 = get_struct("<H")
+INT32 = get_struct("<i")
+UINT32 = get_struct("<I")
+INT64 = get_struct("<q")
+UINT64 = get_struct("<Q")
+SINGLE = get_struct("<f")
+DOUBLE = get_struct("<d")
 
 class BinaryStream:
     def __init__(self, base_stream: io.BufferedReader):
@@ -12,40 +41,40 @@ class BinaryStream:
         return self.base_stream.read(length)
 
     def ReadChar(self) -> int:
-        return self.unpack('c')
+        return self.read_primitive(CHAR)
 
     def ReadInt8(self) -> int:
-        return self.unpack('b')
+        return self.read_primitive(INT8)
 
     def ReadUInt8(self) -> int:
-        return self.unpack('B')
+        return self.read_primitive(UINT8)
 
     def ReadBool(self) -> bool:
-        return self.unpack('?')
+        return self.read_primitive(BOOL)
 
     def ReadInt16(self) -> int:
-        return self.unpack('h', 2)
+        return self.read_primitive(INT16)
 
     def ReadUInt16(self) -> int:
-        return self.unpack('H', 2)
+        return self.read_primitive(UINT16)
 
     def ReadInt32(self) -> int:
-        return self.unpack('i', 4)
+        return self.read_primitive(INT32)
 
     def ReadUInt32(self) -> int:
-        return self.unpack('I', 4)
+        return self.read_primitive(UINT32)
 
     def ReadInt64(self) -> int:
-        return self.unpack('q', 8)
+        return self.read_primitive(INT64)
 
     def ReadUInt64(self) -> int:
-        return self.unpack('Q', 8)
+        return self.read_primitive(UINT64)
 
     def ReadSingle(self) -> float:
-        return self.unpack('f', 4)
+        return self.read_primitive(SINGLE)
 
     def ReadDouble(self) -> float:
-        return self.unpack('d', 8)
+        return self.read_primitive(DOUBLE)
 
     def ReadString(self) -> str:
         length = self.ReadUInt16()
@@ -54,7 +83,6 @@ class BinaryStream:
 
     def ReadStringSingleByteLength(self) -> str:
         length = self.ReadUInt8()
-        print(length)
         return self.unpack(str(length) + 's', length).decode("utf8")
     
     def Read7BitEncodedInt(self) -> int:
@@ -78,40 +106,40 @@ class BinaryStream:
         self.base_stream.write(value)
 
     def WriteChar(self, value):
-        self.pack('c', value)
+        self.write_primitive(CHAR, value)
 
     def WriteBool(self, value):
-        self.pack('?', value)
+        self.write_primitive(BOOL, value)
 
     def WriteInt8(self, value):
-        self.pack('b', value)
+        self.write_primitive(INT8, value)
     
     def WriteUInt8(self, value):
-        self.pack('B', value)
+        self.write_primitive(UINT8, value)
     
     def WriteInt16(self, value):
-        self.pack('h', value)
+        self.write_primitive(INT16, value)
 
     def WriteUInt16(self, value):
-        self.pack('H', value)
+        self.write_primitive(UINT16, value)
 
     def WriteInt32(self, value):
-        self.pack('i', value)
+        self.write_primitive(INT32, value)
 
     def WriteUInt32(self, value):
-        self.pack('I', value)
+        self.write_primitive(UINT32, value)
 
     def WriteInt64(self, value):
-        self.pack('q', value)
+        self.write_primitive(INT64, value)
 
     def WriteUInt64(self, value):
-        self.pack('Q', value)
+        self.write_primitive(UINT64, value)
 
     def WriteSingle(self, value):
-        self.pack('f', value)
+        self.write_primitive(SINGLE, value)
 
     def WriteDouble(self, value):
-        self.pack('d', value)
+        self.write_primitive(DOUBLE, value)
 
     def WriteString(self, value):
         # BUG: should encode, and take length of encoded
@@ -136,9 +164,367 @@ class BinaryStream:
         length = len(value)
         self.Write7BitEncodedInt(length)
         self.pack(f"{length}s", value.encode("utf-8"))
+
+    def tell(self) -> int:
+        return self.base_stream.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.base_stream.seek(offset, whence)
+
+    def close(self):
+        """Closes the underlying stream."""
+        self.base_stream.close()
+
+    def skip(self, length: int):
+        if self.base_stream.seekable():
+            self.base_stream.seek(length, io.SEEK_CUR)
+        else:
+            self.base_stream.read(length)
+
+    def peek(self, length: int = 1):
+        """Returns up to `length` upcoming bytes without consuming them."""
+        peek = getattr(self.base_stream, "peek", None)
+        if peek is not None:
+            return peek(length)[:length]
+        
+        pos = self.base_stream.tell()
+        data = self.base_stream.read(length)
+        self.base_stream.seek(pos)
+        return data
+
+    def flush(self):
+        pass
+
+    def reserve(self, fmt: str) -> int:
+        """Writes a zeroed placeholder for a record of `fmt` to be `patch`ed later, returning its position."""
+        position = self.tell()
+        self.WriteBytes(bytes(get_struct(fmt).size))
+        return position
+
+    def patch(self, position: int, fmt: str, *values):
+        """Overwrites a placeholder written by `reserve`."""
+        end = self.tell()
+        self.seek(position)
+        self.write_struct(fmt, *values)
+        self.seek(end)
+
+    def read_primitive(self, compiled: Struct):
+        return compiled.unpack(self.ReadBytes(compiled.size))[0]
+
+    def write_primitive(self, compiled: Struct, value):
+        self.WriteBytes(compiled.pack(value))
+
+    def read_record(self, compiled: Struct) -> tuple:
+        """Decodes a whole record with a single read, see `read_struct`."""
+        return compiled.unpack(self.ReadBytes(compiled.size))
+
+    def read_struct(self, fmt: str) -> tuple:
+        """Decodes a whole record described by `fmt` with a single read."""
+        return self.read_record(get_struct(fmt))
+
+    def write_struct(self, fmt: str, *values):
+        """Encodes `values` as a single record described by `fmt`."""
+        self.WriteBytes(get_struct(fmt).pack(*values))
     
     def pack(self, fmt, data):
-        return self.WriteBytes(pack(fmt, data))
+        return self.WriteBytes(get_struct(fmt).pack(data))
+
+    def unpack(self, fmt, length = 1):
+        return get_struct(fmt).unpack(self.ReadBytes(length))[0]
+
+
+class BufferStream(BinaryStream):
+    """
+    A read-only `BinaryStream` over a whole in-memory buffer (`bytes`,
+    `bytearray`, `memoryview` or `mmap`).
+    Values are decoded in place with `unpack_from`, and `ReadBytes` returns
+    zero-copy `memoryview` slices of the buffer.
+    """
+    def __init__(self, buffer, offset: int = 0):
+        self.base_stream = buffer
+        self.view = memoryview(buffer)
+        if self.view.format != "B" or self.view.ndim != 1:
+            self.view = self.view.cast("B")
+        self.offset = offset
+
+    def ReadByte(self):
+        return self.ReadBytes(1)
+
+    def ReadBytes(self, length):
+        if length < 0:
+            raise ValueError(f"Negative read length {length}")
+        start = self.offset
+        self.offset = min(start + length, len(self.view))
+        return self.view[start:self.offset]
+
+    def WriteBytes(self, value):
+        raise io.UnsupportedOperation("BufferStream is read-only")
+
+    def tell(self) -> int:
+        return self.offset
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.offset
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.offset = offset
+        return offset
+
+    def release(self):
+        """Releases this stream's view of the buffer, without closing the buffer."""
+        self.view.release()
+
+    def close(self):
+        """Releases the buffer, closing it if it can be closed (e.g. an `mmap`)."""
+        self.release()
+        close = getattr(self.base_stream, "close", None)
+        if close is not None:
+            close()
+
+    def skip(self, length: int):
+        self.offset += length
+
+    def peek(self, length: int = 1):
+        return self.view[self.offset:self.offset + length]
+
+    def read_primitive(self, compiled: Struct):
+        value = compiled.unpack_from(self.view, self.offset)[0]
+        self.offset += compiled.size
+        return value
+
+    def read_record(self, compiled: Struct) -> tuple:
+        values = compiled.unpack_from(self.view, self.offset)
+        self.offset += compiled.size
+        return values
+
+    def read_struct(self, fmt: str) -> tuple:
+        return self.read_record(get_struct(fmt))
+
+    def unpack(self, fmt, length = 1):
+        return self.read_primitive(get_struct(fmt))
+
+
+class BufferedWriteStream(BinaryStream):
+    """
+    A write-only `BinaryStream` that encodes into a growable `bytearray` with `pack_into`,
+    writing to the sink in chunks of about `chunk_size` bytes (and on `flush`).
+    Placeholders from `reserve` are patched in the buffer, so as long as they are pending
+    nothing after them is written out. That lets formats with back-patched headers go
+    to non-seekable sinks such as pipes, at the cost of buffering until the patch.
+    With a seekable sink pending placeholders don't hold anything back, they are patched in place.
+    """
+    def __init__(self, sink, chunk_size: int = 1 << 20):
+        self.base_stream = sink
+        self.chunk_size = chunk_size
+        self.sink_seekable = getattr(sink, "seekable", lambda: False)()
+        self.buffer = bytearray(min(chunk_size, 1 << 16))
+        # positions are the sink's, so output can start part way into a file
+        self.start = sink.tell() if self.sink_seekable else 0 # position of buffer[0] in the output
+        self.length = 0 # bytes of the buffer in use
+        self.position = self.start
+        self.size = self.start # end of the output, once the sink has been seeked into
+        self.pending: Set[int] = set()
+
+    def ReadBytes(self, length):
+        raise io.UnsupportedOperation("BufferedWriteStream is write-only")
+
+    def allocate(self, size: int) -> int:
+        """Advances the position by `size`, returning where in the buffer to write."""
+        offset = self.position - self.start
+        end = offset + size
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(max(end - len(self.buffer), len(self.buffer))))
+        
+        self.position += size
+        if end > self.length:
+            self.length = end
+        return offset
+
+    def WriteBytes(self, value):
+        value = memoryview(value).cast("B")
+        offset = self.allocate(len(value))
+        self.buffer[offset:offset + len(value)] = value
+        if self.length >= self.chunk_size:
+            self.flush_chunk()
+
+    def write_primitive(self, compiled: Struct, value):
+        # allocate() inlined, this is the hot path for line records
+        offset = self.position - self.start
+        end = offset + compiled.size
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(max(end - len(self.buffer), len(self.buffer))))
+        
+        compiled.pack_into(self.buffer, offset, value)
+        self.position += compiled.size
+        if end > self.length:
+            self.length = end
+            if end >= self.chunk_size:
+                self.flush_chunk()
+
+    def write_struct(self, fmt: str, *values):
+        compiled = get_struct(fmt)
+        offset = self.position - self.start
+        end = offset + compiled.size
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(max(end - len(self.buffer), len(self.buffer))))
+        
+        compiled.pack_into(self.buffer, offset, *values)
+        self.position += compiled.size
+        if end > self.length:
+            self.length = end
+            if end >= self.chunk_size:
+                self.flush_chunk()
+
+    def pack(self, fmt, data):
+        self.write_struct(fmt, data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self.size = max(self.size, self.start + self.length)
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        
+        if not self.start <= offset <= self.start + self.length:
+            # Outside of the buffer, only possible by seeking the sink itself.
+            self.flush()
+            self.base_stream.seek(offset)
+            self.start = offset
+        
+        self.position = offset
+        return offset
+
+    def reserve(self, fmt: str) -> int:
+        if not self.sink_seekable:
+            self.pending.add(self.position)
+        return super().reserve(fmt)
+
+    def patch(self, position: int, fmt: str, *values):
+        self.pending.discard(position)
+        super().patch(position, fmt, *values)
+
+    def write_out(self, size: int):
+        with memoryview(self.buffer) as view:
+            self.base_stream.write(view[:size])
+        del self.buffer[:size]
+        self.start += size
+        self.length -= size
+
+    def flush_chunk(self):
+        """Writes out everything before the first pending placeholder and the current position."""
+        limit = min(self.pending, default=self.start + self.length)
+        size = min(limit, self.position) - self.start
+        if size > 0:
+            self.write_out(size)
+
+    def flush(self):
+        """Writes out the whole buffer, pending placeholders or not."""
+        if self.length:
+            self.write_out(self.length)
+        if self.position != self.start:
+            # Flushed while patching, carry on from there in the sink.
+            self.base_stream.seek(self.position)
+            self.start = self.position
+        
+        flush = getattr(self.base_stream, "flush", None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        self.flush()
+        self.base_stream.close()
+
+
+class CountingStream(BinaryStream):
+    """
+    Wraps another `BinaryStream`, counting the calls and bytes of each primitive read or written
+    (keyed by struct format, raw bytes as "bytes") with `stats.count`, see `instrument.Stats`.
+    Anything else is passed straight through to the wrapped stream.
+    """
+    def __init__(self, stream: BinaryStream, stats):
+        self.stream = stream
+        self.base_stream = stream.base_stream
+        self.count = stats.count
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def ReadByte(self):
+        return self.ReadBytes(1)
+
+    def ReadBytes(self, length):
+        data = self.stream.ReadBytes(length)
+        self.count("bytes", len(data))
+        return data
+
+    def WriteBytes(self, value):
+        self.count("bytes", memoryview(value).nbytes)
+        self.stream.WriteBytes(value)
+
+    def read_primitive(self, compiled: Struct):
+        self.count(compiled.format, compiled.size)
+        return self.stream.read_primitive(compiled)
+
+    def write_primitive(self, compiled: Struct, value):
+        self.count(compiled.format, compiled.size)
+        self.stream.write_primitive(compiled, value)
+
+    def read_record(self, compiled: Struct) -> tuple:
+        self.count(compiled.format, compiled.size)
+        return self.stream.read_record(compiled)
+
+    def write_struct(self, fmt: str, *values):
+        self.count(fmt, get_struct(fmt).size)
+        self.stream.write_struct(fmt, *values)
+
+    def pack(self, fmt, data):
+        self.count("bytes" if fmt.endswith("s") else fmt, get_struct(fmt).size)
+        return self.stream.pack(fmt, data)
 
     def unpack(self, fmt, length = 1):
-        return unpack(fmt, self.ReadBytes(length))[0]
\ No newline at end of file
+        self.count("bytes" if fmt.endswith("s") else fmt, length)
+        return self.stream.unpack(fmt, length)
+
+    def tell(self) -> int:
+        return self.stream.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.stream.seek(offset, whence)
+
+    def close(self):
+        self.stream.close()
+
+    def skip(self, length: int):
+        self.stream.skip(length)
+
+    def peek(self, length: int = 1):
+        return self.stream.peek(length)
+
+    def flush(self):
+        self.stream.flush()
+
+    def reserve(self, fmt: str) -> int:
+        self.count(fmt, get_struct(fmt).size)
+        return self.stream.reserve(fmt)
+
+    def patch(self, position: int, fmt: str, *values):
+        self.stream.patch(position, fmt, *values)
+
+
+def as_stream(buffer: ReadableBuffer) -> BinaryStream:
+    """
+    Wraps `buffer` in the appropriate `BinaryStream`.
+    In-memory buffers get a `BufferStream`, anything else is treated as a file object.
+    """
+    if isinstance(buffer, BinaryStream):
+        return buffer
+    if isinstance(buffer, (bytes, bytearray, memoryview, mmap.mmap)):
+        return BufferStream(buffer)
+    return BinaryStream(buffer)
@@ -0,0 +1,229 @@
+"""
+On-disk cache of parsed tracks, keyed by a hash of the file contents.
+
+Entries store the track's line tables as raw column bytes after a small JSON header,
+so a hit is one memory copy per column instead of a field by field decode.
+Tracks returned by the cache always hold line tables.
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from typing import *
+
+from .binary import BufferStream, ReadableBuffer, get_struct
+from .compression import decompressed
+from .files import map_file
+from .table import BaseLineTable
+from .trk import track as trk
+from .trk.table import LineTable as TRK_LineTable
+from .lrpk import track as lrpk
+
+MAGIC = b"LRTC"
+VERSION = 1
+_HEADER = get_struct("<4sI")
+_ALIGNMENT = 8
+
+AnyTrack = Union[trk.Track, lrpk.Track]
+
+
+def _table(table_type: Type[BaseLineTable], lines) -> BaseLineTable:
+    return lines if isinstance(lines, table_type) else table_type.from_lines(lines)
+
+
+def dump_track(track: AnyTrack, f: BinaryIO):
+    """Writes a track in the cache's columnar layout."""
+    if isinstance(track, trk.Track):
+        header = {
+            "format": "trk",
+            "features": sorted(track.features),
+            "songinfo": None if track.songinfo is None else [track.songinfo.name, track.songinfo.offset],
+            "metadata": track.metadata,
+            "rider": [track.riderPosition.x, track.riderPosition.y],
+        }
+        tables = {"lines": _table(TRK_LineTable, track.lines)}
+    else:
+        header = {
+            "format": "lrpk",
+            "name": track.name,
+            "author": track.author,
+            "grid_model": track.grid_model,
+            "version_info": vars(track.version_info),
+            "riders": [[rider.position.x, rider.position.y] for rider in track.riders],
+        }
+        tables = {
+            "physics_lines": _table(lrpk.LineTable, track.physics_lines),
+            "scenery_lines": _table(lrpk.SceneryLineTable, track.scenery_lines),
+        }
+    
+    header["byteorder"] = sys.byteorder
+    header["lengths"] = {name: len(table) for name, table in tables.items()}
+    encoded = json.dumps(header).encode("utf8")
+
+    f.write(_HEADER.pack(MAGIC, len(encoded)))
+    f.write(encoded)
+    position = _HEADER.size + len(encoded)
+    for table in tables.values():
+        for column in table.column_arrays():
+            padding = -position % _ALIGNMENT
+            f.write(bytes(padding))
+            f.write(column)
+            position += padding + column.itemsize * len(column)
+
+
+def load_track(data: ReadableBuffer) -> AnyTrack:
+    """Reads a track written by `dump_track`."""
+    with memoryview(data) as view:
+        return _load_track(view)
+
+
+def _load_track(view: memoryview) -> AnyTrack:
+    magic, header_length = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise Exception(f"Incorrect cache magic number {magic!r}")
+    
+    position = _HEADER.size + header_length
+    header = json.loads(str(view[_HEADER.size:position], "utf8"))
+    swap = header["byteorder"] != sys.byteorder
+
+    def read_table(table_type: Type[BaseLineTable], name: str) -> BaseLineTable:
+        nonlocal position
+        table = table_type()
+        length = header["lengths"][name]
+        for column in table.column_arrays():
+            position += -position % _ALIGNMENT
+            size = column.itemsize * length
+            if position + size > len(view):
+                raise Exception(f"Truncated cache entry, column of {length} {name} needs {size} bytes at {position} but there are {len(view)}")
+            column.frombytes(view[position:position + size])
+            if swap:
+                column.byteswap()
+            position += size
+        return table
+
+    if header["format"] == "trk":
+        songinfo = header["songinfo"]
+        return trk.Track(
+            read_table(TRK_LineTable, "lines"),
+            set(header["features"]),
+            None if songinfo is None else trk.SongInfo(*songinfo),
+            header["metadata"],
+            trk.Vector2d(*header["rider"]),
+        )
+    
+    return lrpk.Track(
+        header["name"],
+        header["author"],
+        header["grid_model"],
+        lrpk.VersionInfo(**header["version_info"]),
+        read_table(lrpk.LineTable, "physics_lines"),
+        read_table(lrpk.SceneryLineTable, "scenery_lines"),
+        [lrpk.Rider(lrpk.Vector2d(x, y)) for x, y in header["riders"]],
+    )
+
+
+class TrackCache:
+    """
+    Caches decoded tracks in `directory`, evicting the least recently used entries
+    once they take up more than `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(data: ReadableBuffer) -> str:
+        digest = hashlib.blake2b(data, digest_size=20)
+        digest.update(VERSION.to_bytes(4, "little"))
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".lrtc")
+
+    def get(self, key: str) -> Optional[AnyTrack]:
+        """The cached track, or None on a miss. Entries that can't be loaded are removed and count as misses."""
+        path = self.path(key)
+        try:
+            data = map_file(path)
+        except FileNotFoundError:
+            return None
+        
+        try:
+            track = load_track(data)
+        except Exception:
+            track = None
+        finally:
+            if not isinstance(data, bytes):
+                data.close()
+        
+        if track is None:
+            # truncated or corrupt, the track is decoded again
+            self.discard(path)
+            return None
+        
+        try:
+            os.utime(path) # mark as recently used
+        except FileNotFoundError:
+            pass
+        return track
+
+    @staticmethod
+    def discard(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def put(self, key: str, track: AnyTrack):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                dump_track(track, f)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".lrtc"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.discard(path)
+            total -= size
+
+    def read(self, source: Union[str, os.PathLike, ReadableBuffer]) -> AnyTrack:
+        """
+        Returns the track in `source` (a path or the file's contents), TRK or LRPK, compressed or not,
+        decoding it and storing it in the cache on a miss.
+        """
+        data = map_file(source) if isinstance(source, (str, os.PathLike)) else source
+        try:
+            key = self.key(data) # the data as stored, compressed or not, so hits never decompress
+            track = self.get(key)
+            if track is None:
+                stream = BufferStream(decompressed(data))
+                try:
+                    if stream.peek(4) == b"LRPK":
+                        track = lrpk.LRPK_Reader(stream, columnar=True).read()
+                    else:
+                        track = trk.TRK_Reader(stream, columnar=True).read()
+                finally:
+                    stream.release()
+                self.put(key, track)
+            return track
+        finally:
+            if data is not source and not isinstance(data, bytes):
+                data.close()
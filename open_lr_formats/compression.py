@@ -0,0 +1,113 @@
+"""
+Transparent gzip, bz2 and lzma compression of track files.
+
+Compressed files are recognised by their magic bytes. `TRK_Reader` decompresses them as it
+reads, so the whole file is never inflated at once. LRPK keeps its directory at the end of the
+file and needs random access, so `LRPK_Reader` decompresses them into memory first.
+The writers compress their output when given a `compression` codec.
+"""
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+from typing import *
+
+from .binary import BinaryStream
+
+CODECS = ("gzip", "bz2", "lzma")
+MAGIC_NUMBERS = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "lzma": b"\xfd7zXZ\x00", # .xz container
+}
+MAGIC_SIZE = max(map(len, MAGIC_NUMBERS.values()))
+SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma"}
+
+_OPENERS = {"gzip": gzip.open, "bz2": bz2.open, "lzma": lzma.open}
+
+
+def detect_codec(header: bytes) -> Optional[str]:
+    """Returns the codec of data starting with `header`, or None if it isn't compressed."""
+    for codec, magic in MAGIC_NUMBERS.items():
+        if header.startswith(magic):
+            return codec
+    return None
+
+
+def codec_for_path(path: Union[str, os.PathLike]) -> Optional[str]:
+    """The codec implied by a file's suffix (".gz", ".bz2" or ".xz"), if any."""
+    return SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def peek_magic(buffer) -> bytes:
+    """Returns the first bytes of `buffer` without consuming them, or b"" if that isn't possible."""
+    if isinstance(buffer, (bytes, bytearray, memoryview, mmap.mmap)):
+        return bytes(buffer[:MAGIC_SIZE])
+
+    peek = getattr(buffer, "peek", None)
+    if peek is not None:
+        return peek(MAGIC_SIZE)[:MAGIC_SIZE]
+
+    if getattr(buffer, "seekable", lambda: False)():
+        position = buffer.tell()
+        header = buffer.read(MAGIC_SIZE)
+        buffer.seek(position)
+        return header
+    return b""
+
+
+def open_compressed(file, codec: str, buffer_size: int = io.DEFAULT_BUFFER_SIZE) -> io.BufferedReader:
+    """
+    Opens a path or file object for streaming decompression, closing the result leaves a file object open.
+    It is read through a `BufferedReader` so that small reads of single values stay cheap.
+    """
+    if codec not in _OPENERS:
+        raise Exception(f"Unsupported compression {codec!r}, expected one of {', '.join(CODECS)}")
+    return io.BufferedReader(_OPENERS[codec](file, "rb"), buffer_size)
+
+
+class _GzipWriter(gzip.GzipFile):
+    # GzipFile claims to be seekable in write mode but only seeks forwards,
+    # writers have to buffer back-patched values instead of seeking back to them.
+    def seekable(self) -> bool:
+        return False
+
+
+def compressor(fileobj: BinaryIO, codec: str, level: Optional[int] = None) -> BinaryIO:
+    """
+    Wraps `fileobj` so that whatever is written to it is compressed with `codec`.
+    `level` defaults to each codec's own default. The result has to be closed to finish
+    the compressed stream, which leaves `fileobj` open.
+    """
+    if codec == "gzip":
+        return _GzipWriter(fileobj=fileobj, mode="wb", compresslevel=9 if level is None else level)
+    if codec == "bz2":
+        return bz2.BZ2File(fileobj, "wb", compresslevel=9 if level is None else level)
+    if codec == "lzma":
+        return lzma.LZMAFile(fileobj, "wb", preset=level)
+    raise Exception(f"Unsupported compression {codec!r}, expected one of {', '.join(CODECS)}")
+
+
+def decompressing(buffer):
+    """`buffer` itself, or a streaming decompressor over it if it is compressed."""
+    if isinstance(buffer, BinaryStream):
+        return buffer
+
+    codec = detect_codec(peek_magic(buffer))
+    if codec is None:
+        return buffer
+    if isinstance(buffer, (bytes, bytearray, memoryview)):
+        buffer = io.BytesIO(buffer)
+    return open_compressed(buffer, codec)
+
+
+def decompressed(buffer):
+    """`buffer` itself, or all of its decompressed contents if it is compressed."""
+    source = decompressing(buffer)
+    if source is buffer:
+        return buffer
+
+    with source:
+        return source.read()
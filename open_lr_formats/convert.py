@@ -0,0 +1,163 @@
+"""
+Conversion between the TRK and LRPK formats.
+
+Line types map as TRK Standard <-> LRPK 0 (floor) and TRK Acceleration <-> LRPK 1
+(accel), inverted <-> flipped, and extensions carry over unchanged.
+Scenery coordinates are narrowed to the 32 bit floats LINEDECO stores.
+The TRK rider position becomes a single RIDERDEF, and back again from the first rider.
+
+Data with no equivalent in the other format is dropped:
+red multipliers, scenery widths, zoom triggers, song info and metadata from TRK,
+and the name, author, grid model, version info, scenery ids and extra riders from LRPK.
+"""
+import tempfile
+from typing import *
+
+from .binary import ReadableBuffer, get_struct
+from .trk import track as trk
+from .trk.table import LineTable as TRK_LineTable
+from .lrpk import track as lrpk
+
+# TRK LineType value -> LRPK PhysicsLine.type
+TRK_TO_LRPK_TYPE = {
+    trk.LineType.Standard.value: 0,
+    trk.LineType.Acceleration.value: 1,
+}
+LRPK_TO_TRK_TYPE = {value: key for key, value in TRK_TO_LRPK_TYPE.items()}
+
+_SCENERY = trk.LineType.Scenery.value
+_COORDINATES = get_struct("<4f")
+
+
+def trk_record_to_lrpk(record: tuple) -> tuple:
+    """Converts a TRK physics line record into an LRPK `LineTable` record."""
+    id, x1, y1, x2, y2, flags = record[:6]
+    try:
+        line_type = TRK_TO_LRPK_TYPE[flags & 0x1f]
+    except KeyError:
+        raise Exception(f"Line {id} is not a physics line") from None
+    return (id, x1, y1, x2, y2, line_type, flags >> 7, (flags >> 5) & 0x3)
+
+def lrpk_record_to_trk(record: tuple) -> tuple:
+    """Converts an LRPK `LineTable` record into a TRK `LineTable` record."""
+    id, x1, y1, x2, y2, line_type, flipped, extension = record
+    try:
+        flags = (bool(flipped) << 7) + (extension << 5) + LRPK_TO_TRK_TYPE[line_type]
+    except KeyError:
+        raise Exception(f"Line {id} has unsupported LRPK line type {line_type}") from None
+    return (id, x1, y1, x2, y2, flags, 1, 10, False, 0.0, 0)
+
+def lrpk_scenery_record_to_trk(record: tuple) -> tuple:
+    """Converts an LRPK `SceneryLineTable` record into a TRK `LineTable` record."""
+    id, x1, y1, x2, y2 = record
+    return (-1, x1, y1, x2, y2, _SCENERY, 1, 10, False, 0.0, 0)
+
+
+def trk_line_to_lrpk(line: trk.BaseLine, id: int = 0) -> Union[lrpk.PhysicsLine, lrpk.SceneryLine]:
+    """Converts a single line. TRK scenery lines have no id, so it has to be given."""
+    if isinstance(line, trk.SceneryLine):
+        x1, y1, x2, y2 = _COORDINATES.unpack(_COORDINATES.pack(line.start.x, line.start.y, line.end.x, line.end.y))
+        return lrpk.SceneryLine(id, lrpk.Vector2d(x1, y1), lrpk.Vector2d(x2, y2))
+    return lrpk.LineTable.make_line(trk_record_to_lrpk(TRK_LineTable.record_of(line)))
+
+def lrpk_line_to_trk(line: Union[lrpk.PhysicsLine, lrpk.SceneryLine]) -> trk.BaseLine:
+    if isinstance(line, lrpk.SceneryLine):
+        return TRK_LineTable.make_line(lrpk_scenery_record_to_trk(lrpk.SceneryLineTable.record_of(line)))
+    return TRK_LineTable.make_line(lrpk_record_to_trk(lrpk.LineTable.record_of(line)))
+
+
+def trk_to_lrpk(source: ReadableBuffer, destination, name: str = "", author: str = "", grid_model: int = 0, spool_size: int = 64 << 20):
+    """
+    Streams a TRK file into an LRPK file, one line record at a time.
+    Physics lines are written as they are read. Scenery lines belong to the later LINEDECO lump,
+    so their coordinates are spooled (to disk beyond `spool_size` bytes) until the LINEDEF lump
+    is done, then given ids following the largest physics line id.
+    `destination` doesn't need to be seekable, back-patched values are buffered by the writer.
+    """
+    reader = trk.TRK_Reader(source)
+    reader.read_header()
+    rider = reader.track.riderPosition
+
+    header = lrpk.Track(
+        name, author, grid_model, lrpk.VersionInfo(), [], [],
+        [lrpk.Rider(lrpk.Vector2d(rider.x, rider.y))]
+    )
+    spool = tempfile.SpooledTemporaryFile(spool_size)
+    max_id = -1
+
+    def physics_lines():
+        nonlocal max_id
+        for i in range(reader.line_count):
+            record = reader.read_line_record()
+            if record[5] & 0x1f == _SCENERY:
+                spool.write(_COORDINATES.pack(*record[1:5]))
+                continue
+            
+            max_id = max(max_id, record[0])
+            yield trk_record_to_lrpk(record)
+
+    def scenery_lines():
+        spool.seek(0)
+        next_id = max_id + 1
+        while True:
+            data = spool.read(_COORDINATES.size * 65536)
+            if not data:
+                break
+            for coordinates in _COORDINATES.iter_unpack(data):
+                yield (next_id, *coordinates)
+                next_id += 1
+
+    with spool:
+        lrpk.LRPK_Writer(destination, header).write_stream(physics_lines(), scenery_lines())
+
+
+def lrpk_to_trk(source: ReadableBuffer, destination, chunk_lines: int = 65536):
+    """
+    Streams an LRPK file into a TRK file. The lumps holding lines are decoded
+    `chunk_lines` records at a time, everything else is loaded up front.
+    `destination` doesn't need to be seekable, back-patched values are buffered by the writer.
+    """
+    reader = lrpk.LRPK_Reader(source)
+    reader.read_header()
+    lumps = reader.read_directory_table()
+    for lump in lumps:
+        if lump.type in ("VERSINFO", "TRACKDEF", "RIDERDEF"):
+            reader.read_lump(lump)
+
+    riders = reader.track.riders
+    rider = riders[0].position if riders else lrpk.Vector2d(0, 0)
+    header = trk.Track([], set(), None, None, trk.Vector2d(rider.x, rider.y))
+
+    def lines():
+        for lump in lumps:
+            if lump.type == "LINEDEF":
+                yield from map(lrpk_record_to_trk, reader.iter_lump_records(lump, lrpk.LINEDEF_FORMAT, chunk_lines))
+            elif lump.type == "LINEDECO":
+                yield from map(lrpk_scenery_record_to_trk, reader.iter_lump_records(lump, lrpk.LINEDECO_FORMAT, chunk_lines))
+
+    trk.TRK_Writer(destination, header).write_stream(lines(), features=set())
+
+
+def trk_track_to_lrpk(track: trk.Track, name: str = "", author: str = "", grid_model: int = 0) -> lrpk.Track:
+    """Converts an in-memory track, see the module docstring for what is kept."""
+    physics_lines = []
+    scenery = []
+    for line in track.lines:
+        if isinstance(line, trk.SceneryLine):
+            scenery.append(line)
+        else:
+            physics_lines.append(trk_line_to_lrpk(line))
+    
+    next_id = max((line.id for line in physics_lines), default=-1) + 1
+    scenery_lines = [trk_line_to_lrpk(line, next_id + i) for i, line in enumerate(scenery)]
+    rider = lrpk.Rider(lrpk.Vector2d(track.riderPosition.x, track.riderPosition.y))
+
+    return lrpk.Track(name, author, grid_model, lrpk.VersionInfo(), physics_lines, scenery_lines, [rider])
+
+def lrpk_track_to_trk(track: lrpk.Track) -> trk.Track:
+    """Converts an in-memory track, see the module docstring for what is kept."""
+    lines = [lrpk_line_to_trk(line) for line in track.physics_lines]
+    lines.extend(lrpk_line_to_trk(line) for line in track.scenery_lines)
+    rider = track.riders[0].position if track.riders else lrpk.Vector2d(0, 0)
+
+    return trk.Track(lines, set(), None, {}, trk.Vector2d(rider.x, rider.y))
@@ -0,0 +1,277 @@
+"""
+Diffing tracks and applying the differences as patches, e.g. to keep a revision history.
+
+Lines are matched by id through hash maps, so a diff takes linear time.
+TRK scenery lines have no id and are matched by their contents instead, which means
+a moved scenery line shows up as one removed and one added line. When several lines
+share a key they are told apart by the order they appear in.
+Lines are compared and stored as table records, see `trk.table.LineTable` and `lrpk.track.LineTable`.
+
+Patches only hold what changed and serialize to JSON with `dumps` / `loads`.
+"""
+from dataclasses import dataclass, field
+import json
+from typing import *
+
+from .table import BaseLineTable
+from .trk import track as trk
+from .trk.table import LineTable as TRK_LineTable
+from .lrpk import track as lrpk
+
+AnyTrack = Union[trk.Track, lrpk.Track]
+Key = Hashable
+
+
+def trk_key(record: tuple) -> Key:
+    id = record[0]
+    return record if id == -1 else id
+
+def lrpk_key(record: tuple) -> Key:
+    return record[0]
+
+# format -> line attribute -> (table type, key function)
+LINE_FIELDS: Dict[str, Dict[str, Tuple[Type[BaseLineTable], Callable[[tuple], Key]]]] = {
+    "trk": {"lines": (TRK_LineTable, trk_key)},
+    "lrpk": {
+        "physics_lines": (lrpk.LineTable, lrpk_key),
+        "scenery_lines": (lrpk.SceneryLineTable, lrpk_key),
+    },
+}
+
+
+def records_of(lines, table_type: Type[BaseLineTable]) -> Iterable[tuple]:
+    return lines.rows() if isinstance(lines, table_type) else map(table_type.record_of, lines)
+
+
+def index_records(records: Iterable[tuple], key_of: Callable[[tuple], Key]) -> Dict[Key, tuple]:
+    """Maps each record's key to it, in order. Repeated keys become (key, n) for the nth repeat."""
+    index = {}
+    repeats: Dict[Key, int] = {}
+    for record in records:
+        key = key_of(record)
+        if key in index:
+            n = repeats.get(key, 0) + 1
+            repeats[key] = n
+            key = (key, n)
+        index[key] = record
+    return index
+
+
+@dataclass
+class LinesDiff:
+    removed: List[Key] = field(default_factory=list)
+    modified: List[Tuple[Key, tuple]] = field(default_factory=list)
+    added: List[Tuple[Key, tuple]] = field(default_factory=list)
+    # Every key in order, only when applying the changes wouldn't give the same order:
+    # kept lines stay where they were and added lines go at the end.
+    order: Optional[List[Key]] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.removed or self.modified or self.added or self.order is not None)
+
+
+def diff_lines(old: Iterable[tuple], new: Iterable[tuple], key_of: Callable[[tuple], Key]) -> LinesDiff:
+    old_index = index_records(old, key_of)
+    new_index = index_records(new, key_of)
+    result = LinesDiff()
+
+    for key, record in old_index.items():
+        new_record = new_index.get(key)
+        if new_record is None:
+            result.removed.append(key)
+        elif new_record != record:
+            result.modified.append((key, new_record))
+
+    for key, record in new_index.items():
+        if key not in old_index:
+            result.added.append((key, record))
+
+    new_order = list(new_index)
+    kept = [key for key in old_index if key in new_index]
+    if kept + [key for key, record in result.added] != new_order:
+        result.order = new_order
+
+    return result
+
+
+def apply_lines(records: Iterable[tuple], changes: LinesDiff, key_of: Callable[[tuple], Key]) -> List[tuple]:
+    index = index_records(records, key_of)
+    try:
+        for key in changes.removed:
+            del index[key]
+        for key, record in changes.modified:
+            if key not in index:
+                raise KeyError(key)
+            index[key] = record
+    except KeyError as e:
+        raise Exception(f"Patch does not apply, no line {e.args[0]!r}") from None
+
+    for key, record in changes.added:
+        if key in index:
+            raise Exception(f"Patch does not apply, line {key!r} already exists")
+        index[key] = record
+
+    if changes.order is not None:
+        return [index[key] for key in changes.order]
+    return list(index.values())
+
+
+def track_header(track: AnyTrack) -> Dict[str, Any]:
+    """Everything about a track but its lines (and TRK metadata), as JSON compatible values."""
+    if isinstance(track, trk.Track):
+        return {
+            "features": sorted(track.features),
+            "songinfo": None if track.songinfo is None else [track.songinfo.name, track.songinfo.offset],
+            "rider": [track.riderPosition.x, track.riderPosition.y],
+        }
+
+    return {
+        "name": track.name,
+        "author": track.author,
+        "grid_model": track.grid_model,
+        "version_info": vars(track.version_info).copy(),
+        "riders": [[rider.position.x, rider.position.y] for rider in track.riders],
+    }
+
+
+@dataclass
+class TrackDiff:
+    format: str
+    # changed header fields, see `track_header`
+    header: Dict[str, Any] = field(default_factory=dict)
+    # changed metadata entries, None for removed ones
+    metadata: Dict[str, Optional[str]] = field(default_factory=dict)
+    lines: Dict[str, LinesDiff] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.header or self.metadata or any(self.lines.values()))
+
+    def to_json(self) -> Dict[str, Any]:
+        lines = {}
+        for name, changes in self.lines.items():
+            if not changes:
+                continue
+            key_of = LINE_FIELDS[self.format][name][1]
+            # keys are left out when they are just the record's own key
+            encode = lambda key, record: [record] if key == key_of(record) else [record, key]
+            lines[name] = {
+                "removed": changes.removed,
+                "modified": [encode(key, record) for key, record in changes.modified],
+                "added": [encode(key, record) for key, record in changes.added],
+                "order": changes.order,
+            }
+        return {"format": self.format, "header": self.header, "metadata": self.metadata, "lines": lines}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "TrackDiff":
+        lines = {}
+        for name, changes in data["lines"].items():
+            key_of = LINE_FIELDS[data["format"]][name][1]
+            def decode(entry) -> Tuple[Key, tuple]:
+                record = tuple(entry[0])
+                return (_key(entry[1]) if len(entry) > 1 else key_of(record), record)
+            lines[name] = LinesDiff(
+                [_key(key) for key in changes["removed"]],
+                [decode(entry) for entry in changes["modified"]],
+                [decode(entry) for entry in changes["added"]],
+                None if changes["order"] is None else [_key(key) for key in changes["order"]],
+            )
+        return cls(data["format"], data["header"], data["metadata"], lines)
+
+    def dumps(self) -> str:
+        return json.dumps(self.to_json(), separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, string: str) -> "TrackDiff":
+        return cls.from_json(json.loads(string))
+
+
+def _key(value) -> Key:
+    """JSON turns tuple keys into lists, this turns them back."""
+    if isinstance(value, list):
+        return tuple(map(_key, value))
+    return value
+
+
+def diff(old: AnyTrack, new: AnyTrack) -> TrackDiff:
+    """Returns the changes that turn `old` into `new`, both tracks of the same format."""
+    format = "trk" if isinstance(old, trk.Track) else "lrpk"
+    if isinstance(new, trk.Track) != (format == "trk"):
+        raise Exception("Can't diff tracks of different formats")
+
+    result = TrackDiff(format)
+    old_header = track_header(old)
+    for name, value in track_header(new).items():
+        if value != old_header[name]:
+            result.header[name] = value
+
+    if format == "trk":
+        old_metadata = old.metadata or {}
+        new_metadata = new.metadata or {}
+        for key in old_metadata.keys() - new_metadata.keys():
+            result.metadata[key] = None
+        for key, value in new_metadata.items():
+            if old_metadata.get(key) != value:
+                result.metadata[key] = value
+
+    for name, (table_type, key_of) in LINE_FIELDS[format].items():
+        result.lines[name] = diff_lines(
+            records_of(getattr(old, name), table_type),
+            records_of(getattr(new, name), table_type),
+            key_of,
+        )
+
+    return result
+
+
+def apply(track: AnyTrack, patch: TrackDiff) -> AnyTrack:
+    """
+    Returns a copy of `track` with `patch` applied, `track` itself is left unchanged.
+    Lines come back as a table if they were in one, otherwise as line objects.
+    """
+    format = "trk" if isinstance(track, trk.Track) else "lrpk"
+    if format != patch.format:
+        raise Exception(f"Can't apply a {patch.format} patch to a {format} track")
+
+    header = {**track_header(track), **patch.header}
+    lines = {}
+    for name, (table_type, key_of) in LINE_FIELDS[format].items():
+        old_lines = getattr(track, name)
+        records = records_of(old_lines, table_type)
+        if name in patch.lines:
+            records = apply_lines(records, patch.lines[name], key_of)
+
+        if isinstance(old_lines, table_type):
+            lines[name] = table_type()
+            for record in records:
+                lines[name].append_record(*record)
+        else:
+            lines[name] = list(map(table_type.make_line, records))
+
+    if format == "trk":
+        metadata = None if track.metadata is None else dict(track.metadata)
+        for key, value in patch.metadata.items():
+            if metadata is None:
+                metadata = {}
+            if value is None:
+                metadata.pop(key, None)
+            else:
+                metadata[key] = value
+        songinfo = header["songinfo"]
+        return trk.Track(
+            lines["lines"],
+            set(header["features"]),
+            None if songinfo is None else trk.SongInfo(*songinfo),
+            metadata,
+            trk.Vector2d(*header["rider"]),
+        )
+
+    return lrpk.Track(
+        header["name"],
+        header["author"],
+        header["grid_model"],
+        lrpk.VersionInfo(**header["version_info"]),
+        lines["physics_lines"],
+        lines["scenery_lines"],
+        [lrpk.Rider(lrpk.Vector2d(x, y)) for x, y in header["riders"]],
+    )
@@ -0,0 +1,84 @@
+"""Opening tracks straight from a path."""
+from contextlib import contextmanager
+import mmap as _mmap
+import os
+from typing import *
+
+from .binary import as_stream
+from .compression import MAGIC_SIZE, detect_codec, open_compressed
+from .trk.track import Track as TRK_Track, TRK_Reader
+from .lrpk.archive import LRPKArchive
+
+PathLike = Union[str, os.PathLike]
+
+
+def map_file(path: PathLike) -> Union[_mmap.mmap, bytes]:
+    """
+    Memory-maps a whole file read-only.
+    Mappings share the page cache, so several processes mapping the same file share its pages.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b"" # empty files can't be mapped
+        return _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+
+
+@contextmanager
+def mapped(path: PathLike) -> Iterator[Union[_mmap.mmap, bytes]]:
+    """
+    `map_file` as a context manager, for lazy reads such as
+    `TRK_Reader(data).iter_lines()` that need the mapping to outlive a single call.
+    """
+    data = map_file(path)
+    try:
+        yield data
+    finally:
+        if isinstance(data, _mmap.mmap):
+            try:
+                data.close()
+            except BufferError:
+                pass # still viewed by a reader, it is unmapped once that is garbage collected
+
+
+def _open(path: PathLike, mmap: bool, random_access: bool = False):
+    """
+    Opens a file for reading, as a memory mapping if `mmap` is set.
+    Compressed files are opened for streaming decompression instead, or decompressed
+    into memory if `random_access` is needed.
+    """
+    with open(path, "rb") as f:
+        codec = detect_codec(f.read(MAGIC_SIZE))
+    
+    if codec is None:
+        return map_file(path) if mmap else open(path, "rb")
+    if random_access:
+        with open_compressed(path, codec) as f:
+            return f.read()
+    return open_compressed(path, codec)
+
+
+def open_trk(path: PathLike, mmap: bool = True, columnar: bool = False) -> TRK_Track:
+    """
+    Reads a TRK file, parsing directly from a memory mapping of it if `mmap` is set.
+    Compressed files are decompressed as they are parsed.
+    """
+    stream = as_stream(_open(path, mmap))
+    try:
+        return TRK_Reader(stream, columnar=columnar).read()
+    finally:
+        stream.close()
+
+
+def open_lrpk(path: PathLike, mmap: bool = True, use_numpy: Optional[bool] = None, columnar: bool = False) -> LRPKArchive:
+    """
+    Opens an LRPK file as an `LRPKArchive`, decoding lumps directly from a memory mapping
+    of it if `mmap` is set. Only the directory table is read until lumps are accessed.
+    The archive keeps the file open until it is closed, it can be used as a context manager.
+    Compressed files are decompressed into memory up front.
+    """
+    stream = as_stream(_open(path, mmap, random_access=True))
+    try:
+        return LRPKArchive(stream, use_numpy=use_numpy, columnar=columnar)
+    except BaseException:
+        stream.close()
+        raise
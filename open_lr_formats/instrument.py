@@ -0,0 +1,106 @@
+"""
+Opt-in instrumentation for readers and writers.
+
+Pass a `Stats` as `stats=` to `TRK_Reader`, `TRK_Writer`, `LRPK_Reader`, `LRPK_Writer`
+or `LRPKArchive` to time each section of the file (header, lines, metadata, the LRPK directory and
+each lump) and how many bytes it spans. With `count_primitives` the stream is wrapped
+in a `CountingStream` that also counts calls and bytes per primitive type, which is much slower.
+`LRPK_Reader` also records events: "directory_table" with the position of the directory and
+its lump count, then "lump" with the type and position of each entry. Event names never
+clash with section names.
+A `callback` sees every section and event as it happens, e.g. to forward them to a metrics pipeline.
+
+Without `stats` the readers and writers use `NO_STATS`, which does nothing.
+"""
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+import time
+from typing import *
+
+# (name, data) for a finished section ({"seconds", "bytes"}) or an event (its details)
+Callback = Callable[[str, Dict[str, Any]], None]
+
+
+@dataclass
+class Counter:
+    calls: int = 0
+    seconds: float = 0.0
+    bytes: int = 0
+
+
+class Stats:
+    def __init__(self, callback: Optional[Callback] = None, count_primitives: bool = False) -> None:
+        self.callback = callback
+        self.count_primitives = count_primitives
+        self.sections: Dict[str, Counter] = {}
+        self.primitives: Dict[str, Counter] = {}
+        self.events: List[Tuple[str, Dict[str, Any]]] = []
+
+    @contextmanager
+    def section(self, name: str, stream=None) -> Iterator[None]:
+        """Times a block, counting the bytes `stream` moves through it if one is given."""
+        position = None if stream is None else stream.tell()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            size = 0 if stream is None else stream.tell() - position
+
+            counter = self.sections.get(name)
+            if counter is None:
+                counter = self.sections[name] = Counter()
+            counter.calls += 1
+            counter.seconds += seconds
+            counter.bytes += size
+
+            if self.callback is not None:
+                self.callback(name, {"seconds": seconds, "bytes": size})
+
+    def event(self, name: str, **details):
+        """Records something worth knowing that isn't timed, e.g. where a lump starts."""
+        self.events.append((name, details))
+        if self.callback is not None:
+            self.callback(name, details)
+
+    def count(self, primitive: str, size: int):
+        counter = self.primitives.get(primitive)
+        if counter is None:
+            counter = self.primitives[primitive] = Counter()
+        counter.calls += 1
+        counter.bytes += size
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Everything collected, as JSON compatible values."""
+        return {
+            "sections": {name: asdict(counter) for name, counter in self.sections.items()},
+            "primitives": {name: asdict(counter) for name, counter in self.primitives.items()},
+            "events": [[name, details] for name, details in self.events],
+        }
+
+    def report(self) -> str:
+        lines = [f"{'section':<24}{'calls':>8}{'seconds':>12}{'bytes':>14}"]
+        for name, counter in sorted(self.sections.items(), key=lambda item: -item[1].seconds):
+            lines.append(f"{name:<24}{counter.calls:>8}{counter.seconds:>12.6f}{counter.bytes:>14}")
+        if self.primitives:
+            lines.append(f"{'primitive':<24}{'calls':>8}{'':>12}{'bytes':>14}")
+            for name, counter in sorted(self.primitives.items(), key=lambda item: -item[1].calls):
+                lines.append(f"{name:<24}{counter.calls:>8}{'':>12}{counter.bytes:>14}")
+        return "\n".join(lines)
+
+
+_NULL_SECTION = nullcontext()
+
+class NullStats(Stats):
+    """Stands in for `Stats` when instrumentation is off, every hook is a no-op."""
+
+    def section(self, name: str, stream=None):
+        return _NULL_SECTION
+
+    def event(self, name: str, **details):
+        pass
+
+    def count(self, primitive: str, size: int):
+        pass
+
+NO_STATS = NullStats()
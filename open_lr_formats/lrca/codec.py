@@ -0,0 +1,166 @@
+"""
+Column encodings of the LRCA format. These need numpy, check `records.HAS_NUMPY` first.
+
+Every column is stored as fixed width values whose bytes are shuffled (all first bytes,
+then all second bytes...) before zlib compression, which groups the mostly equal high bytes
+of neighbouring values together.
+
+- RAW: the values as they are.
+- DELTA: integers as zigzag encoded differences from the previous value,
+  narrowed to the fewest bytes that fit.
+- SCALED: floats as integer multiples of `scale`, then like DELTA. Lossless when every value
+  is an exact multiple of a power of two, otherwise only with a configured precision.
+- XOR: floats as their bits xored with the previous value's bits.
+
+Coordinates are stored as one stream of points per axis in line order, where a line's
+start is left out if it is exactly the previous line's end (`connected`). Lines are
+mostly drawn as connected strokes, so this halves the points and keeps deltas small.
+"""
+from dataclasses import dataclass
+from typing import *
+
+from ..lrpk.records import np
+
+RAW, DELTA, SCALED, XOR = range(4)
+
+# Power of two scales tried for lossless SCALED coordinates, as 2 ** -bits
+_SCALE_BITS = range(0, 33)
+_SAMPLE_SIZE = 1024
+# Largest magnitude of SCALED integers, so that their differences and zigzag encoding fit 64 bits
+_MAX_SCALED = 2.0 ** 61
+
+
+@dataclass
+class EncodedColumn:
+    kind: int
+    width: int
+    scale: float
+    count: int
+    data: bytes
+
+
+def shuffle(values: "np.ndarray") -> bytes:
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+def unshuffle(data, dtype: "np.dtype", count: int) -> "np.ndarray":
+    dtype = np.dtype(dtype)
+    return np.frombuffer(data, np.uint8).reshape(dtype.itemsize, count).T.copy().view(dtype).reshape(count)
+
+
+def _narrow(values: "np.ndarray") -> "np.ndarray":
+    """Unsigned integers in the fewest bytes that fit all of them."""
+    largest = int(values.max()) if len(values) else 0
+    for width in (1, 2, 4, 8):
+        if largest < 1 << (8 * width):
+            return values.astype(f"<u{width}")
+
+def _encode_deltas(values: "np.ndarray") -> Tuple[int, bytes]:
+    deltas = np.diff(values.astype(np.int64), prepend=np.int64(0))
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    narrowed = _narrow(zigzag.view(np.uint64))
+    return narrowed.itemsize, shuffle(narrowed)
+
+def _decode_deltas(data, width: int, count: int) -> "np.ndarray":
+    zigzag = unshuffle(data, f"<u{width}", count).astype(np.uint64)
+    deltas = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+def encode_integers(values: "np.ndarray", compress: Callable[[bytes], bytes]) -> EncodedColumn:
+    """Picks whichever of RAW and DELTA compresses smaller."""
+    values = values.astype(values.dtype.newbyteorder("<"))
+    raw = compress(shuffle(values))
+    width, deltas = _encode_deltas(values)
+    deltas = compress(deltas)
+    if len(deltas) < len(raw):
+        return EncodedColumn(DELTA, width, 0.0, len(values), deltas)
+    return EncodedColumn(RAW, values.itemsize, 0.0, len(values), raw)
+
+
+def _lossless_scale(values: "np.ndarray") -> Optional[float]:
+    """The largest power of two scale every value is an exact multiple of, if any."""
+    if not len(values) or not np.isfinite(values).all():
+        return None
+
+    sample = values[:_SAMPLE_SIZE]
+    for bits in _SCALE_BITS:
+        scaled = sample * 2.0 ** bits
+        if np.array_equal(scaled, np.rint(scaled)):
+            break
+    else:
+        return None
+
+    scaled = values * 2.0 ** bits
+    if not np.array_equal(scaled, np.rint(scaled)) or np.abs(scaled).max() >= 2.0 ** 53:
+        return None
+    return 2.0 ** -bits
+
+
+def encode_floats(values: "np.ndarray", compress: Callable[[bytes], bytes], precision: Optional[float] = None) -> EncodedColumn:
+    """
+    Encodes floats as SCALED if that is lossless (or `precision` is given, they are all finite
+    and none is too large a multiple of it), otherwise as XOR. `values` of any float type are
+    decoded back as float64.
+    """
+    values = values.astype(np.float64)
+    scale = _lossless_scale(values)
+    if scale is None and precision is not None and np.isfinite(values).all():
+        if not len(values) or np.abs(values / precision).max() < _MAX_SCALED:
+            scale = precision
+
+    if scale is not None:
+        quantized = np.rint(values / scale).astype(np.int64)
+        if precision is not None or np.array_equal((quantized * scale).view(np.uint64), values.view(np.uint64)):
+            width, data = _encode_deltas(quantized)
+            return EncodedColumn(SCALED, width, scale, len(values), compress(data))
+
+    bits = values.view(np.uint64)
+    xored = bits ^ np.concatenate((np.zeros(1, np.uint64), bits[:-1]))
+    return EncodedColumn(XOR, 8, 0.0, len(values), compress(shuffle(xored)))
+
+
+def decode_column(column: EncodedColumn, dtype: "np.dtype") -> "np.ndarray":
+    """Decodes a column, with its data decompressed, into an array of `dtype`."""
+    data = column.data
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if column.kind == RAW:
+        return unshuffle(data, dtype, column.count)
+    if column.kind == DELTA:
+        return _decode_deltas(data, column.width, column.count).astype(dtype)
+    if column.kind == SCALED:
+        return (_decode_deltas(data, column.width, column.count) * column.scale).astype(dtype)
+    if column.kind == XOR:
+        bits = np.bitwise_xor.accumulate(unshuffle(data, np.uint64, column.count))
+        return bits.view(np.float64).astype(dtype)
+    raise Exception(f"Unknown column encoding {column.kind}")
+
+
+def bits_equal(a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+    """Elementwise exact equality of floats, telling -0.0 from 0.0 and matching NaNs with the same bits."""
+    unsigned = np.dtype(f"<u{a.itemsize}")
+    return a.view(unsigned) == b.view(unsigned)
+
+
+def split_points(x1, y1, x2, y2) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Returns `connected` and the x and y point streams of a table's coordinates."""
+    count = len(x1)
+    connected = np.zeros(count, bool)
+    if count:
+        connected[1:] = bits_equal(x1[1:], x2[:-1]) & bits_equal(y1[1:], y2[:-1])
+
+    starts = ~connected
+    ends = np.arange(count) + np.cumsum(starts)
+    xs = np.empty(count + int(starts.sum()), x1.dtype)
+    ys = np.empty_like(xs)
+    xs[ends] = x2
+    ys[ends] = y2
+    xs[ends[starts] - 1] = x1[starts]
+    ys[ends[starts] - 1] = y1[starts]
+    return connected, xs, ys
+
+
+def join_points(connected, xs, ys) -> Tuple["np.ndarray", ...]:
+    """Reverses `split_points`, returning x1, y1, x2, y2."""
+    ends = np.arange(len(connected)) + np.cumsum(~connected)
+    # the point before a line's end is its own start, or the previous line's end if connected
+    return xs[ends - 1], ys[ends - 1], xs[ends], ys[ends]
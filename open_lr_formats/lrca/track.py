@@ -0,0 +1,204 @@
+"""
+LRCA, a compact columnar archive format for TRK and LRPK tracks.
+
+    Header
+        magic "LRCA", version (u8), format of the archived track (u8, 0 for TRK, 1 for LRPK)
+        track header: u32 length + UTF-8 JSON, see `diff.track_header` (plus the TRK metadata)
+    Tables, one per line attribute of the track ("lines", or "physics_lines" and "scenery_lines")
+        name (u8 length + ASCII), line count (u32), column count (u8)
+        Columns
+            name (u8 length + ASCII)
+            encoding, width, scale, value count and compressed size ("<BBdII")
+            zlib compressed values, see `codec`
+
+Coordinates are stored as the "connected", "x" and "y" columns, every other column of the
+track's line tables as itself. Reading an archive gives back exactly the track it was written
+from, in the same model, unless it was written with a coordinate `precision`.
+The format needs numpy.
+"""
+import io
+import json
+import math
+import zlib
+from typing import *
+
+from ..binary import BufferedWriteStream, ReadableBuffer, as_stream
+from ..compression import decompressed, peek_magic
+from ..diff import LINE_FIELDS, track_header
+from ..table import BaseLineTable
+from ..trk import track as trk
+from ..lrpk import records
+from ..lrpk import track as lrpk
+from . import codec
+from .codec import EncodedColumn, np
+
+VERSION = 1
+FORMATS = ("trk", "lrpk")
+COLUMN_FORMAT = "<BBdII" # encoding, width, scale, value count, compressed size
+
+AnyTrack = Union[trk.Track, lrpk.Track]
+_COORDINATES = ("x1", "y1", "x2", "y2")
+
+
+def _require_numpy():
+    if not records.HAS_NUMPY:
+        raise Exception("The LRCA format needs numpy")
+
+
+class LRCA_Writer:
+    def __init__(self, buffer: io.BufferedWriter, track: AnyTrack, precision: Optional[float] = None, level: int = 6, chunk_size: int = 1 << 20) -> None:
+        """
+        Coordinates are stored losslessly, unless a `precision` is given: then they are rounded
+        to multiples of it wherever that can't be done losslessly. `level` is the zlib level.
+        Columns with values too large for the precision are stored losslessly instead.
+        """
+        _require_numpy()
+        if precision is not None and not (precision > 0 and math.isfinite(precision)):
+            raise Exception(f"Precision must be a positive number, got {precision}")
+        self.stream = BufferedWriteStream(buffer, chunk_size)
+        self.track = track
+        self.precision = precision
+        self.level = level
+        self.format = "trk" if isinstance(track, trk.Track) else "lrpk"
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def write_header(self):
+        self.stream.WriteBytes(b"LRCA")
+        self.stream.WriteUInt8(VERSION)
+        self.stream.WriteUInt8(FORMATS.index(self.format))
+
+        header = track_header(self.track)
+        if self.format == "trk":
+            header["metadata"] = self.track.metadata
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        self.stream.WriteUInt32(len(encoded))
+        self.stream.WriteBytes(encoded)
+
+    def write_column(self, name: str, column: EncodedColumn):
+        self.stream.WriteStringSingleByteLength(name)
+        self.stream.write_struct(COLUMN_FORMAT, column.kind, column.width, column.scale, column.count, len(column.data))
+        self.stream.WriteBytes(column.data)
+
+    def write_table(self, name: str, lines, table_type: Type[BaseLineTable]):
+        table = lines if isinstance(lines, table_type) else table_type.from_lines(lines)
+        columns = {column: np.frombuffer(getattr(table, column), typecode) for column, typecode in table.columns.items()}
+
+        self.stream.WriteStringSingleByteLength(name)
+        self.stream.WriteUInt32(len(table))
+        self.stream.WriteUInt8(len(table.columns) - len(_COORDINATES) + 3)
+
+        connected, xs, ys = codec.split_points(*(columns[column] for column in _COORDINATES))
+        self.write_column("connected", codec.encode_integers(np.packbits(connected), self.compress))
+        self.write_column("x", codec.encode_floats(xs, self.compress, self.precision))
+        self.write_column("y", codec.encode_floats(ys, self.compress, self.precision))
+
+        for column, typecode in table.columns.items():
+            if column in _COORDINATES:
+                continue
+            values = columns[column]
+            if typecode in "fd":
+                self.write_column(column, codec.encode_floats(values, self.compress))
+            else:
+                self.write_column(column, codec.encode_integers(values, self.compress))
+
+    def write(self):
+        self.write_header()
+        for name, (table_type, key) in LINE_FIELDS[self.format].items():
+            self.write_table(name, getattr(self.track, name), table_type)
+        self.stream.flush()
+
+
+class LRCA_Reader:
+    def __init__(self, buffer: ReadableBuffer, columnar: bool = False) -> None:
+        """`columnar` reads lines into tables instead of lists, like the TRK and LRPK readers."""
+        _require_numpy()
+        self.stream = as_stream(buffer)
+        self.columnar = columnar
+        self.format = "trk"
+        self.header: Dict[str, Any] = {}
+
+    def read_header(self):
+        magic = self.stream.ReadBytes(4)
+        if magic != b"LRCA":
+            raise Exception(f"Incorrect magic number {bytes(magic)!r}")
+        version = self.stream.ReadUInt8()
+        if version != VERSION:
+            raise Exception(f"Unsupported LRCA version {version}")
+        self.format = FORMATS[self.stream.ReadUInt8()]
+        self.header = json.loads(bytes(self.stream.ReadBytes(self.stream.ReadUInt32())))
+
+    def read_column(self) -> Tuple[str, EncodedColumn]:
+        name = self.stream.ReadStringSingleByteLength()
+        kind, width, scale, count, size = self.stream.read_struct(COLUMN_FORMAT)
+        return name, EncodedColumn(kind, width, scale, count, zlib.decompress(self.stream.ReadBytes(size)))
+
+    def read_table(self, table_type: Type[BaseLineTable]) -> Tuple[str, BaseLineTable]:
+        name = self.stream.ReadStringSingleByteLength()
+        count = self.stream.ReadUInt32()
+        column_count = self.stream.ReadUInt8()
+
+        table = table_type()
+        points = {}
+        for i in range(column_count):
+            column, encoded = self.read_column()
+            if column == "connected":
+                packed = codec.decode_column(encoded, np.uint8)
+                points[column] = np.unpackbits(packed, count=count).astype(bool)
+            elif column in ("x", "y"):
+                points[column] = codec.decode_column(encoded, np.float64)
+            else:
+                table.extend_column(column, codec.decode_column(encoded, table.columns[column]))
+
+        coordinates = codec.join_points(points["connected"], points["x"], points["y"])
+        for column, values in zip(_COORDINATES, coordinates):
+            table.extend_column(column, np.ascontiguousarray(values, table.columns[column]))
+        return name, table
+
+    def read(self) -> AnyTrack:
+        self.read_header()
+        lines = {}
+        for table_type, key in LINE_FIELDS[self.format].values():
+            name, table = self.read_table(table_type)
+            lines[name] = table if self.columnar else list(table)
+
+        header = self.header
+        if self.format == "trk":
+            songinfo = header["songinfo"]
+            return trk.Track(
+                lines["lines"],
+                set(header["features"]),
+                None if songinfo is None else trk.SongInfo(*songinfo),
+                header["metadata"],
+                trk.Vector2d(*header["rider"]),
+            )
+
+        return lrpk.Track(
+            header["name"],
+            header["author"],
+            header["grid_model"],
+            lrpk.VersionInfo(**header["version_info"]),
+            lines["physics_lines"],
+            lines["scenery_lines"],
+            [lrpk.Rider(lrpk.Vector2d(x, y)) for x, y in header["riders"]],
+        )
+
+
+def archive(source: ReadableBuffer, destination: io.BufferedWriter, precision: Optional[float] = None, level: int = 6):
+    """Converts a TRK or LRPK file, compressed or not, into an LRCA file."""
+    data = decompressed(source)
+    if peek_magic(data).startswith(b"LRPK"):
+        track = lrpk.LRPK_Reader(data, columnar=True).read()
+    else:
+        track = trk.TRK_Reader(data, columnar=True).read()
+    LRCA_Writer(destination, track, precision, level).write()
+
+
+def restore(source: ReadableBuffer, destination: io.BufferedWriter):
+    """Converts an LRCA file back into the TRK or LRPK file it was made from."""
+    track = LRCA_Reader(source, columnar=True).read()
+    if isinstance(track, trk.Track):
+        trk.TRK_Writer(destination, track).write()
+    else:
+        lrpk.LRPK_Writer(destination, track).write()
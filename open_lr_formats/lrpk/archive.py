@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from typing import *
+
+from ..binary import ReadableBuffer
+from ..instrument import Stats
+from .track import *
+
+
+@dataclass
+class TrackDef:
+    name: str
+    author: str
+    grid_model: int
+
+
+class LRPKArchive:
+    """
+    Random access to the lumps of an LRPK file.
+    Only the directory table is read up front, each lump is decoded the first time
+    it is needed, so e.g. `archive.trackdef` never touches the LINEDEF lump.
+    Lumps of unknown types are listed in `lumps` but otherwise ignored.
+    """
+
+    def __init__(self, buffer: ReadableBuffer, use_numpy: Optional[bool] = None, columnar: bool = False, stats: Optional[Stats] = None) -> None:
+        self.reader = LRPK_Reader(buffer, use_numpy=use_numpy, columnar=columnar, stats=stats)
+        self.reader.read_header()
+        self.lumps: List[Lump] = self.reader.read_directory_table()
+        self.loaded: Set[str] = set()
+
+    def close(self):
+        """Closes the underlying buffer."""
+        self.reader.stream.close()
+
+    def __enter__(self) -> "LRPKArchive":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def find(self, lump_type: str) -> List[Lump]:
+        return [lump for lump in self.lumps if lump.type == lump_type]
+
+    def load(self, lump_type: str):
+        """Decodes every lump of `lump_type` into `self.reader.track`, if that hasn't been done yet."""
+        if lump_type in self.loaded:
+            return
+        
+        if lump_type in self.reader.lump_lookup:
+            for lump in self.find(lump_type):
+                self.reader.read_lump(lump)
+        
+        self.loaded.add(lump_type)
+
+    @property
+    def version_info(self) -> VersionInfo:
+        self.load("VERSINFO")
+        return self.reader.track.version_info
+
+    @property
+    def trackdef(self) -> TrackDef:
+        self.load("TRACKDEF")
+        track = self.reader.track
+        return TrackDef(track.name, track.author, track.grid_model)
+
+    @property
+    def physics_lines(self) -> Union[List[PhysicsLine], LineTable]:
+        self.load("LINEDEF")
+        return self.reader.track.physics_lines
+
+    @property
+    def scenery_lines(self) -> Union[List[SceneryLine], SceneryLineTable]:
+        self.load("LINEDECO")
+        return self.reader.track.scenery_lines
+
+    @property
+    def riders(self) -> List[Rider]:
+        self.load("RIDERDEF")
+        return self.reader.track.riders
+
+    def read(self) -> Track:
+        """Loads every supported lump and returns the whole track."""
+        for lump in self.lumps:
+            self.load(lump.type)
+        return self.reader.track
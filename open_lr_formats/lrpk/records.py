@@ -0,0 +1,64 @@
+"""
+Whole-lump encoding and decoding of the fixed size LRPK line records.
+These are only available when numpy is installed, check `HAS_NUMPY` first.
+"""
+from typing import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+
+# Record sizes in bytes, see LINEDEF_FORMAT and LINEDECO_FORMAT in track.py
+LINEDEF_SIZE = 39
+LINEDECO_SIZE = 20
+
+if HAS_NUMPY:
+    LINEDEF_DTYPE = np.dtype([
+        ("id", "<u4"),
+        ("x1", "<f8"),
+        ("y1", "<f8"),
+        ("x2", "<f8"),
+        ("y2", "<f8"),
+        ("type", "u1"),
+        ("flipped", "?"),
+        ("extension", "u1"),
+    ])
+
+    LINEDECO_DTYPE = np.dtype([
+        ("id", "<u4"),
+        ("x1", "<f4"),
+        ("y1", "<f4"),
+        ("x2", "<f4"),
+        ("y2", "<f4"),
+    ])
+
+    assert LINEDEF_DTYPE.itemsize == LINEDEF_SIZE
+    assert LINEDECO_DTYPE.itemsize == LINEDECO_SIZE
+
+
+def decode_linedef(data, count: int) -> "np.ndarray":
+    """Decodes `count` LINEDEF records from `data` without copying it."""
+    return np.frombuffer(data, LINEDEF_DTYPE, count)
+
+def decode_linedeco(data, count: int) -> "np.ndarray":
+    """Decodes `count` LINEDECO records from `data` without copying it."""
+    return np.frombuffer(data, LINEDECO_DTYPE, count)
+
+def encode_columns(dtype: "np.dtype", columns: Sequence) -> bytes:
+    """Encodes whole columns (any buffer, e.g. `array.array`) into packed records of `dtype`."""
+    out = np.empty(len(columns[0]), dtype)
+    for name, column in zip(dtype.names, columns):
+        out[name] = np.asarray(column)
+    return out.tobytes()
+
+def fill_table(table, records: "np.ndarray") -> None:
+    """Appends decoded records to the columns of a `BaseLineTable` with matching column names."""
+    for name, typecode in table.columns.items():
+        table.extend_column(name, np.ascontiguousarray(records[name], dtype=typecode))
+
+def encode_records(dtype: "np.dtype", records: Iterable[tuple]) -> bytes:
+    """Encodes tuples of field values into packed records of `dtype`."""
+    return np.array(list(records), dtype).tobytes()
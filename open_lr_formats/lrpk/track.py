@@ -1,12 +1,21 @@
 from enum import Enum, IntEnum
+import itertools
 from dataclasses import dataclass, field
 import io
 from typing import *
 
-from ..binary import BinaryStream
+from ..binary import BufferedWriteStream, CountingStream, ReadableBuffer, as_stream, get_struct
+from ..compression import compressor, decompressed
+from ..instrument import NO_STATS, Stats
+from ..table import BaseLineTable
+from . import records
 
+# id, x1, y1, x2, y2, type, flipped, extension
+LINEDEF_FORMAT = "<I4dB?B"
+# id, x1, y1, x2, y2
+LINEDECO_FORMAT = "<I4f"
 
-@dataclass
+@dataclass(slots=True)
 class Vector2d:
     x: float
     y: float
@@ -19,7 +28,7 @@ class LineExtension(IntEnum):
     Both = 3
 
 
-@dataclass
+@dataclass(slots=True)
 class PhysicsLine:
     id: int
     start: Vector2d
@@ -29,13 +38,59 @@ class PhysicsLine:
     extension: LineExtension = LineExtension.Nothing
 
 
-@dataclass
+@dataclass(slots=True)
 class SceneryLine:
     id: int
     start: Vector2d
     end: Vector2d
 
-@dataclass
+class LineTable(BaseLineTable):
+    """Columnar storage for LINEDEF lines."""
+
+    columns = {
+        "id": "I",
+        "x1": "d",
+        "y1": "d",
+        "x2": "d",
+        "y2": "d",
+        "type": "B",
+        "flipped": "B",
+        "extension": "B",
+    }
+
+    @staticmethod
+    def make_line(record: tuple) -> PhysicsLine:
+        id, x1, y1, x2, y2, type, flipped, extension = record
+        return PhysicsLine(id, Vector2d(x1, y1), Vector2d(x2, y2), type, bool(flipped), _EXTENSIONS[extension])
+
+    @staticmethod
+    def record_of(line: PhysicsLine) -> tuple:
+        return (line.id, line.start.x, line.start.y, line.end.x, line.end.y, line.type, line.flipped, line.extension)
+
+
+class SceneryLineTable(BaseLineTable):
+    """Columnar storage for LINEDECO lines, coordinates are kept as 32 bit floats like in the file."""
+
+    columns = {
+        "id": "I",
+        "x1": "f",
+        "y1": "f",
+        "x2": "f",
+        "y2": "f",
+    }
+
+    @staticmethod
+    def make_line(record: tuple) -> SceneryLine:
+        id, x1, y1, x2, y2 = record
+        return SceneryLine(id, Vector2d(x1, y1), Vector2d(x2, y2))
+
+    @staticmethod
+    def record_of(line: SceneryLine) -> tuple:
+        return (line.id, line.start.x, line.start.y, line.end.x, line.end.y)
+
+_EXTENSIONS = list(LineExtension)
+
+@dataclass(slots=True)
 class Rider:
     position: Vector2d
 
@@ -53,8 +108,8 @@ class Track:
     author: str
     grid_model: int
     version_info: VersionInfo
-    physics_lines: List[PhysicsLine]
-    scenery_lines: List[SceneryLine]
+    physics_lines: Union[List[PhysicsLine], LineTable]
+    scenery_lines: Union[List[SceneryLine], SceneryLineTable]
     riders: List[Rider]
 
 @dataclass
@@ -64,10 +119,25 @@ class Lump:
 
 
 class LRPK_Reader:
-    def __init__(self, buffer: io.BufferedReader) -> None:
+    def __init__(self, buffer: ReadableBuffer, use_numpy: Optional[bool] = None, columnar: bool = False, stats: Optional[Stats] = None) -> None:
+        """
+        `use_numpy` decodes whole line lumps at once with numpy,
+        by default it is used whenever numpy is installed.
+        `columnar` reads lines into a `LineTable` and `SceneryLineTable` instead of lists.
+        `stats` collects timings of the header, directory and each lump, see `instrument.Stats`.
+        Compressed files are decompressed into memory, the directory needs random access to the data.
+        """
         self.HEADER_SIZE = 0
-        self.stream = BinaryStream(buffer)
-        self.track = Track("", "", 0, VersionInfo(), [], [], [])
+        self.directory_pointer = 0
+        self.stats = NO_STATS if stats is None else stats
+        self.stream = as_stream(decompressed(buffer))
+        if self.stats.count_primitives:
+            self.stream = CountingStream(self.stream, self.stats)
+        self.use_numpy = records.HAS_NUMPY if use_numpy is None else use_numpy
+        if columnar:
+            self.track = Track("", "", 0, VersionInfo(), LineTable(), SceneryLineTable(), [])
+        else:
+            self.track = Track("", "", 0, VersionInfo(), [], [], [])
         self.lump_lookup = {
             "VERSINFO": self.read_versinfo,
             "TRACKDEF": self.read_trackdef,
@@ -85,78 +155,150 @@ class LRPK_Reader:
 
     
     def read_trackdef(self):
-        self.track.name = self.stream.ReadBytes(self.stream.ReadUInt8()).decode("utf8")
-        self.track.author = self.stream.ReadBytes(self.stream.ReadUInt8()).decode("utf8")
+        self.track.name = str(self.stream.ReadBytes(self.stream.ReadUInt8()), "utf8")
+        self.track.author = str(self.stream.ReadBytes(self.stream.ReadUInt8()), "utf8")
         self.track.grid_model = self.stream.ReadUInt8()
     
     def read_linedef(self):
         num_lines = self.stream.ReadUInt32()
+        if isinstance(self.track.physics_lines, LineTable):
+            self.read_lump_table(self.track.physics_lines, num_lines, LINEDEF_FORMAT)
+            return
+        
+        if self.use_numpy:
+            data = self.stream.ReadBytes(num_lines * records.LINEDEF_SIZE)
+            extensions = list(LineExtension)
+            self.track.physics_lines.extend(
+                PhysicsLine(id, Vector2d(x1, y1), Vector2d(x2, y2), type, flipped, extensions[extension])
+                for id, x1, y1, x2, y2, type, flipped, extension
+                in records.decode_linedef(data, num_lines).tolist()
+            )
+            return
+        
         for i in range(num_lines):
+            id, x1, y1, x2, y2, type, flipped, extension = self.stream.read_struct(LINEDEF_FORMAT)
             self.track.physics_lines.append(
                 PhysicsLine(
-                    self.stream.ReadUInt32(),
-                    Vector2d(self.stream.ReadDouble(), self.stream.ReadDouble()),
-                    Vector2d(self.stream.ReadDouble(), self.stream.ReadDouble()),
-                    self.stream.ReadUInt8(),
-                    self.stream.ReadBool(),
-                    LineExtension(self.stream.ReadUInt8())
+                    id,
+                    Vector2d(x1, y1),
+                    Vector2d(x2, y2),
+                    type,
+                    flipped,
+                    LineExtension(extension)
                 )
             )
     
     def read_linedeco(self):
         num_lines = self.stream.ReadUInt32()
+        if isinstance(self.track.scenery_lines, SceneryLineTable):
+            self.read_lump_table(self.track.scenery_lines, num_lines, LINEDECO_FORMAT)
+            return
+        
+        if self.use_numpy:
+            data = self.stream.ReadBytes(num_lines * records.LINEDECO_SIZE)
+            self.track.scenery_lines.extend(
+                SceneryLine(id, Vector2d(x1, y1), Vector2d(x2, y2))
+                for id, x1, y1, x2, y2
+                in records.decode_linedeco(data, num_lines).tolist()
+            )
+            return
+        
         for i in range(num_lines):
+            id, x1, y1, x2, y2 = self.stream.read_struct(LINEDECO_FORMAT)
             self.track.scenery_lines.append(
                 SceneryLine(
-                    self.stream.ReadUInt32(),
-                    Vector2d(self.stream.ReadSingle(), self.stream.ReadSingle()),
-                    Vector2d(self.stream.ReadSingle(), self.stream.ReadSingle()),
+                    id,
+                    Vector2d(x1, y1),
+                    Vector2d(x2, y2),
                 )
             )
     
+    def read_lump_table(self, table: BaseLineTable, num_lines: int, fmt: str):
+        record = get_struct(fmt)
+        data = self.stream.ReadBytes(num_lines * record.size)
+        if self.use_numpy:
+            decode = records.decode_linedef if fmt == LINEDEF_FORMAT else records.decode_linedeco
+            records.fill_table(table, decode(data, num_lines))
+        else:
+            for values in record.iter_unpack(data):
+                table.append_record(*values)
+    
+    def iter_lump_records(self, lump: Lump, fmt: str, chunk_lines: int = 65536) -> Iterator[tuple]:
+        """Lazily decodes the records of a LINEDEF or LINEDECO lump, `chunk_lines` records at a time."""
+        record = get_struct(fmt)
+        self.stream.seek(lump.position)
+        remaining = self.stream.ReadUInt32()
+        position = self.stream.tell()
+        while remaining:
+            count = min(remaining, chunk_lines)
+            self.stream.seek(position) # the stream may be used elsewhere between chunks
+            data = self.stream.ReadBytes(count * record.size)
+            position += len(data)
+            remaining -= count
+            yield from record.iter_unpack(data)
+    
     def read_riderdef(self):
         self.track.riders.append(
-            Rider(Vector2d(self.stream.ReadDouble(), self.stream.ReadDouble()))
+            Rider(Vector2d(*self.stream.read_struct("<2d")))
         )
 
-    def read_directories(self):
+    def read_directory_table(self) -> List[Lump]:
+        """Reads the lump count, directory pointer and directory table, without loading any lumps."""
         lump_count = self.stream.ReadUInt32()
-        directory_pointer = self.stream.ReadUInt32()
-        print(f"Directories at {directory_pointer}")
+        self.directory_pointer = self.stream.ReadUInt32()
 
-        self.HEADER_SIZE = self.stream.base_stream.tell() + 1
+        self.HEADER_SIZE = self.stream.tell() + 1
 
-        self.stream.base_stream.seek(directory_pointer)
+        self.stream.seek(self.directory_pointer)
 
-        for i in range(lump_count):
-            lump = Lump(
-                type=self.stream.ReadBytes(8).decode("utf8").strip(),
-                position=self.stream.ReadUInt32()
-            )
+        lumps = []
+        with self.stats.section("directory", self.stream):
+            for i in range(lump_count):
+                lump = Lump(
+                    type=str(self.stream.ReadBytes(8), "utf8").strip(),
+                    position=self.stream.ReadUInt32()
+                )
+
+                if i == 0:
+                    assert lump.type == "VERSINFO", "Expected Version info as first lump"
+                
+                lumps.append(lump)
+        
+        return lumps
+
+    def read_lump(self, lump: Lump):
+        pos = self.stream.tell()
+        self.stream.seek(lump.position) # + HEADER_SIZE?
+        
+        with self.stats.section(f"lump.{lump.type}", self.stream):
+            self.lump_lookup[lump.type]()
+        
+        self.stream.seek(pos)
 
-            if i == 0:
-                assert lump.type == "VERSINFO", "Expected Version info as first lump"
+    def read_directories(self):
+        lumps = self.read_directory_table()
+        self.stats.event("directory_table", position=self.directory_pointer, lumps=len(lumps))
 
-            print(f"lump {lump.type!r} at {lump.position}")
+        for lump in lumps:
+            self.stats.event("lump", type=lump.type, position=lump.position)
             if lump.type in self.lump_lookup:
-                pos = self.stream.base_stream.tell()
-                self.stream.base_stream.seek(lump.position) # + HEADER_SIZE?
-                
-                self.lump_lookup[lump.type]()
-                
-                self.stream.base_stream.seek(pos)
+                self.read_lump(lump)
             
             else:
                 raise Exception(f"Unsupported Lump {lump.type!r}")
                 # TODO: not crash
     
-    def read(self) -> Track:
+    def read_header(self):
         # Implementation of https://github.com/kevansevans/OpenLR/wiki/The-LRPK-Format
 
         # Header
-        magic = self.stream.ReadBytes(4)
-        if magic != b"LRPK":
-            raise Exception(f"Incorrect magic number {magic!r}")
+        with self.stats.section("header", self.stream):
+            magic = self.stream.ReadBytes(4)
+            if magic != b"LRPK":
+                raise Exception(f"Incorrect magic number {bytes(magic)!r}")
+
+    def read(self) -> Track:
+        self.read_header()
 
         # Directories
         self.read_directories()
@@ -164,69 +306,134 @@ class LRPK_Reader:
         return self.track
 
 class LRPK_Writer:
-    def __init__(self, buffer: io.BufferedReader, track: Track) -> None:
-        self.stream = BinaryStream(buffer)
+    def __init__(
+        self,
+        buffer: io.BufferedReader,
+        track: Track,
+        use_numpy: Optional[bool] = None,
+        chunk_size: int = 1 << 20,
+        stats: Optional[Stats] = None,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None,
+    ) -> None:
+        """
+        `use_numpy` encodes whole line lumps at once with numpy,
+        by default it is used whenever numpy is installed.
+        Output is encoded in memory and written to `buffer` in chunks of about `chunk_size` bytes,
+        the header is patched once the directory is written so with a non-seekable `buffer`
+        nothing is written out until then.
+        `stats` collects timings of the header, directory and each lump, see `instrument.Stats`.
+        `compression` ("gzip", "bz2" or "lzma") compresses the output, which can't be seeked into
+        so the whole file is buffered until the header is patched. `buffer` is left open.
+        """
+        self.stats = NO_STATS if stats is None else stats
+        self.compressor = None if compression is None else compressor(buffer, compression, compression_level)
+        self.stream = BufferedWriteStream(buffer if self.compressor is None else self.compressor, chunk_size)
+        if self.stats.count_primitives:
+            self.stream = CountingStream(self.stream, self.stats)
         self.track = track
+        self.use_numpy = records.HAS_NUMPY if use_numpy is None else use_numpy
         self.directories: List[Tuple[str, int]] = []
     
     def write_versinfo(self):
-        self.directories.append(("VERSINFO", self.stream.base_stream.tell()))
-        self.stream.WriteBool(self.track.version_info.in_development)
-        self.stream.WriteUInt8(self.track.version_info.engine_version)
-        self.stream.WriteUInt8(self.track.version_info.library_version)
-        self.stream.WriteUInt8(self.track.version_info.save_revision)
-        self.stream.WriteUInt8(self.track.version_info.source_port_version)
+        self.directories.append(("VERSINFO", self.stream.tell()))
+        with self.stats.section("lump.VERSINFO", self.stream):
+            self.stream.WriteBool(self.track.version_info.in_development)
+            self.stream.WriteUInt8(self.track.version_info.engine_version)
+            self.stream.WriteUInt8(self.track.version_info.library_version)
+            self.stream.WriteUInt8(self.track.version_info.save_revision)
+            self.stream.WriteUInt8(self.track.version_info.source_port_version)
     
     def write_trackdef(self):
-        self.directories.append(("TRACKDEF", self.stream.base_stream.tell()))
-        self.stream.WriteStringSingleByteLength(self.track.name)
-        self.stream.WriteStringSingleByteLength(self.track.author)
-        self.stream.WriteUInt8(self.track.grid_model)
+        self.directories.append(("TRACKDEF", self.stream.tell()))
+        with self.stats.section("lump.TRACKDEF", self.stream):
+            self.stream.WriteStringSingleByteLength(self.track.name)
+            self.stream.WriteStringSingleByteLength(self.track.author)
+            self.stream.WriteUInt8(self.track.grid_model)
     
     def write_linedef(self):
-        self.directories.append(("LINEDEF", self.stream.base_stream.tell()))
-        self.stream.WriteUInt32(len(self.track.physics_lines))
-        for line in self.track.physics_lines:
-            self.stream.WriteUInt32(line.id)
-            self.stream.WriteDouble(line.start.x)
-            self.stream.WriteDouble(line.start.y)
-            self.stream.WriteDouble(line.end.x)
-            self.stream.WriteDouble(line.end.y)
-            self.stream.WriteUInt8(line.type)
-            self.stream.WriteBool(line.flipped)
-            self.stream.WriteUInt8(line.extension)  
+        self.directories.append(("LINEDEF", self.stream.tell()))
+        with self.stats.section("lump.LINEDEF", self.stream):
+            self.stream.WriteUInt32(len(self.track.physics_lines))
+            self.write_lines(self.track.physics_lines, LineTable, LINEDEF_FORMAT)
     
     def write_linedeco(self):
         num_lines = len(self.track.scenery_lines)
         if num_lines == 0:
             return
-        self.directories.append(("LINEDECO", self.stream.base_stream.tell()))
-        self.stream.WriteUInt32(num_lines)
-        for line in self.track.scenery_lines:
-            self.stream.WriteUInt32(line.id)
-            self.stream.WriteSingle(line.start.x)
-            self.stream.WriteSingle(line.start.y)
-            self.stream.WriteSingle(line.end.x)
-            self.stream.WriteSingle(line.end.y)
+        self.directories.append(("LINEDECO", self.stream.tell()))
+        with self.stats.section("lump.LINEDECO", self.stream):
+            self.stream.WriteUInt32(num_lines)
+            self.write_lines(self.track.scenery_lines, SceneryLineTable, LINEDECO_FORMAT)
+    
+    def write_lines(self, lines, table_type: Type[BaseLineTable], fmt: str):
+        if self.use_numpy:
+            dtype = records.LINEDEF_DTYPE if fmt == LINEDEF_FORMAT else records.LINEDECO_DTYPE
+            if isinstance(lines, table_type):
+                self.stream.WriteBytes(records.encode_columns(dtype, lines.column_arrays()))
+            else:
+                self.stream.WriteBytes(records.encode_records(dtype, map(table_type.record_of, lines)))
+            return
+        
+        rows = lines.rows() if isinstance(lines, table_type) else map(table_type.record_of, lines)
+        for row in rows:
+            self.stream.write_struct(fmt, *row)
     
     def write_riderdefs(self):
         for rider in self.track.riders:
-            self.directories.append(("RIDERDEF", self.stream.base_stream.tell()))
-            self.stream.WriteDouble(rider.position.x)
-            self.stream.WriteDouble(rider.position.y)
+            self.directories.append(("RIDERDEF", self.stream.tell()))
+            with self.stats.section("lump.RIDERDEF", self.stream):
+                self.stream.write_struct("<2d", rider.position.x, rider.position.y)
     
     def write_directories(self):
-        for name, pointer in self.directories:
-            self.stream.WriteBytes(name.ljust(8).encode("ascii"))
-            self.stream.WriteUInt32(pointer)
+        with self.stats.section("directory", self.stream):
+            for name, pointer in self.directories:
+                self.stream.WriteBytes(name.ljust(8).encode("ascii"))
+                self.stream.WriteUInt32(pointer)
     
-    def write(self):
-        # Header
-        self.stream.WriteBytes(b"LRPK")
+    def write_lump_stream(self, name: str, lines: Iterable, table_type: Type[BaseLineTable], fmt: str, skip_empty: bool = False):
+        """Writes a line lump from an iterable of line objects or table records, patching in the count afterwards."""
+        lines = iter(lines)
+        first = next(lines, None)
+        if first is None and skip_empty:
+            return
         
-        pointer_loc = self.stream.base_stream.tell()
-        self.stream.WriteUInt32(0) # directory count
-        self.stream.WriteUInt32(0) # directory pointer
+        self.directories.append((name, self.stream.tell()))
+        with self.stats.section(f"lump.{name}", self.stream):
+            count_pointer = self.stream.reserve("<I") # line count
+
+            count = 0
+            if first is not None:
+                write_struct = self.stream.write_struct
+                for line in itertools.chain((first,), lines):
+                    write_struct(fmt, *(line if isinstance(line, tuple) else table_type.record_of(line)))
+                    count += 1
+            
+            self.stream.patch(count_pointer, "<I", count)
+
+    def write_header(self) -> int:
+        """Writes the header with placeholders for the directory count and pointer, returning their position."""
+        with self.stats.section("header", self.stream):
+            self.stream.WriteBytes(b"LRPK")
+            
+            return self.stream.reserve("<2I") # directory count and pointer
+
+    def write_footer(self, pointer_loc: int):
+        """Writes the directory table and patches the header to point to it."""
+        directory_pointer = self.stream.tell()
+        self.write_directories()
+        
+        self.stream.patch(pointer_loc, "<2I", len(self.directories), directory_pointer)
+        self.finish()
+
+    def finish(self):
+        """Writes out everything still buffered, ending the compressed stream if there is one."""
+        self.stream.flush()
+        if self.compressor is not None:
+            self.compressor.close()
+
+    def write(self):
+        pointer_loc = self.write_header()
 
         self.write_versinfo()
         self.write_linedef()
@@ -234,9 +441,20 @@ class LRPK_Writer:
         self.write_riderdefs()
         self.write_trackdef()
 
-        directory_pointer = self.stream.base_stream.tell()
-        self.write_directories()
-        
-        self.stream.base_stream.seek(pointer_loc)
-        self.stream.WriteUInt32(len(self.directories))
-        self.stream.WriteUInt32(directory_pointer)
+        self.write_footer(pointer_loc)
+
+    def write_stream(self, physics_lines: Iterable, scenery_lines: Iterable = ()):
+        """
+        Writes the track with lines taken from iterables instead of `self.track`, so they never need
+        to be in memory all at once. The iterables may hold line objects or `LineTable` /
+        `SceneryLineTable` records. `physics_lines` is exhausted before `scenery_lines` is started.
+        """
+        pointer_loc = self.write_header()
+
+        self.write_versinfo()
+        self.write_lump_stream("LINEDEF", physics_lines, LineTable, LINEDEF_FORMAT)
+        self.write_lump_stream("LINEDECO", scenery_lines, SceneryLineTable, LINEDECO_FORMAT, skip_empty=True)
+        self.write_riderdefs()
+        self.write_trackdef()
+
+        self.write_footer(pointer_loc)
@@ -0,0 +1,111 @@
+"""
+Saving small edits to an existing LRPK file without rewriting it.
+
+Lumps are found through the directory table, so changed lumps can be written after
+the existing data followed by a new directory table, leaving the old lumps in place
+but unreferenced. Readers concatenate every LINEDEF and LINEDECO lump, which lets
+new lines be saved as a delta lump. `compact` rewrites the file without the dead lumps.
+"""
+import io
+from typing import *
+
+from .track import *
+
+
+class LRPK_Updater:
+    """
+    Appends lumps to an LRPK file opened for reading and writing ("r+b").
+    Changes are only visible to readers once `commit` has written the new directory table
+    and patched the header to point to it, an interrupted save leaves the previous version intact.
+    """
+
+    def __init__(self, buffer: io.BufferedRandom, use_numpy: Optional[bool] = None) -> None:
+        self.buffer = buffer
+        buffer.seek(0)
+        reader = LRPK_Reader(buffer, use_numpy=use_numpy)
+        reader.read_header()
+        self.lumps: List[Lump] = reader.read_directory_table()
+        self.track = Track("", "", 0, VersionInfo(), [], [], [])
+        self.writer: Optional[LRPK_Writer] = None
+        self.use_numpy = use_numpy
+
+    def start_lump(self) -> LRPK_Writer:
+        """Returns a writer positioned at the end of the file, for appending lumps."""
+        if self.writer is None:
+            self.buffer.seek(0, io.SEEK_END)
+            self.writer = LRPK_Writer(self.buffer, self.track, use_numpy=self.use_numpy)
+        return self.writer
+
+    def add_lumps(self):
+        self.lumps.extend(Lump(name, position) for name, position in self.writer.directories)
+        self.writer.directories.clear()
+
+    def drop_lumps(self, lump_type: str):
+        self.lumps = [lump for lump in self.lumps if lump.type != lump_type]
+
+    def set_version_info(self, version_info: VersionInfo):
+        # VERSINFO has to stay the first lump
+        self.track.version_info = version_info
+        self.start_lump().write_versinfo()
+        self.lumps[0] = Lump(*self.writer.directories.pop())
+
+    def set_trackdef(self, name: str, author: str, grid_model: int):
+        self.track.name, self.track.author, self.track.grid_model = name, author, grid_model
+        self.drop_lumps("TRACKDEF")
+        self.start_lump().write_trackdef()
+        self.add_lumps()
+
+    def set_riders(self, riders: List[Rider]):
+        self.track.riders = riders
+        self.drop_lumps("RIDERDEF")
+        self.start_lump().write_riderdefs()
+        self.add_lumps()
+
+    def append_lines(self, physics_lines: Iterable = (), scenery_lines: Iterable = ()):
+        """
+        Adds lines in delta LINEDEF and LINEDECO lumps, only the new lines are written.
+        Lines may be line objects or table records.
+        """
+        writer = self.start_lump()
+        writer.write_lump_stream("LINEDEF", physics_lines, LineTable, LINEDEF_FORMAT, skip_empty=True)
+        writer.write_lump_stream("LINEDECO", scenery_lines, SceneryLineTable, LINEDECO_FORMAT, skip_empty=True)
+        self.add_lumps()
+
+    def replace_lines(self, physics_lines: Optional[Iterable] = None, scenery_lines: Optional[Iterable] = None):
+        """
+        Replaces every LINEDEF lump (when `physics_lines` is given) and every LINEDECO lump
+        (when `scenery_lines` is given) with a single new one, for edits that change or remove lines.
+        """
+        writer = self.start_lump()
+        if physics_lines is not None:
+            self.drop_lumps("LINEDEF")
+            writer.write_lump_stream("LINEDEF", physics_lines, LineTable, LINEDEF_FORMAT)
+        if scenery_lines is not None:
+            self.drop_lumps("LINEDECO")
+            writer.write_lump_stream("LINEDECO", scenery_lines, SceneryLineTable, LINEDECO_FORMAT, skip_empty=True)
+        self.add_lumps()
+
+    def commit(self):
+        """Writes the directory table after the new lumps and points the header at it."""
+        stream = self.start_lump().stream
+        directory_pointer = stream.tell()
+        self.writer.directories = [(lump.type, lump.position) for lump in self.lumps]
+        self.writer.write_directories()
+        self.writer.directories.clear()
+        stream.flush() # everything the header will point to goes out first
+
+        stream.seek(4)
+        stream.write_struct("<2I", len(self.lumps), directory_pointer)
+        stream.flush()
+        self.writer = None
+
+
+def compact(source: ReadableBuffer, destination: io.BufferedWriter, use_numpy: Optional[bool] = None):
+    """Rewrites an LRPK file with one lump of each kind, dropping lumps left unreferenced by updates."""
+    reader = LRPK_Reader(source, use_numpy=use_numpy, columnar=True)
+    reader.read_header()
+    for lump in reader.read_directory_table():
+        if lump.type in reader.lump_lookup:
+            reader.read_lump(lump)
+
+    LRPK_Writer(destination, reader.track, use_numpy=use_numpy).write()
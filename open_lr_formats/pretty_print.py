@@ -1,47 +1,168 @@
-from collections.abc import Mapping, Iterable
+from collections import deque
+from collections.abc import Mapping, Iterable, Sequence
 from dataclasses import is_dataclass, fields
+import itertools
+import sys
 
-def pretty_print(obj, indent=4):
+# How each type is printed, and the field names of dataclasses, so that
+# reflection happens once per class rather than once per object.
+_kinds = {}
+_field_names = {}
+
+def _classify(obj):
+    if isinstance(obj, str):
+        return 'str'
+    if is_dataclass(obj):
+        return 'dataclass'
+    if isinstance(obj, Mapping):
+        return 'mapping'
+    if isinstance(obj, Iterable):
+        return 'iterable'
+    return 'scalar'
+
+def _kind(obj):
+    cls = type(obj)
+    kind = _kinds.get(cls)
+    if kind is None:
+        kind = _classify(obj)
+        if isinstance(obj, type):
+            return kind # classes are told apart by themselves, not by their metaclass
+        
+        _kinds[cls] = kind
+        if kind == 'dataclass':
+            _field_names[cls] = tuple(field.name for field in fields(cls))
+    return kind
+
+class _Skipped(int):
+    """Stands in for the items left out by `max_items`."""
+
+def _truncated(items, max_items):
+    """`items` with all but the first and last `max_items` replaced by a `_Skipped` count."""
+    if max_items is None:
+        yield from items
+        return
+
+    if isinstance(items, Sequence):
+        # only index the items that get printed
+        length = len(items)
+        if length > 2 * max_items:
+            yield from (items[i] for i in range(max_items))
+            yield _Skipped(length - 2 * max_items)
+            yield from (items[i] for i in range(length - max_items, length))
+        else:
+            yield from items
+        return
+
+    iterator = iter(items)
+    yield from itertools.islice(iterator, max_items)
+    last = deque(maxlen=max_items)
+    skipped = 0
+    for item in iterator:
+        if len(last) == max_items:
+            skipped += 1
+        last.append(item)
+    if skipped:
+        yield _Skipped(skipped)
+    yield from last
+
+def pretty_print(obj, indent=4, file=None, **options):
     """
     Pretty prints a (possibly deeply-nested) dataclass.
     Each new block will be indented by `indent` spaces (default is 4).
+    The output is written as it is generated, see `iter_stringify` for the `options`.
     """
-    print(stringify(obj, indent))
+    file = sys.stdout if file is None else file
+    dump(obj, file, indent, **options)
+    file.write('\n')
 
-def stringify(obj, indent=4, _indents=0):
-    if isinstance(obj, str):
-        return f"'{obj}'"
+def dump(obj, file, indent=4, buffer_size=1 << 16, **options):
+    """Writes `stringify(obj)` to a text file in pieces of about `buffer_size` characters."""
+    pieces = []
+    size = 0
+    for piece in iter_stringify(obj, indent, **options):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= buffer_size:
+            file.write(''.join(pieces))
+            pieces.clear()
+            size = 0
+    file.write(''.join(pieces))
 
-    if not is_dataclass(obj) and not isinstance(obj, (Mapping, Iterable)):
-        return str(obj)
+def stringify(obj, indent=4, **options):
+    return ''.join(iter_stringify(obj, indent, **options))
+
+def iter_stringify(obj, indent=4, max_items=None, max_depth=None, skip_fields=(), _indents=0):
+    """
+    Generates `stringify(obj)` piece by piece.
+    `max_items` only prints the first and last `max_items` items of longer lists and dicts,
+    `max_depth` stops printing the contents of anything nested deeper,
+    and fields named in `skip_fields` are left out of dataclasses.
+    """
+    kind = _kind(obj)
+    if kind == 'str':
+        yield f"'{obj}'"
+        return
+
+    if kind == 'scalar':
+        yield str(obj)
+        return
 
     this_indent = indent * _indents * ' '
     next_indent = indent * (_indents + 1) * ' '
     start, end = f'{type(obj).__name__}(', ')'  # dicts, lists, and tuples will re-assign this
-
-    if is_dataclass(obj):
-        body = '\n'.join(
-            f'{next_indent}{field.name}='
-            f'{stringify(getattr(obj, field.name), indent, _indents + 1)},' for field in fields(obj)
-        )
-
-    elif isinstance(obj, Mapping):
-        if isinstance(obj, dict):
-            start, end = '{}'
-
-        body = '\n'.join(
-            f'{next_indent}{stringify(key, indent, _indents + 1)}: '
-            f'{stringify(value, indent, _indents + 1)},' for key, value in obj.items()
-        )
-
-    else:  # is Iterable
+    if kind == 'mapping' and isinstance(obj, dict):
+        start, end = '{}'
+    elif kind == 'iterable':
         if isinstance(obj, list):
             start, end = '[]'
         elif isinstance(obj, tuple):
             start = '('
 
-        body = '\n'.join(
-            f'{next_indent}{stringify(item, indent, _indents + 1)},' for item in obj
-        )
+    if max_depth is not None and _indents >= max_depth:
+        yield f'{start}...{end}'
+        return
+
+    options = (indent, max_items, max_depth, skip_fields, _indents + 1)
+    yield start
+    yield '\n'
+
+    if kind == 'dataclass':
+        names = _field_names.get(type(obj)) or [field.name for field in fields(obj)]
+        first = True
+        for name in names:
+            if name in skip_fields:
+                continue
+            if not first:
+                yield '\n'
+            first = False
+            yield f'{next_indent}{name}='
+            yield from iter_stringify(getattr(obj, name), *options)
+            yield ','
+
+    elif kind == 'mapping':
+        for i, entry in enumerate(_truncated(obj.items(), max_items)):
+            if i:
+                yield '\n'
+            if isinstance(entry, _Skipped):
+                yield f'{next_indent}... {entry} more items ...'
+                continue
+            key, value = entry
+            yield next_indent
+            yield from iter_stringify(key, *options)
+            yield ': '
+            yield from iter_stringify(value, *options)
+            yield ','
+
+    else:  # is Iterable
+        for i, item in enumerate(_truncated(obj, max_items)):
+            if i:
+                yield '\n'
+            if isinstance(item, _Skipped):
+                yield f'{next_indent}... {item} more items ...'
+                continue
+            yield next_indent
+            yield from iter_stringify(item, *options)
+            yield ','
 
-    return f'{start}\n{body}\n{this_indent}{end}'
\ No newline at end of file
+    yield '\n'
+    yield f'{this_indent}{end}'
@@ -0,0 +1,285 @@
+"""
+Uniform grid spatial index over track lines, for viewport and nearest-line queries
+without scanning every line.
+"""
+import math
+from typing import *
+
+from .table import BaseLineTable
+from .trk import track as trk
+from .lrpk import track as lrpk
+
+Segment = Tuple[float, float, float, float]
+Cell = Tuple[int, int]
+
+
+def segment_coordinates(lines) -> Iterator[Segment]:
+    """(x1, y1, x2, y2) of each line, read straight from the columns of a table."""
+    if isinstance(lines, BaseLineTable):
+        return zip(lines.x1, lines.y1, lines.x2, lines.y2)
+    return ((line.start.x, line.start.y, line.end.x, line.end.y) for line in lines)
+
+
+def segment_distance(x: float, y: float, segment: Segment) -> float:
+    x1, y1, x2, y2 = segment
+    dx = x2 - x1
+    dy = y2 - y1
+    length = dx * dx + dy * dy
+    t = 0.0
+    if length > 0:
+        t = min(1.0, max(0.0, ((x - x1) * dx + (y - y1) * dy) / length))
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+def segment_intersects_box(segment: Segment, min_x: float, min_y: float, max_x: float, max_y: float) -> bool:
+    """Liang-Barsky clipping of the segment against the box."""
+    x1, y1, x2, y2 = segment
+    t0, t1 = 0.0, 1.0
+    dx = x2 - x1
+    dy = y2 - y1
+    for p, q in ((-dx, x1 - min_x), (dx, max_x - x1), (-dy, y1 - min_y), (dy, max_y - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
+
+class GridIndex:
+    """
+    Buckets lines into square cells of `cell_size` units, every cell a line passes
+    through holds its key. Keys are any hashable, `from_lines` uses list positions.
+    Cells should be a few times larger than a typical line for the best query times.
+
+    Lines that would pass through more than `max_cells` cells are kept in an overflow
+    bucket instead, which every query checks, so one huge line can't exhaust memory.
+    """
+
+    def __init__(self, cell_size: float = 64.0, max_cells: int = 4096) -> None:
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self.cells: Dict[Cell, Set[Hashable]] = {}
+        self.overflow: Set[Hashable] = set()
+        self.segments: Dict[Hashable, Segment] = {}
+        self.bounds: Optional[Tuple[int, int, int, int]] = None # occupied cell range
+        self.skipped: List[Hashable] = [] # keys of lines with non-finite coordinates, see `from_lines`
+
+    @classmethod
+    def from_lines(cls, lines, cell_size: float = 64.0) -> "GridIndex":
+        """
+        Indexes a list of lines or a line table, keyed by position.
+        Lines with NaN or infinite coordinates are left out, their keys go to `skipped`.
+        """
+        index = cls(cell_size)
+        index.insert_many(enumerate(segment_coordinates(lines)))
+        return index
+
+    @classmethod
+    def from_track(cls, track: Union[trk.Track, lrpk.Track], cell_size: float = 64.0) -> "GridIndex":
+        """
+        Indexes every line of a TRK track, or of an LRPK track with physics lines
+        first and scenery lines after them, keyed by position.
+        """
+        if isinstance(track, trk.Track):
+            return cls.from_lines(track.lines, cell_size)
+        
+        index = cls.from_lines(track.physics_lines, cell_size)
+        offset = len(track.physics_lines)
+        index.insert_many(enumerate(segment_coordinates(track.scenery_lines), offset))
+        return index
+
+    def cell_of(self, x: float, y: float) -> Cell:
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def cells_of(self, x1: float, y1: float, x2: float, y2: float) -> List[Cell]:
+        """Every cell the segment passes through (Amanatides & Woo traversal)."""
+        cx, cy = self.cell_of(x1, y1)
+        end = self.cell_of(x2, y2)
+        cells = [(cx, cy)]
+        if (cx, cy) == end:
+            return cells
+        
+        size = self.cell_size
+        dx = x2 - x1
+        dy = y2 - y1
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        t_max_x = ((cx + (dx > 0)) * size - x1) / dx if dx else math.inf
+        t_max_y = ((cy + (dy > 0)) * size - y1) / dy if dy else math.inf
+        t_delta_x = size / abs(dx) if dx else math.inf
+        t_delta_y = size / abs(dy) if dy else math.inf
+
+        for i in range(abs(end[0] - cx) + abs(end[1] - cy)):
+            if t_max_x < t_max_y:
+                cx += step_x
+                t_max_x += t_delta_x
+            else:
+                cy += step_y
+                t_max_y += t_delta_y
+            cells.append((cx, cy))
+        
+        if cells[-1] != end: # rounding
+            cells.append(end)
+        return cells
+
+    def cell_count(self, x1: float, y1: float, x2: float, y2: float) -> int:
+        """How many cells `cells_of` returns for the segment, without walking them."""
+        (ax, ay), (bx, by) = self.cell_of(x1, y1), self.cell_of(x2, y2)
+        return abs(bx - ax) + abs(by - ay) + 1
+
+    def insert(self, key: Hashable, x1: float, y1: float, x2: float, y2: float):
+        if not (math.isfinite(x1) and math.isfinite(y1) and math.isfinite(x2) and math.isfinite(y2)):
+            raise Exception(f"Line {key!r} has non-finite coordinates ({x1}, {y1}, {x2}, {y2}) and can't be indexed")
+        if key in self.segments:
+            self.remove(key)
+        
+        self.segments[key] = (x1, y1, x2, y2)
+        if self.cell_count(x1, y1, x2, y2) > self.max_cells:
+            self.overflow.add(key)
+            return
+        
+        cells = self.cells
+        for cell in self.cells_of(x1, y1, x2, y2):
+            bucket = cells.get(cell)
+            if bucket is None:
+                bucket = cells[cell] = set()
+            bucket.add(key)
+        
+        (ax, ay), (bx, by) = self.cell_of(x1, y1), self.cell_of(x2, y2)
+        low_x, low_y, high_x, high_y = min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)
+        if self.bounds is not None:
+            low_x = min(low_x, self.bounds[0])
+            low_y = min(low_y, self.bounds[1])
+            high_x = max(high_x, self.bounds[2])
+            high_y = max(high_y, self.bounds[3])
+        self.bounds = (low_x, low_y, high_x, high_y)
+
+    def insert_many(self, segments: Iterable[Tuple[Hashable, Segment]]):
+        """Inserts (key, segment) pairs, skipping lines with non-finite coordinates into `skipped`."""
+        isfinite = math.isfinite
+        for key, (x1, y1, x2, y2) in segments:
+            if isfinite(x1) and isfinite(y1) and isfinite(x2) and isfinite(y2):
+                self.insert(key, x1, y1, x2, y2)
+            else:
+                self.skipped.append(key)
+
+    def remove(self, key: Hashable):
+        segment = self.segments.pop(key)
+        if key in self.overflow:
+            self.overflow.discard(key)
+            return
+        
+        for cell in self.cells_of(*segment):
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.cells[cell]
+
+    def candidates(self, min_x: float, min_y: float, max_x: float, max_y: float) -> Set[Hashable]:
+        """Keys of lines in the cells overlapping the box and of overflow lines, which may not touch the box itself."""
+        low_x, low_y = self.cell_of(min_x, min_y)
+        high_x, high_y = self.cell_of(max_x, max_y)
+        found = set(self.overflow)
+        if (high_x - low_x + 1) * (high_y - low_y + 1) > len(self.cells):
+            for (cx, cy), bucket in self.cells.items():
+                if low_x <= cx <= high_x and low_y <= cy <= high_y:
+                    found.update(bucket)
+            return found
+        
+        cells = self.cells
+        for cx in range(low_x, high_x + 1):
+            for cy in range(low_y, high_y + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def query_bbox(self, min_x: float, min_y: float, max_x: float, max_y: float) -> Set[Hashable]:
+        """Keys of all lines intersecting the box."""
+        segments = self.segments
+        return {
+            key for key in self.candidates(min_x, min_y, max_x, max_y)
+            if segment_intersects_box(segments[key], min_x, min_y, max_x, max_y)
+        }
+
+    def nearest(self, x: float, y: float, max_distance: float = math.inf) -> Optional[Tuple[Hashable, float]]:
+        """The closest line to a point and its distance, searching outwards ring by ring of cells."""
+        best_key = None
+        best = max_distance
+        for key in self.overflow:
+            distance = segment_distance(x, y, self.segments[key])
+            if distance <= best:
+                best_key, best = key, distance
+        
+        if self.bounds is None:
+            return None if best_key is None else (best_key, best)
+        
+        cx, cy = self.cell_of(x, y)
+        low_x, low_y, high_x, high_y = self.bounds
+        # rings before this radius hold no cells at all, nor do rings beyond the last one
+        min_radius = max(low_x - cx, cx - high_x, low_y - cy, cy - high_y, 0)
+        max_radius = max(cx - low_x, high_x - cx, cy - low_y, high_y - cy, 0)
+
+        seen = set()
+        def visit(keys):
+            nonlocal best_key, best
+            for key in keys:
+                if key in seen:
+                    continue
+                seen.add(key)
+                distance = segment_distance(x, y, self.segments[key])
+                if distance <= best:
+                    best_key, best = key, distance
+
+        for radius in range(min_radius, max_radius + 1):
+            # every line in a farther ring is at least this far away
+            if best <= (radius - 1) * self.cell_size or (radius - 1) * self.cell_size > max_distance:
+                break
+            
+            cells = self.ring(cx, cy, radius, self.bounds)
+            if len(cells) > len(self.cells):
+                # sparse cells: checking every remaining one at once is cheaper than walking more rings
+                visit(key for (bx, by), bucket in self.cells.items() if max(abs(bx - cx), abs(by - cy)) >= radius for key in bucket)
+                break
+            
+            for cell in cells:
+                visit(self.cells.get(cell, ()))
+        
+        if best_key is None:
+            return None
+        return best_key, best
+
+    @staticmethod
+    def ring(cx: int, cy: int, radius: int, bounds: Optional[Tuple[int, int, int, int]] = None) -> List[Cell]:
+        """The cells at Chebyshev distance `radius` from (cx, cy), only those inside `bounds` if given."""
+        if bounds is None:
+            bounds = (cx - radius, cy - radius, cx + radius, cy + radius)
+        low_x, low_y, high_x, high_y = bounds
+        
+        if radius == 0:
+            return [(cx, cy)] if low_x <= cx <= high_x and low_y <= cy <= high_y else []
+        
+        cells = []
+        xs = range(max(cx - radius, low_x), min(cx + radius, high_x) + 1)
+        for y in (cy - radius, cy + radius):
+            if low_y <= y <= high_y:
+                cells.extend((x, y) for x in xs)
+        ys = range(max(cy - radius + 1, low_y), min(cy + radius - 1, high_y) + 1)
+        for x in (cx - radius, cx + radius):
+            if low_x <= x <= high_x:
+                cells.extend((x, y) for y in ys)
+        return cells
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.segments
@@ -0,0 +1,113 @@
+from array import array
+from collections.abc import MutableSequence, Sequence
+from typing import *
+
+
+class BaseLineTable(MutableSequence):
+    """
+    Columnar (struct-of-arrays) storage for track lines.
+    Every column is a compact `array.array`, and line objects are only built
+    when a row is indexed or iterated, so a table can stand in for a list of lines.
+    Line objects handed out are copies, changing them does not change the table.
+    """
+
+    # Column name -> array typecode, in the same order as `record_of` and `make_line`
+    columns: ClassVar[Dict[str, str]] = {}
+
+    def __init__(self) -> None:
+        self._columns: List[array] = []
+        for name, typecode in self.columns.items():
+            column = array(typecode)
+            setattr(self, name, column)
+            self._columns.append(column)
+    
+    @classmethod
+    def from_lines(cls, lines: Iterable) -> "BaseLineTable":
+        table = cls()
+        table.extend(lines)
+        return table
+
+    @staticmethod
+    def make_line(record: tuple):
+        """Builds a line object from a record."""
+        raise NotImplementedError
+
+    @staticmethod
+    def record_of(line) -> tuple:
+        """Splits a line object into a record."""
+        raise NotImplementedError
+
+    def column_arrays(self) -> List[array]:
+        return list(self._columns)
+
+    def extend_column(self, name: str, values) -> None:
+        """
+        Appends the raw contents of a buffer, e.g. a numpy array of the same type, to a column.
+        Every column must be extended by the same amount.
+        """
+        getattr(self, name).frombytes(memoryview(values).cast("B"))
+
+    def row(self, index: int) -> tuple:
+        return tuple(column[index] for column in self._columns)
+
+    def rows(self) -> Iterator[tuple]:
+        return zip(*self._columns)
+
+    def append_record(self, *record) -> None:
+        for column, value in zip(self._columns, record):
+            column.append(value)
+
+    def append(self, line) -> None:
+        self.append_record(*self.record_of(line))
+
+    def extend(self, lines: Iterable) -> None:
+        if isinstance(lines, type(self)):
+            for column, other in zip(self._columns, lines._columns):
+                column.extend(other)
+            return
+        
+        for line in lines:
+            self.append(line)
+
+    def insert(self, index: int, line) -> None:
+        for column, value in zip(self._columns, self.record_of(line)):
+            column.insert(index, value)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns[0])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.make_line(record) for record in zip(*(column[index] for column in self._columns))]
+        return self.make_line(self.row(index))
+
+    def __setitem__(self, index, line) -> None:
+        if isinstance(index, slice):
+            records = list(zip(*map(self.record_of, line)))
+            for i, column in enumerate(self._columns):
+                column[index] = array(column.typecode, records[i] if records else ())
+            return
+        
+        for column, value in zip(self._columns, self.record_of(line)):
+            column[index] = value
+
+    def __delitem__(self, index) -> None:
+        for column in self._columns:
+            del column[index]
+
+    def __iter__(self):
+        return map(self.make_line, self.rows())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, BaseLineTable):
+            return type(self) is type(other) and self._columns == other._columns
+        if isinstance(other, Sequence) and not isinstance(other, (str, bytes)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} lines)"
@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 from typing import *
 from enum import Enum
 
-@dataclass
+@dataclass(slots=True)
 class Vector2d:
     x: float
     y: float
@@ -18,19 +18,19 @@ class LineExtension(Enum):
     Right = 2
     Both = 3
 
-@dataclass
+@dataclass(slots=True)
 class BaseLine:
     start: Vector2d
     end: Vector2d
 
     type: ClassVar[LineType]
 
-@dataclass
+@dataclass(slots=True)
 class LineZoomTrigger:
     target_zoom: float
     frames: int
 
-@dataclass
+@dataclass(slots=True)
 class StandardLine(BaseLine):
     id: int
     extension: LineExtension = LineExtension.Nothing
@@ -39,13 +39,13 @@ class StandardLine(BaseLine):
 
     type = LineType.Standard
 
-@dataclass
+@dataclass(slots=True)
 class AccelerationLine(StandardLine):
     multiplier: int = 1
 
     type = LineType.Acceleration
 
-@dataclass
+@dataclass(slots=True)
 class SceneryLine(BaseLine):
     width: float = 1
 
@@ -0,0 +1,257 @@
+"""
+Two-pass TRK reading.
+
+Line records vary in size, so a track can only be decoded front to back. A cheap first pass
+records where every line record starts (a `TRKIndex`), which lets the second pass decode
+chunks of lines in worker processes, each mapping the same file, and allows random access to line N.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import io
+import mmap
+import os
+import sys
+from typing import *
+
+from ..binary import UINT8, BufferStream, ReadableBuffer, as_stream, get_struct
+from ..files import PathLike, map_file
+from .line import BaseLine, LineType
+from .table import LineTable
+from .track import Track, TRK_Reader, line_decoders, line_layouts
+
+INDEX_MAGIC = b"TRKI"
+_INDEX_HEADER = get_struct("<4sIQQ") # magic, features length, line count, file size
+
+
+def scan_offsets(data: ReadableBuffer, start: int, count: int, features: Set[str]) -> array:
+    """
+    Returns the offsets of `count` line records starting at `start`, followed by the offset just past the last one.
+    Only the flag byte and trigger flag of each record are looked at.
+    """
+    layouts = line_layouts(features)
+    offsets = array("Q", bytes(8 * (count + 1)))
+    offset = start
+    with memoryview(data) as view:
+        try:
+            for i in range(count):
+                offsets[i] = offset
+                flags = view[offset]
+                layout = layouts[flags]
+                if layout is None:
+                    LineType(flags & 0x1f) # raises
+
+                size, trigger = layout
+                if trigger and view[offset + trigger]:
+                    size += 6
+                offset += size
+        except IndexError:
+            offset = len(view) + 1
+
+        if offset > len(view):
+            raise Exception(f"Line data runs past the end of the file ({count} lines declared)")
+
+    offsets[count] = offset
+    return offsets
+
+
+def decode_chunk(data: ReadableBuffer, start: int, count: int, features: Set[str]) -> LineTable:
+    """Decodes `count` line records starting at offset `start` into a `LineTable`."""
+    stream = BufferStream(data)
+    try:
+        stream.seek(start)
+        read = stream.read_record
+        decoders = line_decoders(features)
+        table = LineTable()
+        append = table.append_record
+        for i in range(count):
+            append(*decoders[read(UINT8)[0]](read))
+        return table
+    finally:
+        stream.release()
+
+
+class TRKIndex:
+    """
+    The offset of every line record in a TRK file, along with the features that decide
+    their layout. `offsets` has one more entry than there are lines: the end of the line data.
+    Indexes can be saved with `dump` and reloaded with `load` to skip the scan next time,
+    `check` tells whether an index still matches its file. `file_size` is None if it wasn't known.
+    """
+
+    def __init__(self, features: Set[str], offsets: array, file_size: Optional[int] = None) -> None:
+        self.features = features
+        self.offsets = offsets
+        self.file_size = file_size
+        self.decoders = line_decoders(features)
+
+    @classmethod
+    def build(cls, buffer: ReadableBuffer) -> "TRKIndex":
+        """Scans a TRK file, reading only its header and the bytes that decide each line's size."""
+        stream = as_stream(buffer)
+        try:
+            reader = TRK_Reader(stream)
+            reader.read_header()
+            if isinstance(stream, BufferStream):
+                offsets = scan_offsets(stream.view, stream.tell(), reader.line_count, reader.track.features)
+                file_size = len(stream.view)
+            else:
+                offsets = array("Q")
+                for i in range(reader.line_count):
+                    offsets.append(stream.tell())
+                    reader.skip_line()
+                offsets.append(stream.tell())
+                try:
+                    file_size = stream.seek(0, io.SEEK_END)
+                except (OSError, io.UnsupportedOperation):
+                    file_size = None
+        finally:
+            if stream is not buffer and isinstance(stream, BufferStream):
+                stream.release()
+
+        return cls(reader.track.features, offsets, file_size)
+
+    def check(self, file_size: int, features: Set[str], line_count: int, lines_offset: int):
+        """Raises if this index wasn't built from a file with this size, header and first line offset."""
+        problems = []
+        if self.features != features:
+            problems.append(f"features {sorted(self.features)} != {sorted(features)}")
+        if len(self) != line_count:
+            problems.append(f"{len(self)} lines != {line_count}")
+        if self.offsets[0] != lines_offset:
+            problems.append(f"lines start at {self.offsets[0]} != {lines_offset}")
+        if self.file_size is not None and self.file_size != file_size:
+            problems.append(f"file size {self.file_size} != {file_size}")
+        if self.offsets[-1] > file_size:
+            problems.append(f"line data ends at {self.offsets[-1]}, past the end of the file")
+        if problems:
+            raise Exception(f"Index does not match the file: {', '.join(problems)}")
+
+    @property
+    def metadata_offset(self) -> int:
+        return self.offsets[-1]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def record(self, buffer: ReadableBuffer, n: int) -> tuple:
+        """Decodes line `n` of the file this index was built from as a `LineTable` record."""
+        if not -len(self) <= n < len(self):
+            raise IndexError("line index out of range")
+
+        stream = as_stream(buffer)
+        try:
+            stream.seek(self.offsets[n % len(self)])
+            read = stream.read_record
+            return self.decoders[read(UINT8)[0]](read)
+        finally:
+            if stream is not buffer and isinstance(stream, BufferStream):
+                stream.release()
+
+    def line(self, buffer: ReadableBuffer, n: int) -> BaseLine:
+        """Decodes line `n` of the file this index was built from."""
+        return LineTable.make_line(self.record(buffer, n))
+
+    def dump(self, f: BinaryIO):
+        features = ";".join(sorted(self.features)).encode("ascii")
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, len(features), len(self), self.file_size or 0))
+        f.write(features)
+
+        offsets = self.offsets
+        if sys.byteorder != "little":
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+        f.write(offsets)
+
+    @classmethod
+    def load(cls, data: ReadableBuffer) -> "TRKIndex":
+        """Reads an index written by `dump`."""
+        with memoryview(data) as view:
+            magic, features_length, count, file_size = _INDEX_HEADER.unpack_from(view)
+            if magic != INDEX_MAGIC:
+                raise Exception(f"Incorrect index magic number {magic!r}")
+
+            position = _INDEX_HEADER.size
+            features = str(view[position:position + features_length], "ascii")
+            position += features_length
+
+            offsets = array("Q")
+            raw = view[position:position + 8 * (count + 1)]
+            offsets.frombytes(raw[:len(raw) - len(raw) % 8])
+            if len(offsets) != count + 1:
+                raise Exception(f"Truncated index, expected {count + 1} offsets but got {len(offsets)}")
+            if sys.byteorder != "little":
+                offsets.byteswap()
+
+        return cls(set(features.split(";")) - {""}, offsets, file_size or None)
+
+
+# Each worker maps the file once, mappings of the same file share the page cache.
+_worker_data: Union[mmap.mmap, bytes] = b""
+_worker_features: Set[str] = set()
+
+def _init_worker(path: str, features: Set[str]):
+    global _worker_data, _worker_features
+    _worker_data = map_file(path)
+    _worker_features = features
+
+def _decode_in_worker(start: int, count: int) -> List[array]:
+    return decode_chunk(_worker_data, start, count, _worker_features).column_arrays()
+
+
+def read_parallel(
+    path: PathLike,
+    workers: Optional[int] = None,
+    chunk_lines: int = 1 << 16,
+    columnar: bool = False,
+    index: Optional[TRKIndex] = None,
+) -> Track:
+    """
+    Reads a TRK file, decoding chunks of `chunk_lines` lines over a pool of `workers` processes.
+    The lines are scanned for their offsets first unless an `index` is given,
+    which has to match the file (see `TRKIndex.check`).
+    Decoded chunks come back as columns, so `columnar` tracks gain the most;
+    otherwise line objects are still built in this process.
+    """
+    data = map_file(path)
+    stream = BufferStream(data)
+    try:
+        reader = TRK_Reader(stream, columnar=True)
+        reader.read_header()
+        features = reader.track.features
+        table = reader.track.lines
+        workers = workers or os.cpu_count() or 1
+
+        if index is None and (workers == 1 or reader.line_count <= chunk_lines):
+            # Nothing to split up, skip the scan and decode in one pass.
+            for i in range(reader.line_count):
+                table.append_record(*reader.read_line_record())
+            metadata_offset = stream.tell()
+        else:
+            if index is None:
+                index = TRKIndex(features, scan_offsets(stream.view, stream.tell(), reader.line_count, features), len(stream.view))
+            else:
+                index.check(len(stream.view), features, reader.line_count, stream.tell())
+            
+            starts = index.offsets[:-1:chunk_lines]
+            counts = [min(chunk_lines, reader.line_count - i) for i in range(0, reader.line_count, chunk_lines)]
+            if workers == 1 or len(starts) <= 1:
+                for start, count in zip(starts, counts):
+                    table.extend(decode_chunk(stream.view, start, count, features))
+            else:
+                with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(os.fspath(path), features)) as executor:
+                    for columns in executor.map(_decode_in_worker, starts, counts):
+                        for name, column in zip(LineTable.columns, columns):
+                            table.extend_column(name, column)
+            metadata_offset = index.metadata_offset
+
+        # Metadata
+        stream.seek(metadata_offset)
+        reader.get_metadata()
+    finally:
+        stream.release()
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+    if not columnar:
+        reader.track.lines = list(table)
+    return reader.track
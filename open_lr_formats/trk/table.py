@@ -0,0 +1,78 @@
+from typing import *
+
+from ..table import BaseLineTable
+from .line import *
+
+_EXTENSIONS = list(LineExtension)
+_SCENERY = LineType.Scenery.value
+_STANDARD = LineType.Standard.value
+
+class LineTable(BaseLineTable):
+    """
+    Columnar storage for TRK lines.
+    `flags` holds the line's flag byte as stored in the file and `width` is
+    the scenery width in tenths. Scenery lines have an id of -1.
+    """
+
+    columns = {
+        "id": "i",
+        "x1": "d",
+        "y1": "d",
+        "x2": "d",
+        "y2": "d",
+        "flags": "B",
+        "multiplier": "B",
+        "width": "B",
+        "trigger": "B",
+        "zoom_target": "f",
+        "zoom_frames": "h",
+    }
+
+    @staticmethod
+    def make_line(record: tuple) -> BaseLine:
+        id, x1, y1, x2, y2, flags, multiplier, width, trigger, zoom_target, zoom_frames = record
+        start = Vector2d(x1, y1)
+        end = Vector2d(x2, y2)
+        line_type = flags & 0x1f
+
+        if line_type == _SCENERY:
+            return SceneryLine(start, end, width=width / 10)
+        
+        extension = _EXTENSIONS[(flags >> 5) & 0x3]
+        inverted = (flags & 0x80) != 0
+        zoom_trigger = LineZoomTrigger(zoom_target, zoom_frames) if trigger else None
+
+        if line_type == _STANDARD:
+            return StandardLine(start, end, id, extension=extension, inverted=inverted, zoom_trigger=zoom_trigger)
+        
+        return AccelerationLine(start, end, id, extension=extension, inverted=inverted, multiplier=multiplier, zoom_trigger=zoom_trigger)
+
+    @staticmethod
+    def record_of(line: BaseLine) -> tuple:
+        id = -1
+        extension = LineExtension.Nothing
+        inverted = False
+        multiplier = 1
+        width = 10
+        zoom_trigger = None
+
+        if isinstance(line, StandardLine):
+            id = line.id
+            extension = line.extension
+            inverted = line.inverted
+            zoom_trigger = line.zoom_trigger
+        
+        if isinstance(line, AccelerationLine):
+            multiplier = line.multiplier
+        elif isinstance(line, SceneryLine):
+            width = int(line.width * 10)
+
+        flags = (inverted << 7) + (extension.value << 5) + line.type.value
+
+        if zoom_trigger is None:
+            return (id, line.start.x, line.start.y, line.end.x, line.end.y, flags, multiplier, width, False, 0.0, 0)
+        
+        return (
+            id, line.start.x, line.start.y, line.end.x, line.end.y, flags, multiplier, width,
+            True, zoom_trigger.target_zoom, zoom_trigger.frames
+        )
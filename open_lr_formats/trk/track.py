@@ -3,8 +3,11 @@ from dataclasses import dataclass
 import io
 from typing import *
 
-from ..binary import BinaryStream
+from ..binary import UINT8, BufferedWriteStream, CountingStream, ReadableBuffer, as_stream, get_struct
+from ..compression import compressor, decompressing
+from ..instrument import NO_STATS, Stats
 from .line import *
+from .table import LineTable
 
 class Features:
     red_multiplier = "REDMULTIPLIER"
@@ -24,7 +27,7 @@ class SongInfo:
 
 @dataclass
 class Track:
-    lines: List[BaseLine]
+    lines: Union[List[BaseLine], LineTable]
     features: Set[str]
     songinfo: Optional[SongInfo]
     metadata: Optional[Dict[str, str]]
@@ -32,24 +35,179 @@ class Track:
 
     def update_features(self):
         """Enable features used by this track."""
-        for line in self.lines:
-            if isinstance(line, AccelerationLine) and line.multiplier != 1:
-                self.features.add(Features.red_multiplier)
-            elif isinstance(line, SceneryLine) and line.width != 1:
-                self.features.add(Features.scenery_width)
+        if isinstance(self.lines, LineTable):
+            for flags, multiplier, width in zip(self.lines.flags, self.lines.multiplier, self.lines.width):
+                line_type = flags & 0x1f
+                if line_type == LineType.Acceleration.value and multiplier != 1:
+                    self.features.add(Features.red_multiplier)
+                elif line_type == LineType.Scenery.value and width != 10:
+                    self.features.add(Features.scenery_width)
+        else:
+            for line in self.lines:
+                if isinstance(line, AccelerationLine) and line.multiplier != 1:
+                    self.features.add(Features.red_multiplier)
+                elif isinstance(line, SceneryLine) and line.width != 1:
+                    self.features.add(Features.scenery_width)
         
         if self.songinfo is not None:
             self.features.add(Features.song_info)
 
 
+def missing_line_feature(record: tuple, features: Set[str]) -> Optional[str]:
+    """The feature a `LineTable` record needs that isn't in `features`, if any, without which some of its data is lost."""
+    id, x1, y1, x2, y2, flags, multiplier, width, trigger, zoom_target, zoom_frames = record
+    line_type = flags & 0x1f
+    if line_type == LineType.Scenery.value:
+        if width != 10 and Features.scenery_width not in features:
+            return Features.scenery_width
+        return None
+    
+    if trigger and Features.ignorable_trigger not in features:
+        return Features.ignorable_trigger
+    if line_type == LineType.Acceleration.value and multiplier != 1 and Features.red_multiplier not in features:
+        return Features.red_multiplier
+    return None
+
+
+# A line decoder takes the stream's `read_record` and returns the line
+# as a `LineTable` record, with the flag byte already read.
+LineDecoder = Callable[[Callable[[Any], tuple]], tuple]
+
+_line_decoders: Dict[Tuple[bool, bool, bool], List[LineDecoder]] = {}
+
+def _invalid_line_decoder(flags: int) -> LineDecoder:
+    def decode(read):
+        LineType(flags & 0x1f) # raises
+    return decode
+
+def _line_decoder(flags: int, red_multiplier: bool, ignorable_trigger: bool, scenery_width: bool) -> LineDecoder:
+    """Builds the decoder for lines with this flag byte, specialised to the features."""
+    line_type = LineType(flags & 0x1f)
+
+    if line_type == LineType.Scenery:
+        flags = line_type.value # inverted and extension only apply to physics lines
+        if scenery_width:
+            record = get_struct("<B4d")
+            def decode(read):
+                width, x1, y1, x2, y2 = read(record)
+                return (-1, x1, y1, x2, y2, flags, 1, width, False, 0.0, 0)
+        else:
+            record = get_struct("<4d")
+            def decode(read):
+                x1, y1, x2, y2 = read(record)
+                return (-1, x1, y1, x2, y2, flags, 1, 10, False, 0.0, 0)
+        return decode
+    
+    # id, two ignored ints when there is an extension, then the coordinates
+    tail = "i8x4d" if flags & 0x60 else "i4d"
+    prefix = "<B" if red_multiplier and line_type == LineType.Acceleration else "<"
+
+    if not ignorable_trigger:
+        record = get_struct(prefix + tail)
+        if prefix == "<B":
+            def decode(read):
+                multiplier, id, x1, y1, x2, y2 = read(record)
+                return (id, x1, y1, x2, y2, flags, multiplier, 10, False, 0.0, 0)
+        else:
+            def decode(read):
+                id, x1, y1, x2, y2 = read(record)
+                return (id, x1, y1, x2, y2, flags, 1, 10, False, 0.0, 0)
+        return decode
+    
+    head = get_struct(prefix + "?")
+    plain = get_struct("<" + tail)
+    zoom = get_struct("<fh" + tail)
+    if prefix == "<B":
+        def decode(read):
+            multiplier, trigger = read(head)
+            if trigger:
+                target, frames, id, x1, y1, x2, y2 = read(zoom)
+                return (id, x1, y1, x2, y2, flags, multiplier, 10, True, target, frames)
+            id, x1, y1, x2, y2 = read(plain)
+            return (id, x1, y1, x2, y2, flags, multiplier, 10, False, 0.0, 0)
+    else:
+        def decode(read):
+            if read(head)[0]:
+                target, frames, id, x1, y1, x2, y2 = read(zoom)
+                return (id, x1, y1, x2, y2, flags, 1, 10, True, target, frames)
+            id, x1, y1, x2, y2 = read(plain)
+            return (id, x1, y1, x2, y2, flags, 1, 10, False, 0.0, 0)
+    return decode
+
+def line_decoders(features: Set[str]) -> List[LineDecoder]:
+    """
+    Returns the line decoders for a feature set, indexed by flag byte.
+    Line layout only depends on the flag byte and three features, so they're
+    built once per combination and shared by every reader.
+    """
+    key = (Features.red_multiplier in features, Features.ignorable_trigger in features, Features.scenery_width in features)
+    decoders = _line_decoders.get(key)
+    if decoders is None:
+        decoders = []
+        for flags in range(256):
+            try:
+                decoders.append(_line_decoder(flags, *key))
+            except ValueError:
+                decoders.append(_invalid_line_decoder(flags))
+        _line_decoders[key] = decoders
+    
+    return decoders
+
+
+# (record size without a zoom trigger, offset of the trigger flag or 0) per flag byte
+LineLayout = Optional[Tuple[int, int]]
+
+_line_layouts: Dict[Tuple[bool, bool, bool], List[LineLayout]] = {}
+
+def line_layouts(features: Set[str]) -> List[LineLayout]:
+    """
+    Returns the size of every kind of line record for a feature set, indexed by flag byte
+    and including it, or None for invalid line types. A set trigger flag adds 6 bytes.
+    """
+    key = (Features.red_multiplier in features, Features.ignorable_trigger in features, Features.scenery_width in features)
+    layouts = _line_layouts.get(key)
+    if layouts is None:
+        red_multiplier, ignorable_trigger, scenery_width = key
+        layouts = []
+        for flags in range(256):
+            try:
+                line_type = LineType(flags & 0x1f)
+            except ValueError:
+                layouts.append(None)
+                continue
+
+            if line_type == LineType.Scenery:
+                layouts.append((1 + scenery_width + 32, 0))
+                continue
+            
+            # flags, multiplier, trigger flag, id, extension data, coordinates
+            multiplier = red_multiplier and line_type == LineType.Acceleration
+            size = 1 + multiplier + ignorable_trigger + 4 + (8 if flags & 0x60 else 0) + 32
+            layouts.append((size, 1 + multiplier if ignorable_trigger else 0))
+        _line_layouts[key] = layouts
+    
+    return layouts
+
+
 class TRK_Reader:
-    def __init__(self, buffer: io.BufferedReader) -> None:
-        self.stream = BinaryStream(buffer)
-        self.track = Track([], set(), None, None, Vector2d(0, 0))
+    def __init__(self, buffer: ReadableBuffer, columnar: bool = False, stats: Optional[Stats] = None) -> None:
+        """
+        `columnar` reads lines straight into a `LineTable` instead of a list.
+        `stats` collects timings of each section of the file, see `instrument.Stats`.
+        Compressed files are decompressed as they are read, see `compression`.
+        """
+        self.stats = NO_STATS if stats is None else stats
+        self.stream = as_stream(decompressing(buffer))
+        if self.stats.count_primitives:
+            self.stream = CountingStream(self.stream, self.stats)
+        self.track = Track(LineTable() if columnar else [], set(), None, None, Vector2d(0, 0))
+        self.line_count = 0
+        self.decoders = line_decoders(self.track.features)
+        self.layouts = line_layouts(self.track.features)
 
     
     def ReadString(self):
-        return self.stream.ReadBytes(self.stream.ReadInt16()).decode("ASCII")
+        return str(self.stream.ReadBytes(self.stream.ReadInt16()), "ASCII")
 
     def get_features(self):
         string = self.ReadString()
@@ -60,118 +218,147 @@ class TRK_Reader:
 
     def get_metadata(self):
         metadata = {}
-        if self.stream.base_stream.peek(1):
-            magic = self.stream.ReadBytes(4)
-            if magic != b"META":
-                raise Exception(f"Incorrect metadata magic number {magic!r}")
-            
-            entries = self.stream.ReadInt16()
-            for i in range(entries):
-                string = self.ReadString()
-                key, value = string.split("=", 1)
-                metadata[key] = value
-                # TODO: conversions of supported metadata value types
+        with self.stats.section("metadata", self.stream):
+            if self.stream.peek(1):
+                magic = self.stream.ReadBytes(4)
+                if magic != b"META":
+                    raise Exception(f"Incorrect metadata magic number {bytes(magic)!r}")
+                
+                entries = self.stream.ReadInt16()
+                for i in range(entries):
+                    string = self.ReadString()
+                    key, value = string.split("=", 1)
+                    metadata[key] = value
+                    # TODO: conversions of supported metadata value types
         
         self.track.metadata = metadata
 
-    def read(self) -> Track:
+    def read_header(self):
+        """Reads everything up to the line data, leaving the stream at the first line."""
         # Implemented based on https://github.com/Conqu3red/TRK-Docs/blob/master/The-TRK-Format.md
 
-        # Header
-        magic = self.stream.ReadBytes(4)
-        if magic != b"TRK\xf2":
-            raise Exception(f"Incorrect magic number {magic!r}")
-        version = self.stream.ReadUInt8()
-
-        # Features
-        self.get_features()
-
-        # SongInfo
-        if Features.song_info in self.track.features:
-            s = self.stream.ReadCSharpString()
-            name, offset = s.split("\r\n", 1)
-            self.track.songinfo = SongInfo(name, float(offset))
-        
-        # Line Data
-        
-        # Rider Position
-        self.track.riderPosition.x = self.stream.ReadDouble()
-        self.track.riderPosition.y = self.stream.ReadDouble()
-
-        # Lines
-        line_count = self.stream.ReadUInt32()
-        for i in range(line_count):
-            flags = self.stream.ReadUInt8()
-            """
-            Flag Bits:
-                Bit   87654321
-                Value IEETTTTT
-
-                I: Inverted
-                E: Extension
-                T: Line Type
-            """
-            inverted = (flags & 0x80) != 0
-            extension = LineExtension((flags >> 5) & 0x3)
-            line_type = LineType(flags & 0x1f)
-
-            multiplier = 1
-            width = 1.0
-            id = -1
-
-            zoom_trigger: Optional[LineZoomTrigger] = None
-
-            if Features.red_multiplier in self.track.features and line_type == LineType.Acceleration:
-                multiplier = self.stream.ReadUInt8()
-            
-            if line_type == LineType.Standard or line_type == LineType.Acceleration:
-                if Features.ignorable_trigger in self.track.features:
-                    has_zoom_trigger = self.stream.ReadBool()
-                    if has_zoom_trigger:
-                        target = self.stream.ReadSingle()
-                        frames = self.stream.ReadInt16()
-                        zoom_trigger = LineZoomTrigger(target, frames)
-
-                id = self.stream.ReadInt32()
-                
-                if extension != LineExtension.Nothing:
-                    self.stream.ReadInt32() # ignored
-                    self.stream.ReadInt32() # ignored
-            
-            if line_type == LineType.Scenery and Features.scenery_width in self.track.features:
-                width = self.stream.ReadUInt8() / 10
-            
-            x1 = self.stream.ReadDouble()
-            y1 = self.stream.ReadDouble()
-            x2 = self.stream.ReadDouble()
-            y2 = self.stream.ReadDouble()
-            start = Vector2d(x1, y1)
-            end = Vector2d(x2, y2)
-
-            if line_type == LineType.Scenery:
-                self.track.lines.append(
-                    SceneryLine(start, end, width=width)
-                )
+        with self.stats.section("header", self.stream):
+            # Header
+            magic = self.stream.ReadBytes(4)
+            if magic != b"TRK\xf2":
+                raise Exception(f"Incorrect magic number {bytes(magic)!r}")
+            version = self.stream.ReadUInt8()
+
+            # Features
+            self.get_features()
+
+            # SongInfo
+            if Features.song_info in self.track.features:
+                s = self.stream.ReadCSharpString()
+                name, offset = s.split("\r\n", 1)
+                self.track.songinfo = SongInfo(name, float(offset))
             
-            elif line_type == LineType.Standard:
-                self.track.lines.append(
-                    StandardLine(start, end, id, extension=extension, inverted=inverted, zoom_trigger=zoom_trigger)
-                )
+            # Line Data
             
-            elif line_type == LineType.Acceleration:
-                self.track.lines.append(
-                    AccelerationLine(start, end, id, extension=extension, inverted=inverted, multiplier=multiplier, zoom_trigger=zoom_trigger)
-                )
+            # Rider Position
+            self.track.riderPosition.x, self.track.riderPosition.y = self.stream.read_struct("<2d")
+
+            # Lines
+            self.line_count = self.stream.ReadUInt32()
+        self.decoders = line_decoders(self.track.features)
+        self.layouts = line_layouts(self.track.features)
+
+    def read_line_record(self) -> tuple:
+        """Reads a single line as a `LineTable` record."""
+        """
+        Flag Bits:
+            Bit   87654321
+            Value IEETTTTT
+
+            I: Inverted
+            E: Extension
+            T: Line Type
+        """
+        read = self.stream.read_record
+        return self.decoders[read(UINT8)[0]](read)
+
+    def skip_line(self):
+        """Skips over a single line, only reading the bytes that decide its size."""
+        flags = self.stream.ReadUInt8()
+        layout = self.layouts[flags]
+        if layout is None:
+            LineType(flags & 0x1f) # raises
+        
+        size, trigger = layout
+        if trigger:
+            self.stream.skip(trigger - 1)
+            if self.stream.ReadBool():
+                size += 6
+            self.stream.skip(size - trigger - 1)
+        else:
+            self.stream.skip(size - 1)
+
+    def iter_line_records(self) -> Iterator[tuple]:
+        """
+        Lazily reads the track, yielding each line as a `LineTable` record.
+        The header is read before the first record and the metadata after the last one.
+        """
+        self.read_header()
+        read = self.stream.read_record
+        decoders = self.decoders
+        with self.stats.section("lines", self.stream):
+            for i in range(self.line_count):
+                yield decoders[read(UINT8)[0]](read)
 
         # Metadata
         self.get_metadata()
 
+    def iter_lines(self) -> Iterator[BaseLine]:
+        """
+        Lazily reads the track, yielding lines one at a time as they are decoded.
+        `self.track` holds the header once the first line is yielded,
+        and the metadata once the iterator is exhausted.
+        """
+        return map(LineTable.make_line, self.iter_line_records())
+
+    def read_metadata_only(self) -> Track:
+        """Reads the header and metadata, skipping over all of the lines."""
+        self.read_header()
+        with self.stats.section("lines", self.stream):
+            for i in range(self.line_count):
+                self.skip_line()
+        
+        self.get_metadata()
+
+        return self.track
+
+    def read(self) -> Track:
+        if isinstance(self.track.lines, LineTable):
+            append = self.track.lines.append_record
+            for record in self.iter_line_records():
+                append(*record)
+        else:
+            self.track.lines.extend(self.iter_lines())
+
         return self.track
 
 
 class TRK_Writer:
-    def __init__(self, buffer: io.BufferedReader, track: Track) -> None:
-        self.stream = BinaryStream(buffer)
+    def __init__(
+        self,
+        buffer: io.BufferedReader,
+        track: Track,
+        chunk_size: int = 1 << 20,
+        stats: Optional[Stats] = None,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None,
+    ) -> None:
+        """
+        Output is encoded in memory and written to `buffer` in chunks of about `chunk_size` bytes.
+        `stats` collects timings of each section of the file, see `instrument.Stats`.
+        `compression` ("gzip", "bz2" or "lzma") compresses the output as it is written,
+        `buffer` is left open once the compressed stream is finished.
+        """
+        self.stats = NO_STATS if stats is None else stats
+        self.compressor = None if compression is None else compressor(buffer, compression, compression_level)
+        self.stream = BufferedWriteStream(buffer if self.compressor is None else self.compressor, chunk_size)
+        if self.stats.count_primitives:
+            self.stream = CountingStream(self.stream, self.stats)
         self.track = track
     
     def WriteString(self, string: str):
@@ -183,80 +370,131 @@ class TRK_Writer:
 
     def write_metadata(self):
         if self.track.metadata:
-            self.stream.WriteBytes(b"META")
-            self.stream.WriteInt16(len(self.track.metadata))
+            with self.stats.section("metadata", self.stream):
+                self.stream.WriteBytes(b"META")
+                self.stream.WriteInt16(len(self.track.metadata))
+                
+                for key, value in self.track.metadata.items():
+                    self.WriteString(f"{key}={value}")
+
+    def write_line_record(self, id, x1, y1, x2, y2, flags, multiplier, width, trigger, zoom_target, zoom_frames):
+        """Writes a single line, given as a `LineTable` record."""
+        features = self.track.features
+        """
+        Flag Bits:
+            Bit   87654321
+            Value IEETTTTT
+
+            I: Inverted
+            E: Extension
+            T: Line Type
+        """
+        line_type = flags & 0x1f
+        self.stream.WriteUInt8(flags)
+
+        if line_type == LineType.Acceleration.value and Features.red_multiplier in features:
+            self.stream.WriteUInt8(multiplier)
+        
+        if line_type != LineType.Scenery.value:
+            if Features.ignorable_trigger in features:
+                self.stream.WriteBool(trigger)
+                if trigger:
+                    self.stream.WriteSingle(zoom_target)
+                    self.stream.WriteInt16(zoom_frames)
             
-            for key, value in self.track.metadata.items():
-                self.WriteString(f"{key}={value}")
-
-    def write(self):
-        self.track.update_features() # TODO: should this be here?
+            self.stream.WriteInt32(id)
+            if flags & 0x60:
+                # Legacy data, no longer used.
+                self.stream.WriteInt32(-1)
+                self.stream.WriteInt32(-1)
+        
+        elif Features.scenery_width in features:
+            self.stream.WriteUInt8(width)
         
-        # Header
-        self.stream.WriteBytes(b"TRK\xf2")
-        self.stream.WriteUInt8(1)
+        self.stream.write_struct("<4d", x1, y1, x2, y2)
 
-        # Features
-        self.write_features()
+    def write_header(self):
+        with self.stats.section("header", self.stream):
+            # Header
+            self.stream.WriteBytes(b"TRK\xf2")
+            self.stream.WriteUInt8(1)
 
-        if Features.song_info in self.track.features and self.track.songinfo != None:
-            self.stream.WriteCSharpString(f"{self.track.songinfo.name}\r\n{self.track.songinfo.offset}")
-        
-        # Line Data
+            # Features
+            self.write_features()
 
-        # Rider Position
-        self.stream.WriteDouble(self.track.riderPosition.x)
-        self.stream.WriteDouble(self.track.riderPosition.y)
+            if Features.song_info in self.track.features and self.track.songinfo != None:
+                self.stream.WriteCSharpString(f"{self.track.songinfo.name}\r\n{self.track.songinfo.offset}")
+            
+            # Line Data
 
-        # Lines
-        self.stream.WriteInt32(len(self.track.lines))
+            # Rider Position
+            self.stream.write_struct("<2d", self.track.riderPosition.x, self.track.riderPosition.y)
 
-        for line in self.track.lines:
-            line_type = line.type
-            extension = LineExtension.Nothing
-            inverted = False
+    def write(self):
+        self.track.update_features() # TODO: should this be here?
+        
+        self.write_header()
 
-            if isinstance(line, StandardLine):
-                extension = line.extension
-                inverted = line.inverted
-            
-            """
-            Flag Bits:
-                Bit   87654321
-                Value IEETTTTT
+        # Lines
+        with self.stats.section("lines", self.stream):
+            self.stream.WriteInt32(len(self.track.lines))
 
-                I: Inverted
-                E: Extension
-                T: Line Type
-            """
+            if isinstance(self.track.lines, LineTable):
+                records = self.track.lines.rows()
+            else:
+                records = map(LineTable.record_of, self.track.lines)
 
-            flags = (inverted << 7) + (extension.value << 5) + line_type.value
-            self.stream.WriteUInt8(flags)
+            for record in records:
+                self.write_line_record(*record)
 
-            if isinstance(line, AccelerationLine) and Features.red_multiplier in self.track.features:
-                self.stream.WriteUInt8(line.multiplier)
-            
-            if isinstance(line, StandardLine):
-                if Features.ignorable_trigger in self.track.features:
-                    self.stream.WriteBool(line.zoom_trigger is not None)
-                    if line.zoom_trigger is not None:
-                        self.stream.WriteSingle(line.zoom_trigger.target_zoom)
-                        self.stream.WriteInt16(line.zoom_trigger.frames)
-                
-                self.stream.WriteInt32(line.id)
-                if line.extension != LineExtension.Nothing:
-                    # Legacy data, no longer used.
-                    self.stream.WriteInt32(-1)
-                    self.stream.WriteInt32(-1)
-                
-            if isinstance(line, SceneryLine) and Features.scenery_width in self.track.features:
-                self.stream.WriteUInt8(int(line.width * 10))
+        # Metadata
+        self.write_metadata()
+        self.finish()
+
+    def finish(self):
+        """Writes out everything still buffered, ending the compressed stream if there is one."""
+        self.stream.flush()
+        if self.compressor is not None:
+            self.compressor.close()
+
+    def write_stream(self, lines: Iterable[Union[BaseLine, tuple]], features: Optional[Iterable[str]] = None):
+        """
+        Writes the track with lines taken from `lines` instead of `self.track.lines`,
+        so they never need to be in memory all at once.
+        `lines` may hold line objects or `LineTable` records, e.g. from `TRK_Reader.iter_line_records`.
+
+        Line layout depends on the features, which have to be known before the first line.
+        Pass the `features` the lines need: a line needing another one raises instead of losing
+        its multiplier, width or zoom trigger. With `features=None` every optional line feature
+        (red multipliers, scenery widths and ignorable triggers) is enabled, which makes every
+        record that can hold them larger. The line count is patched in afterwards, so with a non-seekable output
+        nothing is written out until the last line.
+        """
+        if features is None:
+            features = {Features.red_multiplier, Features.scenery_width, Features.ignorable_trigger}
+        self.track.features = self.track.features | set(features)
+        if self.track.songinfo is not None:
+            self.track.features.add(Features.song_info)
+        
+        self.write_header()
+
+        # Lines
+        with self.stats.section("lines", self.stream):
+            count_pointer = self.stream.reserve("<i") # line count
+            count = 0
+            features = self.track.features
+            check = not {Features.red_multiplier, Features.scenery_width, Features.ignorable_trigger} <= features
+            for line in lines:
+                record = line if isinstance(line, tuple) else LineTable.record_of(line)
+                if check:
+                    missing = missing_line_feature(record, features)
+                    if missing is not None:
+                        raise Exception(f"Line {record[0]} needs the {missing} feature, which isn't enabled")
+                self.write_line_record(*record)
+                count += 1
             
-            self.stream.WriteDouble(line.start.x)
-            self.stream.WriteDouble(line.start.y)
-            self.stream.WriteDouble(line.end.x)
-            self.stream.WriteDouble(line.end.y)
-                
+            self.stream.patch(count_pointer, "<i", count)
 
         # Metadata
         self.write_metadata()
+        self.finish()
@@ -0,0 +1,123 @@
+"""
+Saving small edits to an existing TRK file without rewriting it.
+
+With a `TRKIndex` of the file, a line whose record keeps the same size can be overwritten
+in place, and new lines can be added by rewriting only the metadata after the line data.
+Anything else (removing lines, edits that change a record's size or need new features)
+needs the whole file written again, see `compact`.
+"""
+import io
+from typing import *
+
+from ..binary import ReadableBuffer, get_struct
+from .line import *
+from .parallel import TRKIndex
+from .table import LineTable
+from .track import Features, Track, TRK_Reader, TRK_Writer, missing_line_feature
+
+_RIDER_POSITION = "<2d"
+
+
+class TRK_Updater:
+    """
+    Patches a TRK file opened for reading and writing ("r+b").
+    The file is scanned for its line offsets unless an up to date `index` is given.
+    Methods that can't apply an edit in place return False without changing the file.
+    """
+
+    def __init__(self, buffer: io.BufferedRandom, index: Optional[TRKIndex] = None) -> None:
+        self.buffer = buffer
+        if index is None:
+            buffer.seek(0)
+            index = TRKIndex.build(buffer)
+        self.index = index
+        # only the features matter when encoding lines
+        self.track = Track([], index.features, None, None, Vector2d(0, 0))
+
+    @property
+    def line_count_offset(self) -> int:
+        return self.index.offsets[0] - 4
+
+    def encode(self, records: Iterable[tuple]) -> Tuple[bytes, List[int]]:
+        """Encodes line records with the file's features, returning the data and the size of each record."""
+        output = io.BytesIO()
+        writer = TRK_Writer(output, self.track)
+        sizes = []
+        for record in records:
+            start = writer.stream.tell()
+            writer.write_line_record(*record)
+            sizes.append(writer.stream.tell() - start)
+        writer.stream.flush()
+        return output.getvalue(), sizes
+
+    def can_encode(self, record: tuple) -> bool:
+        """Whether a record fits the file's features, lines needing others can't be patched in."""
+        return missing_line_feature(record, self.index.features) is None
+
+    def patch_lines(self, lines: Dict[int, Union[BaseLine, tuple]]) -> bool:
+        """
+        Overwrites lines by index, given as line objects or `LineTable` records.
+        Either every line is patched or, if any record would change size, none are.
+        """
+        indices = list(lines)
+        records = [line if isinstance(line, tuple) else LineTable.record_of(line) for line in lines.values()]
+        if not all(map(self.can_encode, records)):
+            return False
+
+        data, sizes = self.encode(records)
+        offsets = self.index.offsets
+        for n, size in zip(indices, sizes):
+            if not 0 <= n < len(self.index) or offsets[n + 1] - offsets[n] != size:
+                return False
+
+        position = 0
+        for n, size in zip(indices, sizes):
+            self.buffer.seek(offsets[n])
+            self.buffer.write(data[position:position + size])
+            position += size
+
+        self.buffer.flush()
+        return True
+
+    def patch_line(self, n: int, line: Union[BaseLine, tuple]) -> bool:
+        return self.patch_lines({n: line})
+
+    def append_lines(self, lines: Iterable[Union[BaseLine, tuple]]) -> bool:
+        """Adds lines after the existing ones, moving the metadata behind them."""
+        records = [line if isinstance(line, tuple) else LineTable.record_of(line) for line in lines]
+        if not all(map(self.can_encode, records)):
+            return False
+
+        data, sizes = self.encode(records)
+        end = self.index.metadata_offset
+        self.buffer.seek(end)
+        metadata = self.buffer.read()
+
+        self.buffer.seek(end)
+        self.buffer.write(data)
+        self.buffer.write(metadata)
+        self.buffer.seek(self.line_count_offset)
+        self.buffer.write(get_struct("<i").pack(len(self.index) + len(records)))
+        self.buffer.flush()
+
+        offsets = self.index.offsets
+        for size in sizes:
+            offsets.append(offsets[-1] + size)
+        if self.index.file_size is not None:
+            self.index.file_size += len(data)
+        return True
+
+    def set_rider_position(self, position: Vector2d):
+        self.buffer.seek(self.line_count_offset - get_struct(_RIDER_POSITION).size)
+        self.buffer.write(get_struct(_RIDER_POSITION).pack(position.x, position.y))
+        self.buffer.flush()
+
+
+def compact(source: ReadableBuffer, destination: io.BufferedWriter):
+    """
+    Rewrites a TRK file cleanly, dropping line features its lines don't need.
+    This is the fallback whenever `TRK_Updater` can't apply an edit.
+    """
+    track = TRK_Reader(source, columnar=True).read()
+    track.features -= {Features.red_multiplier, Features.scenery_width}
+    TRK_Writer(destination, track).write()
@@ -0,0 +1,510 @@
+"""
+Validating and sanitizing tracks, e.g. untrusted uploads.
+
+`validate` takes a TRK or LRPK file (contents or file object, compressed or not) or a loaded track.
+Compressed files are inflated in chunks and given up on, as a fatal bounds issue, once they
+grow past `max_size` bytes or `max_ratio` times their compressed size.
+Files are then checked structurally without decoding anything: declared counts and lump
+positions against the file size, then every line record's type, so that nothing is allocated
+or decoded based on a corrupt count and reading can't fail part way. Only then are they decoded
+(into `LineTable`s, available as `Report.track`) and their lines checked in bulk, vectorized with
+numpy when it is installed: line types and other enums in range, duplicate ids,
+non-finite coordinates and degenerate (zero length) lines.
+
+With `fix`, problems with lines are fixed in the track instead: lines that can't be used are
+dropped, duplicate ids are given new ones and out of range flags are reset.
+Structural problems can't be fixed, the file can't be read at all.
+"""
+from array import array
+from dataclasses import dataclass, field
+import itertools
+import math
+import mmap
+from typing import *
+
+from .binary import UINT32, BufferStream, ReadableBuffer, get_struct
+from .compression import decompressing
+from .convert import LRPK_TO_TRK_TYPE
+from .table import BaseLineTable
+from .trk import track as trk
+from .trk.table import LineTable as TRK_LineTable
+from .lrpk import records
+from .lrpk import track as lrpk
+
+np = records.np
+
+AnyTrack = Union[trk.Track, lrpk.Track]
+
+# Line indices kept in each `Issue`, the rest are only counted.
+MAX_INDICES = 100
+# Default limits on decompressed files, real tracks compress far less than this
+MAX_SIZE = 1 << 30
+MAX_RATIO = 100
+_CHUNK_SIZE = 1 << 20
+
+TRK_LINE_TYPES = tuple(line_type.value for line_type in trk.LineType)
+LRPK_LINE_TYPES = tuple(LRPK_TO_TRK_TYPE)
+
+_LRPK_HEADER = get_struct("<4s2I") # magic, lump count, directory pointer
+_LRPK_DIRECTORY_ENTRY = get_struct("<8sI") # lump type, position
+# Sizes of the fixed size lumps, and of the records of line lumps
+_LRPK_LUMP_SIZES = {"VERSINFO": 5, "RIDERDEF": 16}
+_LRPK_RECORD_SIZES = {"LINEDEF": get_struct(lrpk.LINEDEF_FORMAT).size, "LINEDECO": get_struct(lrpk.LINEDECO_FORMAT).size}
+
+
+class Check:
+    magic = "magic"
+    header = "header" # unreadable header, lump or metadata
+    bounds = "bounds" # declared counts or positions past the end of the file
+    line_type = "line_type"
+    enum = "enum" # other fields out of range
+    duplicate_id = "duplicate_id"
+    non_finite = "non_finite"
+    degenerate = "degenerate"
+
+
+@dataclass
+class Issue:
+    check: str
+    message: str
+    # line attribute of the track ("lines", "physics_lines" or "scenery_lines"), if about lines
+    attribute: Optional[str] = None
+    # the first `MAX_INDICES` offending lines, out of `count`
+    indices: List[int] = field(default_factory=list)
+    count: int = 0
+    # the file can't be read at all
+    fatal: bool = False
+    fixed: bool = False
+
+
+@dataclass
+class Report:
+    issues: List[Issue] = field(default_factory=list)
+    # the decoded track, None if a file couldn't be read
+    track: Optional[AnyTrack] = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether there is nothing wrong, or nothing left that wasn't fixed."""
+        return all(issue.fixed for issue in self.issues)
+
+    @property
+    def fatal(self) -> bool:
+        return any(issue.fatal for issue in self.issues)
+
+    def add(self, check: str, message: str, **details) -> Issue:
+        issue = Issue(check, message, **details)
+        self.issues.append(issue)
+        return issue
+
+    def raise_for_issues(self):
+        problems = [issue.message for issue in self.issues if not issue.fixed]
+        if problems:
+            raise Exception("Invalid track: " + "; ".join(problems))
+
+
+# Bulk checks over table columns, numpy arrays when numpy is installed and `array`s otherwise.
+
+def _columns(table: BaseLineTable) -> Dict[str, Sequence]:
+    if np is None:
+        return {name: getattr(table, name) for name in table.columns}
+    return {name: np.frombuffer(getattr(table, name), typecode) for name, typecode in table.columns.items()}
+
+
+def _find_non_finite(columns) -> Sequence[int]:
+    x1, y1, x2, y2 = columns["x1"], columns["y1"], columns["x2"], columns["y2"]
+    if np is None:
+        isfinite = math.isfinite
+        return [
+            i for i, (a, b, c, d) in enumerate(zip(x1, y1, x2, y2))
+            if not (isfinite(a) and isfinite(b) and isfinite(c) and isfinite(d))
+        ]
+
+    finite = np.isfinite(x1)
+    finite &= np.isfinite(y1)
+    finite &= np.isfinite(x2)
+    finite &= np.isfinite(y2)
+    return np.flatnonzero(~finite)
+
+
+def _find_degenerate(columns) -> Sequence[int]:
+    x1, y1, x2, y2 = columns["x1"], columns["y1"], columns["x2"], columns["y2"]
+    if np is None:
+        return [i for i, (a, b, c, d) in enumerate(zip(x1, y1, x2, y2)) if a == c and b == d]
+    return np.flatnonzero((x1 == x2) & (y1 == y2))
+
+
+def _find_outside(values, allowed: Sequence[int]) -> Sequence[int]:
+    if np is None:
+        allowed = set(allowed)
+        return [i for i, value in enumerate(values) if value not in allowed]
+    return np.flatnonzero(~np.isin(values, allowed))
+
+
+def _find_duplicates(ids, ignore: Optional[int] = None) -> Sequence[int]:
+    """Every repeat of an id after its first use, in order."""
+    if np is None:
+        seen = set()
+        duplicates = []
+        for i, id in enumerate(ids):
+            if id in seen:
+                duplicates.append(i)
+            elif id != ignore:
+                seen.add(id)
+        return duplicates
+
+    order = np.argsort(ids, kind="stable")
+    ordered = ids[order]
+    repeated = ordered[1:] == ordered[:-1]
+    if ignore is not None:
+        repeated &= ordered[1:] != ignore
+    return np.sort(order[1:][repeated])
+
+
+def _report_lines(report: Report, check: str, message: str, line_field: str, indices: Sequence[int]) -> Optional[Issue]:
+    if not len(indices):
+        return None
+    return report.add(
+        check, f"{len(indices)} {line_field} {message}",
+        attribute=line_field, indices=[int(i) for i in indices[:MAX_INDICES]], count=len(indices),
+    )
+
+
+def _take(table: BaseLineTable, columns, keep: Sequence[bool], changes: Dict[str, Sequence]) -> BaseLineTable:
+    """A new table of the rows where the `keep` mask is set, with whole columns replaced by `changes`."""
+    result = type(table)()
+    for name, typecode in table.columns.items():
+        column = changes.get(name, columns[name])
+        if np is None:
+            getattr(result, name).extend(itertools.compress(column, keep))
+        else:
+            result.extend_column(name, np.ascontiguousarray(column[keep], typecode))
+    return result
+
+
+def _check_lines(
+    report: Report,
+    track: AnyTrack,
+    line_field: str,
+    table_type: Type[BaseLineTable],
+    enums: Dict[str, Tuple[Sequence[int], bool]],
+    ignore_id: Optional[int],
+    fix: bool,
+):
+    """
+    Checks one line attribute of a track. `enums` maps columns to their valid values and
+    whether out of range values are fixed by dropping the line or by resetting them to the first value.
+    """
+    lines = getattr(track, line_field)
+    table = lines if isinstance(lines, table_type) else table_type.from_lines(lines)
+    columns = _columns(table)
+    found: List[Tuple[Optional[Issue], Sequence[int], str]] = []
+
+    for name, (allowed, drop) in enums.items():
+        values = columns[name]
+        if name == "flags":
+            values = values & 0x1f if np is not None else [flags & 0x1f for flags in values]
+            message = "have an invalid line type"
+            check = Check.line_type
+        else:
+            message = f"have an out of range {name}"
+            check = Check.line_type if name == "type" else Check.enum
+        indices = _find_outside(values, allowed)
+        found.append((_report_lines(report, check, message, line_field, indices), indices, "drop" if drop else name))
+
+    indices = _find_non_finite(columns)
+    found.append((_report_lines(report, Check.non_finite, "have non-finite coordinates", line_field, indices), indices, "drop"))
+    indices = _find_degenerate(columns)
+    found.append((_report_lines(report, Check.degenerate, "have zero length", line_field, indices), indices, "drop"))
+
+    if not fix:
+        duplicates = _find_duplicates(columns["id"], ignore_id)
+        _report_lines(report, Check.duplicate_id, "reuse the id of an earlier line", line_field, duplicates)
+        return
+
+    # Fixing: drop what can't be used and reset flags, then renumber duplicates among what is left
+    changed = False
+    if any(issue for issue, indices, action in found):
+        dropped = []
+        changes = {}
+        for issue, indices, action in found:
+            if issue is None:
+                continue
+            issue.fixed = True
+            if action == "drop":
+                dropped.append(indices)
+            else:
+                column = changes.setdefault(action, array(table.columns[action], columns[action]) if np is None else columns[action].copy())
+                for i in indices:
+                    column[i] = enums[action][0][0]
+
+        if np is None:
+            keep = bytearray(b"\x01") * len(table)
+            for indices in dropped:
+                for i in indices:
+                    keep[i] = 0
+        else:
+            keep = np.ones(len(table), bool)
+            for indices in dropped:
+                keep[indices] = False
+        table = _take(table, columns, keep, changes)
+        columns = _columns(table)
+        changed = True
+
+    duplicates = _find_duplicates(columns["id"], ignore_id)
+    issue = _report_lines(report, Check.duplicate_id, "reuse the id of an earlier line", line_field, duplicates)
+    if issue is not None:
+        ids = columns["id"] # a writable view of the table's column with numpy
+        if np is None:
+            next_id = max(ids) + 1
+            for i in duplicates:
+                ids[i] = next_id
+                next_id += 1
+        else:
+            next_id = int(ids.max()) + 1
+            ids[duplicates] = np.arange(next_id, next_id + len(duplicates))
+        issue.fixed = True
+        changed = True
+
+    if changed:
+        setattr(track, line_field, table if isinstance(lines, table_type) else list(table))
+
+
+def _check_position(report: Report, position, name: str, fix: bool):
+    if math.isfinite(position.x) and math.isfinite(position.y):
+        return
+    issue = report.add(Check.non_finite, f"{name} has a non-finite position")
+    if fix:
+        position.x = position.y = 0.0
+        issue.fixed = True
+
+
+def validate_track(track: AnyTrack, fix: bool = False) -> Report:
+    """Checks the lines (and rider positions) of a loaded track, fixing them in the track if `fix` is set."""
+    report = Report(track=track)
+    if isinstance(track, trk.Track):
+        enums = {"flags": (TRK_LINE_TYPES, True)}
+        _check_lines(report, track, "lines", TRK_LineTable, enums, -1, fix)
+        _check_position(report, track.riderPosition, "The rider", fix)
+        return report
+
+    enums = {"type": (LRPK_LINE_TYPES, True), "flipped": ((0, 1), False), "extension": (tuple(extension.value for extension in lrpk.LineExtension), False)}
+    _check_lines(report, track, "physics_lines", lrpk.LineTable, enums, None, fix)
+    _check_lines(report, track, "scenery_lines", lrpk.SceneryLineTable, {}, None, fix)
+    for i, rider in enumerate(track.riders):
+        _check_position(report, rider.position, f"Rider {i}", fix)
+    return report
+
+
+def check_trk_structure(data: ReadableBuffer, report: Report) -> bool:
+    """
+    Checks that a TRK file can be read: its header, that the declared line count fits in the file,
+    every line record's type and size, and the metadata. Returns whether it can be read.
+    """
+    stream = BufferStream(data)
+    try:
+        reader = trk.TRK_Reader(stream)
+        try:
+            reader.read_header()
+        except Exception as e:
+            report.add(Check.header, f"Unreadable header: {e}", fatal=True)
+            return False
+
+        view = stream.view
+        start = stream.tell()
+        count = reader.line_count
+        layouts = trk.line_layouts(reader.track.features)
+        smallest = min(size for size, trigger in filter(None, layouts))
+        if count * smallest > len(view) - start:
+            report.add(Check.bounds, f"{count} lines declared, the file only has room for {(len(view) - start) // smallest}", fatal=True)
+            return False
+
+        # Only the bytes deciding each record's size are looked at
+        offset = start
+        end = len(view)
+        truncated = f"Line data runs past the end of the file ({count} lines declared)"
+        for i in range(count):
+            if offset >= end:
+                report.add(Check.bounds, truncated, fatal=True)
+                return False
+            flags = view[offset]
+            layout = layouts[flags]
+            if layout is None:
+                report.add(
+                    Check.line_type, f"Line {i} at offset {offset} has invalid type {flags & 0x1f}",
+                    attribute="lines", indices=[i], count=1, fatal=True,
+                )
+                return False
+
+            size, trigger = layout
+            if trigger and offset + trigger < end and view[offset + trigger]:
+                size += 6
+            offset += size
+
+        if offset > end:
+            report.add(Check.bounds, truncated, fatal=True)
+            return False
+
+        stream.seek(offset)
+        try:
+            reader.get_metadata()
+        except Exception as e:
+            report.add(Check.header, f"Unreadable metadata: {e}", fatal=True)
+            return False
+        return True
+    finally:
+        stream.release()
+
+
+def _check_lrpk_lump(view, lump_type: str, position: int) -> Optional[str]:
+    """Returns what is wrong with a lump, if anything."""
+    if lump_type in _LRPK_LUMP_SIZES:
+        end = position + _LRPK_LUMP_SIZES[lump_type]
+
+    elif lump_type in _LRPK_RECORD_SIZES:
+        if position + 4 > len(view):
+            return f"{lump_type} lump at {position} is past the end of the file"
+        count = UINT32.unpack_from(view, position)[0]
+        end = position + 4 + count * _LRPK_RECORD_SIZES[lump_type]
+        if end > len(view):
+            return f"{lump_type} lump at {position} declares {count} lines, past the end of the file"
+
+    elif lump_type == "TRACKDEF":
+        end = position
+        for name in ("name", "author"):
+            if end >= len(view):
+                break
+            length = view[end]
+            try:
+                str(view[end + 1:end + 1 + length], "utf8")
+            except UnicodeDecodeError:
+                return f"TRACKDEF {name} is not valid UTF-8"
+            end += 1 + length
+        end += 1 # grid model
+
+    else:
+        return f"Unsupported lump {lump_type!r}"
+
+    if end > len(view):
+        return f"{lump_type} lump at {position} runs past the end of the file"
+    return None
+
+
+def check_lrpk_structure(data: ReadableBuffer, report: Report) -> bool:
+    """
+    Checks that an LRPK file can be read: its header, that the directory and every lump
+    (including the declared line counts) fit in the file, and the lump types. Returns whether it can be read.
+    """
+    with memoryview(data) as view:
+        if len(view) < _LRPK_HEADER.size or bytes(view[:4]) != b"LRPK":
+            report.add(Check.magic, f"Incorrect magic number {bytes(view[:4])!r}", fatal=True)
+            return False
+
+        magic, lump_count, pointer = _LRPK_HEADER.unpack_from(view)
+        if pointer + lump_count * _LRPK_DIRECTORY_ENTRY.size > len(view):
+            report.add(Check.bounds, f"Directory of {lump_count} lumps at {pointer} is past the end of the file", fatal=True)
+            return False
+
+        for i in range(lump_count):
+            name, position = _LRPK_DIRECTORY_ENTRY.unpack_from(view, pointer + i * _LRPK_DIRECTORY_ENTRY.size)
+            try:
+                lump_type = str(name, "utf8").strip()
+            except UnicodeDecodeError:
+                report.add(Check.header, f"Lump {i} has an unreadable type {name!r}", fatal=True)
+                return False
+
+            if i == 0 and lump_type != "VERSINFO":
+                report.add(Check.header, "Expected Version info as first lump", fatal=True)
+                return False
+            problem = _check_lrpk_lump(view, lump_type, position)
+            if problem is not None:
+                report.add(Check.header if problem.startswith(("Unsupported", "TRACKDEF")) else Check.bounds, problem, fatal=True)
+                return False
+        return True
+
+
+def _input_size(source) -> Optional[int]:
+    """The number of bytes left in `source`, if that can be told without reading it."""
+    if not hasattr(source, "read") or isinstance(source, mmap.mmap):
+        with memoryview(source) as view:
+            return view.nbytes
+    try:
+        position = source.tell()
+        source.seek(0, 2)
+        size = source.tell() - position
+        source.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _decompress(source, report: Report, max_size: int, max_ratio: float) -> Optional[ReadableBuffer]:
+    """
+    `source` itself if it isn't compressed, otherwise its decompressed contents,
+    or None (with a fatal issue) if they would be larger than allowed.
+    """
+    compressed_size = _input_size(source)
+    stream = decompressing(source)
+    if stream is source:
+        return source
+
+    limit = max_size
+    if compressed_size is not None:
+        limit = int(min(limit, compressed_size * max_ratio))
+
+    chunks = []
+    size = 0
+    with stream:
+        while True:
+            chunk = stream.read(min(_CHUNK_SIZE, limit + 1 - size))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > limit:
+                report.add(
+                    Check.bounds,
+                    f"Decompressed file is larger than {limit} bytes"
+                    f" ({compressed_size} bytes compressed), not reading any further",
+                    fatal=True,
+                )
+                return None
+    return b"".join(chunks)
+
+
+def validate(
+    source: Union[ReadableBuffer, AnyTrack],
+    fix: bool = False,
+    max_size: int = MAX_SIZE,
+    max_ratio: float = MAX_RATIO,
+) -> Report:
+    """
+    Validates a track file or loaded track, see the module docstring.
+    Files are decoded into `Report.track` unless they have fatal problems.
+    With `fix` the track's lines are fixed in place (a loaded track is modified).
+    `max_size` and `max_ratio` limit how far a compressed file is inflated.
+    """
+    if isinstance(source, (trk.Track, lrpk.Track)):
+        return validate_track(source, fix)
+
+    report = Report()
+    data = _decompress(source, report, max_size, max_ratio)
+    if data is None:
+        return report
+    if not isinstance(data, (bytes, bytearray, memoryview)) and hasattr(data, "read"):
+        data = data.read()
+
+    with memoryview(data) as view:
+        magic = bytes(view[:4])
+    if magic == b"LRPK":
+        if check_lrpk_structure(data, report):
+            report.track = lrpk.LRPK_Reader(data, columnar=True).read()
+    elif magic == b"TRK\xf2":
+        if check_trk_structure(data, report):
+            report.track = trk.TRK_Reader(data, columnar=True).read()
+    else:
+        report.add(Check.magic, f"Unrecognised track file (magic number {magic!r})", fatal=True)
+
+    if report.track is not None:
+        report.issues += validate_track(report.track, fix).issues
+    return report
@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+from open_lr_formats.trk.track import TRK_Writer
+from open_lr_formats.lrpk.track import LRPK_Writer
+
+from benchmarks.synthetic import FULL_MIX, trk_track, lrpk_track
+
+
+def trk_bytes(track) -> bytes:
+    output = io.BytesIO()
+    TRK_Writer(output, track).write()
+    return output.getvalue()
+
+def lrpk_bytes(track) -> bytes:
+    output = io.BytesIO()
+    LRPK_Writer(output, track).write()
+    return output.getvalue()
+
+
+@pytest.fixture
+def trk_data() -> bytes:
+    """A small TRK file using every optional feature."""
+    return trk_bytes(trk_track(500, 1, FULL_MIX))
+
+@pytest.fixture
+def lrpk_data() -> bytes:
+    return lrpk_bytes(lrpk_track(500, 1, FULL_MIX))
+
+@pytest.fixture
+def trk_file(tmp_path, trk_data):
+    path = tmp_path / "track.trk"
+    path.write_bytes(trk_data)
+    return path
+
+@pytest.fixture
+def lrpk_file(tmp_path, lrpk_data):
+    path = tmp_path / "track.lrpk"
+    path.write_bytes(lrpk_data)
+    return path
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from open_lr_formats import aio
+from open_lr_formats.trk.track import TRK_Reader
+from open_lr_formats.lrpk.track import LRPK_Reader
+
+
+async def pieces(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+async def joined(chunks) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
+
+def read_lrpk(data: bytes):
+    reader = LRPK_Reader(data)
+    reader.read_header()
+    reader.read_directories()
+    return reader.track
+
+
+@pytest.mark.parametrize("piece_size", [1, 7, 1000, 1 << 20])
+@pytest.mark.parametrize("chunk_size", [1, 100, 1 << 20])
+def test_read_trk_chunks(trk_data, piece_size, chunk_size):
+    expected = TRK_Reader(trk_data).read()
+    track = asyncio.run(aio.read_trk(pieces(trk_data, piece_size), chunk_size=chunk_size))
+    assert track.lines == expected.lines
+    assert track.features == expected.features
+    assert track.songinfo == expected.songinfo
+    assert track.metadata == expected.metadata
+
+
+def test_read_trk_stream_reader(trk_data):
+    async def read():
+        stream = asyncio.StreamReader()
+        stream.feed_data(trk_data)
+        stream.feed_eof()
+        return await aio.read_trk(stream, columnar=True, chunk_size=333)
+
+    assert list(asyncio.run(read()).lines) == TRK_Reader(trk_data).read().lines
+
+
+def test_read_trk_truncated(trk_data):
+    with pytest.raises(Exception, match="middle of the header"):
+        asyncio.run(aio.read_trk(pieces(trk_data[:6], 1)))
+    with pytest.raises(Exception, match="past the end of the file"):
+        asyncio.run(aio.read_trk(pieces(trk_data[:len(trk_data) // 2], 64), chunk_size=100))
+
+
+@pytest.mark.parametrize("chunk_lines", [1, 37, 65536])
+def test_read_lrpk_chunks(lrpk_data, chunk_lines):
+    track = asyncio.run(aio.read_lrpk(pieces(lrpk_data, 7), chunk_lines=chunk_lines))
+    assert track == read_lrpk(lrpk_data)
+
+
+def test_read_track_detects_format(trk_data, lrpk_data):
+    track = asyncio.run(aio.read_track(pieces(trk_data, 3)))
+    assert track.lines == TRK_Reader(trk_data).read().lines
+    assert asyncio.run(aio.read_track(pieces(lrpk_data, 3))) == read_lrpk(lrpk_data)
+
+
+@pytest.mark.parametrize("chunk_lines", [1, 100])
+def test_writers_match(trk_data, lrpk_data, chunk_lines):
+    track = TRK_Reader(trk_data).read()
+    written = TRK_Reader(asyncio.run(joined(aio.iter_trk(track, chunk_lines)))).read()
+    assert written.lines == track.lines
+    assert written.features == track.features
+    assert written.metadata == track.metadata
+
+    track = read_lrpk(lrpk_data)
+    assert asyncio.run(joined(aio.iter_lrpk(track, chunk_lines))) == lrpk_data
@@ -0,0 +1,34 @@
+import io
+
+from open_lr_formats import batch
+from open_lr_formats.trk.track import Features, TRK_Reader, TRK_Writer
+
+from benchmarks.synthetic import trk_track
+
+
+def test_normalize_drops_unused_features(tmp_path):
+    track = trk_track(200, 1)
+    output = io.BytesIO()
+    TRK_Writer(output, track).write_stream(track.lines) # every optional line feature enabled
+    source = tmp_path / "in" / "track.trk"
+    source.parent.mkdir()
+    source.write_bytes(output.getvalue())
+
+    jobs = batch.plan_jobs([str(source)], str(tmp_path / "out"), "normalize")
+    results = list(batch.run_batch(jobs, workers=1))
+    assert all(result.ok for result in results), [result.error for result in results]
+
+    destination = tmp_path / "out" / "track.trk"
+    assert destination.stat().st_size < source.stat().st_size
+    before = TRK_Reader(source.read_bytes()).read()
+    after = TRK_Reader(destination.read_bytes()).read()
+    assert after.lines == before.lines
+    assert not {Features.red_multiplier, Features.scenery_width, Features.ignorable_trigger} & after.features
+
+
+def test_normalize_keeps_needed_features(trk_data):
+    track = batch.normalize(TRK_Reader(trk_data, columnar=True).read())
+    output = io.BytesIO()
+    TRK_Writer(output, track).write()
+    assert TRK_Reader(output.getvalue()).read().lines == TRK_Reader(trk_data).read().lines
+    assert Features.ignorable_trigger in track.features
@@ -0,0 +1,142 @@
+import io
+
+import pytest
+
+from open_lr_formats.binary import BinaryStream, BufferStream, BufferedWriteStream, CountingStream
+from open_lr_formats.instrument import Stats
+
+
+class Pipe(io.RawIOBase):
+    """A non-seekable sink."""
+    def __init__(self) -> None:
+        self.data = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.data += data
+        return len(data)
+
+
+def write_values(stream: BinaryStream):
+    stream.WriteBytes(b"HEAD")
+    count = stream.reserve("<i")
+    total = stream.reserve("<Qd")
+    for i in range(1000):
+        stream.WriteUInt8(i % 256)
+        stream.WriteInt16(-i)
+        stream.WriteUInt32(i * 1000)
+        stream.WriteDouble(i / 7)
+        stream.WriteSingle(1.5)
+        stream.WriteBool(i % 2 == 0)
+    stream.WriteStringSingleByteLength("end")
+    stream.WriteCSharpString("C# string")
+    stream.patch(count, "<i", 1000)
+    stream.patch(total, "<Qd", 2 ** 40, -0.5)
+    stream.flush()
+
+def read_values(stream: BinaryStream):
+    assert bytes(stream.ReadBytes(4)) == b"HEAD"
+    assert stream.ReadInt32() == 1000
+    assert stream.read_struct("<Qd") == (2 ** 40, -0.5)
+    for i in range(1000):
+        assert stream.ReadUInt8() == i % 256
+        assert stream.ReadInt16() == -i
+        assert stream.ReadUInt32() == i * 1000
+        assert stream.ReadDouble() == i / 7
+        assert stream.ReadSingle() == 1.5
+        assert stream.ReadBool() == (i % 2 == 0)
+    assert stream.ReadStringSingleByteLength() == "end"
+    assert stream.ReadCSharpString() == "C# string"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100, 1 << 20])
+def test_write_stream_roundtrip(chunk_size):
+    reference = io.BytesIO()
+    write_values(BinaryStream(reference))
+
+    seekable = io.BytesIO()
+    write_values(BufferedWriteStream(seekable, chunk_size))
+    pipe = Pipe()
+    write_values(BufferedWriteStream(pipe, chunk_size))
+
+    assert seekable.getvalue() == bytes(pipe.data) == reference.getvalue()
+    read_values(BufferStream(seekable.getvalue()))
+    read_values(BinaryStream(io.BytesIO(bytes(pipe.data))))
+
+
+def test_write_stream_starts_part_way():
+    output = io.BytesIO(b"prefix")
+    output.seek(0, io.SEEK_END)
+    stream = BufferedWriteStream(output, 4)
+    position = stream.reserve("<I")
+    assert position == 6
+    stream.WriteBytes(b"abcdefgh")
+    stream.patch(position, "<I", 7)
+    stream.flush()
+    assert output.getvalue() == b"prefix\x07\x00\x00\x00abcdefgh"
+
+
+def test_pending_placeholder_holds_back_pipe_output():
+    pipe = Pipe()
+    stream = BufferedWriteStream(pipe, 8)
+    stream.WriteBytes(b"1234")
+    position = stream.reserve("<I")
+    stream.WriteBytes(bytes(100))
+    assert bytes(pipe.data) == b"1234" # nothing after the placeholder yet
+    stream.patch(position, "<I", 1)
+    stream.WriteBytes(b"x" * 8)
+    assert len(pipe.data) > 4
+    stream.flush()
+    assert bytes(pipe.data) == b"1234\x01\x00\x00\x00" + bytes(100) + b"x" * 8
+
+
+def test_buffer_stream_peek_skip_and_end():
+    stream = BufferStream(b"0123456789")
+    assert bytes(stream.peek(3)) == b"012"
+    assert stream.tell() == 0
+    stream.skip(4)
+    assert bytes(stream.ReadBytes(2)) == b"45"
+    assert bytes(stream.peek(10)) == b"6789"
+
+    assert bytes(stream.ReadBytes(4)) == b"6789" # exactly at the end
+    assert stream.tell() == 10
+    assert bytes(stream.ReadBytes(5)) == b""
+    assert bytes(stream.peek()) == b""
+
+    stream.seek(8)
+    assert bytes(stream.ReadBytes(5)) == b"89" # past the end
+    assert stream.tell() == 10
+    with pytest.raises(Exception):
+        stream.ReadInt32()
+
+    stream.seek(2)
+    with pytest.raises(ValueError):
+        stream.ReadBytes(-1)
+    assert stream.tell() == 2
+    with pytest.raises(ValueError):
+        stream.seek(-1)
+
+
+def test_buffer_stream_is_read_only():
+    stream = BufferStream(bytearray(4))
+    with pytest.raises(io.UnsupportedOperation):
+        stream.WriteBytes(b"x")
+    with pytest.raises(io.UnsupportedOperation):
+        BufferedWriteStream(io.BytesIO()).ReadBytes(1)
+
+
+def test_counting_stream():
+    stats = Stats(count_primitives=True)
+    output = io.BytesIO()
+    write_values(CountingStream(BufferedWriteStream(output), stats))
+    written = {name: (counter.calls, counter.bytes) for name, counter in stats.primitives.items()}
+    assert written["<d"] == (1000, 8000)
+    assert written["<B"][0] >= 1000
+
+    stats = Stats(count_primitives=True)
+    stream = CountingStream(BufferStream(output.getvalue()), stats)
+    read_values(stream)
+    assert stats.primitives["<d"].calls == 1000
+    assert sum(counter.bytes for counter in stats.primitives.values()) == len(output.getvalue())
@@ -0,0 +1,55 @@
+import gzip
+import os
+
+import pytest
+
+from open_lr_formats.cache import TrackCache
+from open_lr_formats.trk import track as trk
+from open_lr_formats.lrpk import track as lrpk
+
+
+def entry_path(cache: TrackCache, data: bytes) -> str:
+    return cache.path(cache.key(data))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_hit_and_miss(tmp_path, trk_data, lrpk_data, compress):
+    cache = TrackCache(str(tmp_path / "cache"))
+    for data, reader in ((trk_data, trk.TRK_Reader), (lrpk_data, lrpk.LRPK_Reader)):
+        source = gzip.compress(data) if compress else data
+        first = cache.read(source)
+        assert os.path.exists(entry_path(cache, source))
+        second = cache.read(source)
+        assert second == first == reader(data, columnar=True).read()
+
+
+@pytest.mark.parametrize("cut", [0, 5, 101, -3, -8])
+def test_truncated_entry(tmp_path, trk_data, cut):
+    cache = TrackCache(str(tmp_path))
+    expected = cache.read(trk_data)
+    path = entry_path(cache, trk_data)
+    with open(path, "r+b") as f:
+        f.truncate(cut if cut >= 0 else os.path.getsize(path) + cut)
+
+    assert cache.get(cache.key(trk_data)) is None
+    assert not os.path.exists(path) # dropped, then decoded and stored again by `read`
+    assert cache.read(trk_data) == expected
+    assert cache.get(cache.key(trk_data)) == expected
+
+
+def test_corrupt_entry(tmp_path, lrpk_data):
+    cache = TrackCache(str(tmp_path))
+    expected = cache.read(lrpk_data)
+    path = entry_path(cache, lrpk_data)
+    for corrupt in (b"XXXX", b"LRTC\xff\xff\x00\x00", b"LRTC\x05\x00\x00\x00{oops"):
+        with open(path, "r+b") as f:
+            f.write(corrupt)
+        assert cache.read(lrpk_data) == expected
+        assert cache.get(cache.key(lrpk_data)) == expected
+
+
+def test_eviction(tmp_path, trk_data, lrpk_data):
+    cache = TrackCache(str(tmp_path), max_bytes=1)
+    cache.read(trk_data)
+    cache.read(lrpk_data)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".lrtc")]
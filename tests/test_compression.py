@@ -0,0 +1,72 @@
+import bz2
+import gzip
+import io
+import lzma
+
+import pytest
+
+from open_lr_formats.compression import (
+    CODECS, codec_for_path, compressor, decompressed, decompressing, detect_codec, open_compressed
+)
+from open_lr_formats.trk.track import TRK_Reader, TRK_Writer
+from open_lr_formats.lrpk.track import LRPK_Reader, LRPK_Writer
+
+COMPRESS = {"gzip": gzip.compress, "bz2": bz2.compress, "lzma": lzma.compress}
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_detect_codec(trk_data, codec):
+    compressed = COMPRESS[codec](trk_data)
+    assert detect_codec(compressed[:6]) == codec
+    assert detect_codec(trk_data[:6]) is None
+    assert detect_codec(b"") is None
+
+    assert decompressed(compressed) == trk_data
+    for source in (compressed, io.BytesIO(compressed), io.BufferedReader(io.BytesIO(compressed))):
+        assert decompressing(source).read() == trk_data
+
+    # uncompressed input is passed through as it is
+    assert decompressed(trk_data) is trk_data
+    plain = io.BytesIO(trk_data)
+    assert decompressing(plain) is plain
+    assert plain.tell() == 0
+
+
+def test_codec_for_path():
+    assert codec_for_path("track.trk.gz") == "gzip"
+    assert codec_for_path("track.lrpk.BZ2") == "bz2"
+    assert codec_for_path("track.trk.xz") == "lzma"
+    assert codec_for_path("track.trk") is None
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_compressed_trk(trk_data, codec):
+    track = TRK_Reader(trk_data).read()
+    output = io.BytesIO()
+    TRK_Writer(output, track, compression=codec).write()
+    assert detect_codec(output.getvalue()) == codec
+
+    assert TRK_Reader(COMPRESS[codec](trk_data)).read().lines == track.lines
+    assert TRK_Reader(output.getvalue()).read().lines == track.lines
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_compressed_lrpk(lrpk_data, codec):
+    def read(data):
+        reader = LRPK_Reader(data)
+        reader.read_header()
+        reader.read_directories()
+        return reader.track
+
+    track = read(lrpk_data)
+    output = io.BytesIO()
+    LRPK_Writer(output, track, compression=codec).write()
+    assert decompressed(output.getvalue()) == lrpk_data
+    assert read(io.BytesIO(COMPRESS[codec](lrpk_data))) == track
+
+
+def test_unsupported_codec():
+    with pytest.raises(Exception, match="Unsupported compression"):
+        compressor(io.BytesIO(), "zstd")
+    with pytest.raises(Exception, match="Unsupported compression"):
+        open_compressed(io.BytesIO(), "zstd")
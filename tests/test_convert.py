@@ -0,0 +1,69 @@
+import io
+import struct
+
+import pytest
+
+from open_lr_formats import convert
+from open_lr_formats.trk import track as trk
+from open_lr_formats.lrpk import track as lrpk
+
+from benchmarks.synthetic import FULL_MIX, Mix, trk_track, lrpk_track
+
+from .conftest import lrpk_bytes, trk_bytes
+
+
+def read_lrpk(data) -> lrpk.Track:
+    reader = lrpk.LRPK_Reader(data)
+    reader.read_header()
+    reader.read_directories()
+    return reader.track
+
+def narrowed(line: trk.BaseLine) -> trk.BaseLine:
+    """A TRK line as it comes back from LRPK, where scenery coordinates are 32 bit floats."""
+    if not isinstance(line, trk.SceneryLine):
+        return line
+    x1, y1, x2, y2 = struct.unpack("<4f", struct.pack("<4f", line.start.x, line.start.y, line.end.x, line.end.y))
+    return trk.SceneryLine(trk.Vector2d(x1, y1), trk.Vector2d(x2, y2))
+
+
+def test_trk_to_lrpk_and_back():
+    # TRK only features (red multipliers, scenery widths, zoom triggers) don't survive the trip
+    source = trk_track(2000, 1, Mix())
+    lrpk_output = io.BytesIO()
+    convert.trk_to_lrpk(trk_bytes(source), lrpk_output, name="name", author="author")
+    converted = read_lrpk(lrpk_output.getvalue())
+    assert (converted.name, converted.author) == ("name", "author")
+    assert converted == read_lrpk(lrpk_bytes(convert.trk_track_to_lrpk(source, "name", "author")))
+
+    trk_output = io.BytesIO()
+    convert.lrpk_to_trk(lrpk_output.getvalue(), trk_output, chunk_lines=100)
+    track = trk.TRK_Reader(trk_output.getvalue()).read()
+    assert track.lines == [narrowed(line) for line in source.lines if not isinstance(line, trk.SceneryLine)] \
+        + [narrowed(line) for line in source.lines if isinstance(line, trk.SceneryLine)]
+    assert track.riderPosition == source.riderPosition
+    assert track.lines == convert.lrpk_track_to_trk(converted).lines
+
+
+def test_lrpk_to_trk_and_back():
+    source = read_lrpk(lrpk_bytes(lrpk_track(2000, 1, FULL_MIX))) # scenery coordinates narrowed to 32 bit floats
+    trk_output = io.BytesIO()
+    convert.lrpk_to_trk(lrpk_bytes(source), trk_output, chunk_lines=100)
+    assert trk.TRK_Reader(trk_output.getvalue()).read().lines == convert.lrpk_track_to_trk(source).lines
+
+    lrpk_output = io.BytesIO()
+    convert.trk_to_lrpk(trk_output.getvalue(), lrpk_output, spool_size=100)
+    track = read_lrpk(lrpk_output.getvalue())
+    assert track.physics_lines == source.physics_lines
+    assert track.riders == source.riders[:1]
+
+    # scenery ids aren't kept, the lines follow the physics lines in order
+    first_id = max(line.id for line in source.physics_lines) + 1
+    assert [line.id for line in track.scenery_lines] == list(range(first_id, first_id + len(source.scenery_lines)))
+    assert [(line.start, line.end) for line in track.scenery_lines] == [(line.start, line.end) for line in source.scenery_lines]
+
+
+def test_unsupported_lines():
+    with pytest.raises(Exception, match="not a physics line"):
+        convert.trk_record_to_lrpk((0, 0.0, 0.0, 1.0, 1.0, trk.LineType.Scenery.value, 1, 10, False, 0.0, 0))
+    with pytest.raises(Exception, match="unsupported LRPK line type"):
+        convert.lrpk_record_to_trk((0, 0.0, 0.0, 1.0, 1.0, 7, False, 0))
@@ -0,0 +1,76 @@
+import copy
+
+import pytest
+
+from open_lr_formats import diff
+from open_lr_formats.trk import track as trk
+from open_lr_formats.lrpk import track as lrpk
+
+
+def edit_trk(track: trk.Track) -> trk.Track:
+    new = copy.deepcopy(track)
+    del new.lines[10:20]
+    new.lines[3].start = trk.Vector2d(-7.25, 8.5)
+    new.lines.append(new.lines.pop(0)) # reordered
+    new.lines.append(trk.StandardLine(trk.Vector2d(0, 0), trk.Vector2d(1, 1), 9999))
+    new.metadata.pop(next(iter(new.metadata)))
+    new.metadata["ADDED"] = "1"
+    new.riderPosition = trk.Vector2d(12.5, -3.0)
+    return new
+
+def edit_lrpk(track: lrpk.Track) -> lrpk.Track:
+    new = copy.deepcopy(track)
+    del new.physics_lines[5:9]
+    new.physics_lines[0].flipped = not new.physics_lines[0].flipped
+    new.scenery_lines.append(lrpk.SceneryLine(9999, lrpk.Vector2d(1, 2), lrpk.Vector2d(3, 4)))
+    new.name = "edited"
+    return new
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_trk_roundtrip(trk_data, columnar):
+    old = trk.TRK_Reader(trk_data).read()
+    new = edit_trk(old)
+    if columnar:
+        old = trk.TRK_Reader(trk_data, columnar=True).read()
+
+    patch = diff.TrackDiff.loads(diff.diff(old, new).dumps())
+    result = diff.apply(old, patch)
+    assert list(result.lines) == new.lines
+    assert result.metadata == new.metadata
+    assert result.riderPosition == new.riderPosition
+    assert result.features == new.features and result.songinfo == new.songinfo
+
+
+def test_lrpk_roundtrip(lrpk_data):
+    old = lrpk.LRPK_Reader(lrpk_data).read()
+    new = edit_lrpk(old)
+    patch = diff.TrackDiff.loads(diff.diff(old, new).dumps())
+    assert diff.apply(old, patch) == new
+    assert old == lrpk.LRPK_Reader(lrpk_data).read() # left unchanged
+
+
+def test_empty_diff(trk_data, lrpk_data):
+    for track in (trk.TRK_Reader(trk_data).read(), lrpk.LRPK_Reader(lrpk_data).read()):
+        patch = diff.diff(track, copy.deepcopy(track))
+        assert not patch
+        loaded = diff.TrackDiff.loads(patch.dumps())
+        assert not loaded
+        assert diff.apply(track, loaded) == track
+
+
+def test_wrong_base(trk_data, lrpk_data):
+    old = trk.TRK_Reader(trk_data).read()
+    patch = diff.TrackDiff.loads(diff.diff(old, edit_trk(old)).dumps())
+    other = copy.deepcopy(old)
+    del other.lines[:20] # lines the patch removes or modifies are gone
+    with pytest.raises(Exception, match="Patch does not apply"):
+        diff.apply(other, patch)
+
+    added = copy.deepcopy(old)
+    added.lines.append(trk.StandardLine(trk.Vector2d(0, 0), trk.Vector2d(1, 1), 9999))
+    with pytest.raises(Exception, match="already exists"):
+        diff.apply(added, diff.diff(old, added)) # applied twice
+
+    with pytest.raises(Exception, match="Can't apply a trk patch"):
+        diff.apply(lrpk.LRPK_Reader(lrpk_data).read(), patch)
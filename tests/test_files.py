@@ -0,0 +1,60 @@
+import gzip
+import mmap
+
+import pytest
+
+from open_lr_formats.files import map_file, mapped, open_lrpk, open_trk
+from open_lr_formats.trk.track import TRK_Reader
+
+
+def test_map_file(trk_file, trk_data, tmp_path):
+    with mapped(trk_file) as data:
+        assert isinstance(data, mmap.mmap)
+        assert data[:] == trk_data
+    assert data.closed
+
+    # empty files can't be mapped
+    empty = tmp_path / "empty.trk"
+    empty.write_bytes(b"")
+    assert map_file(empty) == b""
+    with mapped(empty) as data:
+        assert data == b""
+    with pytest.raises(Exception):
+        open_trk(empty)
+
+
+def test_mapping_outlives_reader(trk_file, trk_data):
+    # a mapping that is still viewed can't be closed, leaving the context manager doesn't fail
+    with mapped(trk_file) as data:
+        view = memoryview(data)
+    assert view[:4] == trk_data[:4]
+    view.release()
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_open_trk(trk_file, trk_data, use_mmap):
+    expected = TRK_Reader(trk_data).read()
+    track = open_trk(trk_file, mmap=use_mmap)
+    assert track.lines == expected.lines
+    assert track.metadata == expected.metadata
+    assert list(open_trk(trk_file, mmap=use_mmap, columnar=True).lines) == expected.lines
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_open_lrpk(lrpk_file, use_mmap):
+    with open_lrpk(lrpk_file) as expected, open_lrpk(lrpk_file, mmap=use_mmap) as archive:
+        assert archive.read() == expected.read()
+
+
+def test_compressed_files(tmp_path, trk_data, lrpk_data):
+    # compressed files can't be mapped, they are streamed or decompressed into memory instead
+    trk_path = tmp_path / "track.trk.gz"
+    trk_path.write_bytes(gzip.compress(trk_data))
+    assert open_trk(trk_path).lines == TRK_Reader(trk_data).read().lines
+
+    lrpk_path = tmp_path / "track.lrpk.gz"
+    lrpk_path.write_bytes(gzip.compress(lrpk_data))
+    plain_path = tmp_path / "track.lrpk"
+    plain_path.write_bytes(lrpk_data)
+    with open_lrpk(lrpk_path) as archive, open_lrpk(plain_path) as expected:
+        assert archive.read() == expected.read()
@@ -0,0 +1,104 @@
+import io
+import math
+import struct
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from open_lr_formats.lrca import track as lrca
+from open_lr_formats.trk import track as trk
+from open_lr_formats.trk.line import LineType
+from open_lr_formats.trk.table import LineTable
+from open_lr_formats.lrpk import track as lrpk
+
+EDGE_VALUES = [0.0, -0.0, math.nan, math.inf, -math.inf, 1e308, 5e-324, 1.5, -2.0]
+
+
+def archive(track, **options) -> bytes:
+    output = io.BytesIO()
+    lrca.LRCA_Writer(output, track, **options).write()
+    return output.getvalue()
+
+def float_bits(value: float) -> bytes:
+    return struct.pack("<d", value)
+
+def assert_rows_identical(a, b):
+    a, b = list(a.rows()), list(b.rows())
+    assert len(a) == len(b)
+    for row_a, row_b in zip(a, b):
+        assert [float_bits(v) if isinstance(v, float) else v for v in row_a] == \
+               [float_bits(v) if isinstance(v, float) else v for v in row_b]
+
+
+def test_trk_lossless(trk_data):
+    track = trk.TRK_Reader(trk_data, columnar=True).read()
+    for n, value in enumerate(EDGE_VALUES):
+        track.lines.append_record(10_000 + n, value, 1.0, 2.0, -value, LineType.Standard.value, 1, 10, False, 0.0, 0)
+
+    data = archive(track)
+    restored = lrca.LRCA_Reader(data, columnar=True).read()
+    assert_rows_identical(restored.lines, track.lines)
+    assert restored.features == track.features
+    assert restored.songinfo == track.songinfo
+    assert restored.metadata == track.metadata
+    assert restored.riderPosition == track.riderPosition
+
+    # from line objects, into line objects
+    lines = trk.TRK_Reader(trk_data).read()
+    assert archive(lines) == archive(trk.TRK_Reader(trk_data, columnar=True).read())
+    assert lrca.LRCA_Reader(io.BytesIO(archive(lines))).read().lines == lines.lines
+
+
+def test_lrpk_lossless(lrpk_data):
+    track = lrpk.LRPK_Reader(lrpk_data, columnar=True).read()
+    restored = lrca.LRCA_Reader(archive(track), columnar=True).read()
+    assert_rows_identical(restored.physics_lines, track.physics_lines)
+    assert_rows_identical(restored.scenery_lines, track.scenery_lines)
+
+    restored_file = io.BytesIO()
+    lrca.restore(archive(track), restored_file)
+    assert restored_file.getvalue() == lrpk_data
+
+
+def test_precision(trk_data):
+    track = trk.TRK_Reader(trk_data, columnar=True).read()
+    for precision in (0.01, 0.5):
+        restored = lrca.LRCA_Reader(archive(track, precision=precision), columnar=True).read()
+        for column in ("x1", "y1", "x2", "y2"):
+            error = max(abs(a - b) for a, b in zip(getattr(restored.lines, column), getattr(track.lines, column)))
+            assert error <= precision / 2 * (1 + 1e-9)
+    assert len(archive(track, precision=0.5)) < len(archive(track))
+
+
+def test_precision_out_of_range():
+    lines = LineTable()
+    for n in range(100):
+        lines.append_record(n, 1e5 + n / 3, 1e5, 1e5 + n, 0.1, LineType.Standard.value, 1, 10, False, 0.0, 0)
+    track = trk.Track(lines, set(), None, {}, trk.Vector2d(0, 0))
+
+    # far too many multiples of the precision to quantize, stored losslessly instead
+    restored = lrca.LRCA_Reader(archive(track, precision=1e-15), columnar=True).read()
+    assert_rows_identical(restored.lines, lines)
+
+    for precision in (0, -1.0, math.nan):
+        with pytest.raises(Exception, match="Precision"):
+            lrca.LRCA_Writer(io.BytesIO(), track, precision=precision)
+
+
+def test_empty_tracks():
+    track = trk.Track(LineTable(), set(), None, {}, trk.Vector2d(math.inf, -0.0))
+    restored = lrca.LRCA_Reader(archive(track), columnar=True).read()
+    assert len(restored.lines) == 0
+    assert restored.riderPosition.x == math.inf and math.copysign(1, restored.riderPosition.y) == -1
+
+    track = lrpk.Track("", "", 0, lrpk.VersionInfo(), [], [], [])
+    assert lrca.LRCA_Reader(archive(track)).read() == track
+
+
+def test_bad_header(trk_data):
+    data = archive(trk.TRK_Reader(trk_data, columnar=True).read())
+    with pytest.raises(Exception, match="magic number"):
+        lrca.LRCA_Reader(b"LRCB" + data[4:]).read()
+    with pytest.raises(Exception, match="Unsupported LRCA version"):
+        lrca.LRCA_Reader(data[:4] + bytes([lrca.VERSION + 1]) + data[5:]).read()
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+
+from open_lr_formats.lrpk.archive import LRPKArchive, TrackDef
+from open_lr_formats.lrpk.track import LRPK_Reader, LRPK_Writer
+
+from benchmarks.synthetic import FULL_MIX, lrpk_track
+
+
+class ExtraLumpWriter(LRPK_Writer):
+    """Writes an extra lump of a type the readers don't know after the TRACKDEF lump."""
+
+    def write_trackdef(self):
+        super().write_trackdef()
+        self.directories.append(("EXTRA", self.stream.tell()))
+        self.stream.WriteBytes(b"unknown lump data")
+
+
+@pytest.fixture
+def extra_data() -> bytes:
+    track = lrpk_track(500, 1, FULL_MIX)
+    track.name, track.author = "name", "author"
+    output = io.BytesIO()
+    ExtraLumpWriter(output, track).write()
+    return output.getvalue()
+
+
+def test_lazy_lumps(extra_data):
+    with LRPKArchive(extra_data) as archive:
+        assert [lump.type for lump in archive.lumps] == ["VERSINFO", "LINEDEF", "LINEDECO", "RIDERDEF", "TRACKDEF", "EXTRA"]
+        assert not archive.loaded
+
+        assert archive.trackdef == TrackDef("name", "author", 0)
+        assert archive.loaded == {"TRACKDEF"}
+        assert not archive.reader.track.physics_lines
+
+        lines = archive.physics_lines
+        assert len(lines) and archive.loaded == {"TRACKDEF", "LINEDEF"}
+        assert archive.physics_lines is lines # decoded once
+        assert not archive.reader.track.scenery_lines
+
+        archive.load("EXTRA") # unknown lumps are skipped
+        assert "EXTRA" in archive.loaded
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_read_with_unknown_lump(extra_data, lrpk_data, columnar):
+    reader = LRPK_Reader(lrpk_data)
+    reader.read_header()
+    reader.read_directories()
+    expected = reader.track
+    expected.name, expected.author = "name", "author"
+
+    with LRPKArchive(extra_data, columnar=columnar) as archive:
+        track = archive.read()
+        assert list(track.physics_lines) == expected.physics_lines
+        assert list(track.scenery_lines) == expected.scenery_lines
+        assert track.riders == expected.riders
+        assert (track.name, track.author) == ("name", "author")
+
+    # reading every lump eagerly still rejects it
+    reader = LRPK_Reader(extra_data)
+    reader.read_header()
+    with pytest.raises(Exception, match="Unsupported Lump 'EXTRA'"):
+        reader.read_directories()
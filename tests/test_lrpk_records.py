@@ -0,0 +1,36 @@
+import io
+
+import pytest
+
+from open_lr_formats.lrpk import records
+from open_lr_formats.lrpk.track import LRPK_Reader, LRPK_Writer
+
+from benchmarks.synthetic import FULL_MIX, lrpk_track
+
+pytestmark = pytest.mark.skipif(not records.HAS_NUMPY, reason="needs numpy")
+
+
+def write(track, use_numpy: bool) -> bytes:
+    output = io.BytesIO()
+    LRPK_Writer(output, track, use_numpy=use_numpy).write()
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("count", [0, 1, 2000])
+def test_numpy_and_struct_paths_match(count):
+    track = lrpk_track(count, 4, FULL_MIX)
+    data = write(track, use_numpy=False)
+    assert write(track, use_numpy=True) == data
+
+    for columnar in (False, True):
+        with_numpy = LRPK_Reader(data, use_numpy=True, columnar=columnar).read()
+        without = LRPK_Reader(data, use_numpy=False, columnar=columnar).read()
+        assert with_numpy == without
+        if columnar:
+            for name in ("physics_lines", "scenery_lines"):
+                a, b = getattr(with_numpy, name), getattr(without, name)
+                assert [column.tobytes() for column in a.column_arrays()] == [column.tobytes() for column in b.column_arrays()]
+
+    # tables written back through either path give the same file
+    table_track = LRPK_Reader(data, columnar=True).read()
+    assert write(table_track, use_numpy=True) == write(table_track, use_numpy=False) == data
@@ -0,0 +1,93 @@
+import io
+import struct
+
+import pytest
+
+from open_lr_formats.trk.parallel import TRKIndex, read_parallel, scan_offsets
+from open_lr_formats.trk.track import TRK_Reader
+
+from benchmarks.synthetic import FULL_MIX, trk_track
+
+from .conftest import trk_bytes
+
+
+def test_index_offsets(trk_data):
+    index = TRKIndex.build(trk_data)
+    assert index.file_size == len(trk_data)
+    assert len(index) == len(TRK_Reader(trk_data).read().lines)
+
+    # the same offsets from a file object, which is scanned line by line
+    from_file = TRKIndex.build(io.BytesIO(trk_data))
+    assert list(from_file.offsets) == list(index.offsets)
+    assert from_file.file_size == index.file_size
+
+    lines = TRK_Reader(trk_data).read().lines
+    for n in (0, 1, len(lines) // 2, -1):
+        assert index.line(trk_data, n) == lines[n]
+    with pytest.raises(IndexError):
+        index.record(trk_data, len(lines))
+
+
+def test_dump_and_load(trk_data):
+    index = TRKIndex.build(trk_data)
+    output = io.BytesIO()
+    index.dump(output)
+    loaded = TRKIndex.load(output.getvalue())
+    assert list(loaded.offsets) == list(index.offsets)
+    assert loaded.features == index.features
+    assert loaded.file_size == index.file_size
+
+    with pytest.raises(Exception, match="Truncated index"):
+        TRKIndex.load(output.getvalue()[:-4])
+    with pytest.raises(Exception, match="magic number"):
+        TRKIndex.load(b"XXXX" + output.getvalue()[4:])
+
+
+def test_stale_index(tmp_path, trk_data):
+    path = tmp_path / "track.trk"
+    path.write_bytes(trk_data)
+    index = TRKIndex.build(trk_data)
+    assert len(read_parallel(path, workers=1, chunk_lines=100, index=index).lines) == len(index)
+
+    # a different track, then the same one with a line more
+    path.write_bytes(trk_bytes(trk_track(500, 2, FULL_MIX)))
+    with pytest.raises(Exception, match="Index does not match the file"):
+        read_parallel(path, workers=1, chunk_lines=100, index=index)
+
+    track = TRK_Reader(trk_data).read()
+    track.lines.append(track.lines[0])
+    path.write_bytes(trk_bytes(track))
+    with pytest.raises(Exception, match="lines"):
+        read_parallel(path, workers=1, chunk_lines=100, index=index)
+
+
+def test_truncated_line_data(trk_data):
+    index = TRKIndex.build(trk_data)
+    truncated = trk_data[:index.offsets[len(index) // 2] + 3]
+    with pytest.raises(Exception, match="past the end of the file"):
+        TRKIndex.build(truncated)
+    with pytest.raises(Exception, match="past the end of the file"):
+        scan_offsets(truncated, index.offsets[0], len(index), index.features)
+
+    # a line count larger than the file holds, the metadata is read as lines until it runs out
+    count_offset = index.offsets[0] - 4
+    data = bytearray(trk_data)
+    data[count_offset:count_offset + 4] = struct.pack("<i", len(index) + 1000)
+    with pytest.raises(Exception):
+        TRKIndex.build(bytes(data))
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_read_parallel_matches_reader(tmp_path, columnar):
+    data = trk_bytes(trk_track(5000, 3, FULL_MIX))
+    path = tmp_path / "track.trk"
+    path.write_bytes(data)
+    expected = TRK_Reader(data).read()
+
+    for workers, index in ((2, None), (3, TRKIndex.build(data)), (1, None)):
+        track = read_parallel(path, workers=workers, chunk_lines=700, columnar=columnar, index=index)
+        assert list(track.lines) == expected.lines
+        assert track.metadata == expected.metadata
+        assert track.features == expected.features
+        assert track.songinfo == expected.songinfo
+        assert track.riderPosition == expected.riderPosition
@@ -0,0 +1,44 @@
+import math
+import random
+import time
+
+from open_lr_formats.spatial import GridIndex, segment_distance
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(0)
+    index = GridIndex(32.0)
+    segments = []
+    for key in range(2000):
+        cx, cy = rng.choice([(0, 0), (5000, -3000), (-20000, 100)])
+        x, y = cx + rng.uniform(-500, 500), cy + rng.uniform(-500, 500)
+        segment = (x, y, x + rng.uniform(-80, 80), y + rng.uniform(-80, 80))
+        segments.append(segment)
+        index.insert(key, *segment)
+
+    for i in range(200):
+        x, y = rng.uniform(-3e4, 3e4), rng.uniform(-3e4, 3e4)
+        best = min(segment_distance(x, y, segment) for segment in segments)
+        key, distance = index.nearest(x, y)
+        assert math.isclose(distance, best)
+        assert math.isclose(segment_distance(x, y, segments[key]), best)
+
+
+def test_nearest_far_away():
+    index = GridIndex()
+    index.insert(0, 0.0, 0.0, 1.0, 1.0)
+    begin = time.perf_counter()
+    for distance in (1e4, 1e5, 3e5, 1e9):
+        key, found = index.nearest(distance, distance)
+        assert key == 0 and math.isclose(found, math.hypot(distance - 1, distance - 1))
+    assert time.perf_counter() - begin < 0.5
+    assert index.nearest(1e5, 1e5, max_distance=10.0) is None
+
+
+def test_non_finite_and_huge_lines():
+    index = GridIndex.from_lines([])
+    index.insert_many([(0, (math.nan, 0.0, 1.0, 1.0)), (1, (-1e7, 0.0, 1e7, 5.0))])
+    assert index.skipped == [0]
+    assert index.overflow == {1} and not index.cells
+    assert index.query_bbox(5e6, 0, 5e6 + 1, 10) == {1}
+    assert index.nearest(0.0, 100.0)[0] == 1
@@ -0,0 +1,104 @@
+import io
+import itertools
+import random
+import struct
+
+import pytest
+
+from open_lr_formats.binary import BinaryStream, BufferStream
+from open_lr_formats.trk.line import LineType
+from open_lr_formats.trk.track import Features, TRK_Reader, TRK_Writer, Track, Vector2d, line_decoders, line_layouts
+
+STANDARD = LineType.Standard.value
+ACCELERATION = LineType.Acceleration.value
+SCENERY = LineType.Scenery.value
+
+
+def write_stream(records, features=None) -> bytes:
+    output = io.BytesIO()
+    TRK_Writer(output, Track([], set(), None, {}, Vector2d(0, 0))).write_stream(records, features)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("record, feature", [
+    ((1, 0.0, 0.0, 1.0, 1.0, ACCELERATION, 3, 10, False, 0.0, 0), Features.red_multiplier),
+    ((-1, 0.0, 0.0, 1.0, 1.0, SCENERY, 1, 25, False, 0.0, 0), Features.scenery_width),
+    ((2, 0.0, 0.0, 1.0, 1.0, STANDARD, 1, 10, True, 2.0, 40), Features.ignorable_trigger),
+])
+def test_write_stream_features(record, feature):
+    with pytest.raises(Exception, match=feature):
+        write_stream([record], features=set())
+
+    for features in ({feature}, None):
+        lines = TRK_Reader(write_stream([record], features), columnar=True).read().lines
+        assert list(lines.rows()) == [record]
+
+
+def test_write_stream_all_features_by_default():
+    record = (1, 0.0, 0.0, 1.0, 1.0, ACCELERATION, 1, 10, False, 0.0, 0)
+    track = TRK_Reader(write_stream([record])).read()
+    assert {Features.red_multiplier, Features.scenery_width, Features.ignorable_trigger} <= track.features
+    assert len(write_stream([record])) > len(write_stream([record], set()))
+
+
+def reference_record(stream: BinaryStream, features) -> tuple:
+    """Decodes a line record field by field, the way the original reader did, as a `LineTable` record."""
+    flags = stream.ReadUInt8()
+    line_type = LineType(flags & 0x1f)
+    multiplier, width, id = 1, 10, -1
+    trigger, target, frames = False, 0.0, 0
+
+    if Features.red_multiplier in features and line_type == LineType.Acceleration:
+        multiplier = stream.ReadUInt8()
+    if line_type != LineType.Scenery:
+        if Features.ignorable_trigger in features:
+            trigger = stream.ReadBool()
+            if trigger:
+                target = stream.ReadSingle()
+                frames = stream.ReadInt16()
+        id = stream.ReadInt32()
+        if flags & 0x60:
+            stream.ReadInt32()
+            stream.ReadInt32()
+    else:
+        flags = line_type.value
+        if Features.scenery_width in features:
+            width = stream.ReadUInt8()
+
+    coordinates = [stream.ReadDouble() for i in range(4)]
+    return (id, *coordinates, flags, multiplier, width, trigger, target, frames)
+
+def float_bits(record: tuple) -> tuple:
+    return tuple(struct.pack("<d", value) if isinstance(value, float) else value for value in record)
+
+
+@pytest.mark.parametrize("features", [
+    set(combination)
+    for n in range(4)
+    for combination in itertools.combinations([Features.red_multiplier, Features.ignorable_trigger, Features.scenery_width], n)
+])
+def test_line_decoders_match_reference(features):
+    rng = random.Random(0)
+    decoders = line_decoders(features)
+    layouts = line_layouts(features)
+    for flags in range(256):
+        if flags & 0x1f not in {line_type.value for line_type in LineType}:
+            assert layouts[flags] is None
+            with pytest.raises(ValueError):
+                decoders[flags](None)
+            continue
+
+        for trigger in (0, 1):
+            for i in range(5):
+                data = bytearray(rng.randbytes(64))
+                data[0] = flags
+                size, trigger_offset = layouts[flags]
+                if trigger_offset:
+                    data[trigger_offset] = trigger
+
+                expected = BufferStream(bytes(data))
+                record = reference_record(expected, features)
+                stream = BufferStream(bytes(data))
+                stream.skip(1)
+                assert float_bits(decoders[flags](stream.read_record)) == float_bits(record)
+                assert stream.tell() == expected.tell() == size + (6 if trigger_offset and trigger else 0)
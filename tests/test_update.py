@@ -0,0 +1,113 @@
+import io
+
+from open_lr_formats.trk import update as trk_update
+from open_lr_formats.trk.line import LineType
+from open_lr_formats.trk.track import Features, TRK_Reader, TRK_Writer
+from open_lr_formats.lrpk import update as lrpk_update
+from open_lr_formats.lrpk.track import LRPK_Reader
+
+from benchmarks.synthetic import trk_track, lrpk_track
+
+from .conftest import lrpk_bytes
+
+
+def first_physics_line(table) -> int:
+    for n, record in enumerate(table.rows()):
+        if record[5] & 0x1f != LineType.Scenery.value and not record[8]:
+            return n
+    raise AssertionError("no physics line without a trigger")
+
+def other_rows(table, n: int) -> list:
+    return [row for i, row in enumerate(table.rows()) if i != n]
+
+
+def test_trk_patch_in_place(trk_file):
+    size = trk_file.stat().st_size
+    before = TRK_Reader(trk_file.read_bytes(), columnar=True).read()
+    n = first_physics_line(before.lines)
+    record = (before.lines.row(n)[0], -1.5, 2.5, 3.5, -4.5, *before.lines.row(n)[5:])
+
+    with open(trk_file, "r+b") as f:
+        assert trk_update.TRK_Updater(f).patch_line(n, record)
+
+    assert trk_file.stat().st_size == size
+    after = TRK_Reader(trk_file.read_bytes(), columnar=True).read()
+    assert after.lines.row(n) == record
+    assert other_rows(after.lines, n) == other_rows(before.lines, n)
+    assert after.metadata == before.metadata
+    assert after.features == before.features
+
+
+def test_trk_patch_refuses_size_change(trk_file):
+    data = trk_file.read_bytes()
+    lines = TRK_Reader(data, columnar=True).read().lines
+    n = first_physics_line(lines)
+    # a zoom trigger adds 6 bytes to the record
+    record = (*lines.row(n)[:8], True, 2.0, 40)
+
+    with open(trk_file, "r+b") as f:
+        assert not trk_update.TRK_Updater(f).patch_line(n, record)
+    assert trk_file.read_bytes() == data
+
+
+def test_trk_append_lines_rewrites_tail(trk_file):
+    size = trk_file.stat().st_size
+    before = TRK_Reader(trk_file.read_bytes(), columnar=True).read()
+    added = [(1000, 0.0, 0.0, 10.0, 10.0, LineType.Standard.value, 1, 10, False, 0.0, 0)]
+
+    with open(trk_file, "r+b") as f:
+        updater = trk_update.TRK_Updater(f)
+        assert updater.append_lines(added)
+        assert updater.index.file_size == trk_file.stat().st_size
+
+    assert trk_file.stat().st_size > size
+    after = TRK_Reader(trk_file.read_bytes(), columnar=True).read()
+    assert list(after.lines.rows()) == list(before.lines.rows()) + added
+    assert after.metadata == before.metadata
+
+
+def test_trk_compact_rewrites_file(tmp_path):
+    track = trk_track(300, 2)
+    output = io.BytesIO()
+    TRK_Writer(output, track).write_stream(track.lines) # every optional line field enabled
+    data = output.getvalue()
+
+    compacted = io.BytesIO()
+    trk_update.compact(data, compacted)
+
+    assert len(compacted.getvalue()) < len(data)
+    before = TRK_Reader(data).read()
+    after = TRK_Reader(compacted.getvalue()).read()
+    assert after.lines == before.lines
+    assert Features.red_multiplier not in after.features
+    assert Features.scenery_width not in after.features
+
+
+def test_lrpk_append_and_replace_lines(lrpk_file):
+    size = lrpk_file.stat().st_size
+    before = LRPK_Reader(lrpk_file.read_bytes()).read()
+    extra = LRPK_Reader(lrpk_bytes(lrpk_track(20, 3))).read() # scenery narrowed to 32 bit floats
+
+    with open(lrpk_file, "r+b") as f:
+        updater = lrpk_update.LRPK_Updater(f)
+        updater.append_lines(extra.physics_lines, extra.scenery_lines)
+        updater.commit()
+
+    assert lrpk_file.stat().st_size > size
+    after = LRPK_Reader(lrpk_file.read_bytes()).read()
+    assert after.physics_lines == before.physics_lines + extra.physics_lines
+    assert after.scenery_lines == before.scenery_lines + extra.scenery_lines
+
+    with open(lrpk_file, "r+b") as f:
+        updater = lrpk_update.LRPK_Updater(f)
+        updater.replace_lines(physics_lines=extra.physics_lines)
+        updater.commit()
+
+    edited = LRPK_Reader(lrpk_file.read_bytes()).read()
+    assert edited.physics_lines == extra.physics_lines
+    assert edited.scenery_lines == after.scenery_lines
+
+    compacted = io.BytesIO()
+    lrpk_update.compact(lrpk_file.read_bytes(), compacted)
+    assert len(compacted.getvalue()) < lrpk_file.stat().st_size
+    assert compacted.getvalue() == lrpk_bytes(edited)
@@ -0,0 +1,109 @@
+import gzip
+import io
+import math
+import mmap
+import struct
+
+import pytest
+
+from open_lr_formats.validate import Check, validate
+from open_lr_formats.trk import track as trk
+from open_lr_formats.trk.parallel import TRKIndex
+from open_lr_formats.lrpk import track as lrpk
+
+from .conftest import trk_bytes, lrpk_bytes
+
+
+def checks(report) -> set:
+    return {issue.check for issue in report.issues}
+
+def assert_clean(data: bytes):
+    report = validate(data)
+    assert report.ok and not report.issues, report.issues
+
+
+def test_valid_files(trk_data, lrpk_data):
+    for data in (trk_data, lrpk_data, gzip.compress(trk_data)):
+        report = validate(data, fix=True)
+        assert report.ok and report.track is not None
+
+
+@pytest.mark.parametrize("format", ["trk", "lrpk"])
+def test_truncated(format, trk_data, lrpk_data):
+    data = trk_data if format == "trk" else lrpk_data
+    for size in (3, len(data) // 2, len(data) - 5):
+        report = validate(data[:size])
+        assert report.fatal and report.track is None, size
+
+
+def test_trk_oversized_line_count(trk_data):
+    offset = TRKIndex.build(trk_data).offsets[0] - 4
+    data = bytearray(trk_data)
+    data[offset:offset + 4] = struct.pack("<i", 0x7ffffff0)
+    report = validate(bytes(data))
+    assert report.fatal and report.track is None
+    assert report.issues[0].check == Check.bounds
+
+
+def test_lrpk_oversized_line_count(lrpk_data):
+    reader = lrpk.LRPK_Reader(lrpk_data)
+    reader.read_header()
+    position = next(lump.position for lump in reader.read_directory_table() if lump.type == "LINEDEF")
+    data = bytearray(lrpk_data)
+    data[position:position + 4] = struct.pack("<I", 10 ** 9)
+    report = validate(bytes(data))
+    assert report.fatal and report.track is None
+    assert report.issues[0].check == Check.bounds
+
+
+def test_trk_nan_and_duplicate_ids(trk_data):
+    track = trk.TRK_Reader(trk_data).read()
+    physics = [n for n, line in enumerate(track.lines) if not isinstance(line, trk.SceneryLine)]
+    track.lines[physics[0]].start.x = math.nan
+    track.lines[physics[2]].id = track.lines[physics[1]].id
+    data = trk_bytes(track)
+
+    report = validate(data)
+    assert {Check.non_finite, Check.duplicate_id} <= checks(report)
+    assert [issue.indices for issue in report.issues if issue.check == Check.non_finite] == [[physics[0]]]
+    assert not report.ok and not report.fatal
+
+    fixed = validate(data, fix=True)
+    assert fixed.ok
+    assert_clean(trk_bytes(fixed.track))
+
+
+def test_lrpk_nan_and_duplicate_ids(lrpk_data):
+    track = lrpk.LRPK_Reader(lrpk_data).read()
+    track.physics_lines[4].end.y = math.inf
+    track.physics_lines[2].id = track.physics_lines[1].id
+    track.scenery_lines[0].start.x = math.nan
+    data = lrpk_bytes(track)
+
+    report = validate(data)
+    assert {Check.non_finite, Check.duplicate_id} <= checks(report)
+    assert not report.ok and not report.fatal
+
+    fixed = validate(data, fix=True)
+    assert fixed.ok
+    assert_clean(lrpk_bytes(fixed.track))
+
+
+def test_decompression_limit():
+    bomb = gzip.compress(b"TRK\xf2" + bytes(50_000_000))
+    for source in (bomb, io.BytesIO(bomb)):
+        report = validate(source)
+        assert report.fatal and report.track is None
+        assert report.issues[0].check == Check.bounds
+
+    report = validate(bomb, max_ratio=math.inf, max_size=1000)
+    assert report.fatal and report.issues[0].check == Check.bounds
+
+
+def test_mapped_and_file_inputs(tmp_path, trk_data):
+    for name, data in (("track.trk", trk_data), ("track.trk.gz", gzip.compress(trk_data))):
+        path = tmp_path / name
+        path.write_bytes(data)
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            assert validate(mapped).track is not None
+            assert validate(f).track is not None